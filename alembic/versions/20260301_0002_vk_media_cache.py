@@ -0,0 +1,33 @@
+"""vk media cache
+
+Revision ID: 0002_vk_media_cache
+Revises: 0001_init
+Create Date: 2026-03-01 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_vk_media_cache"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "vk_media_cache",
+        sa.Column("file_unique_id", sa.String(length=256), primary_key=True),
+        sa.Column("vk_group_id", sa.BigInteger(), primary_key=True),
+        sa.Column("media_type", sa.String(length=32), primary_key=True),
+        sa.Column("attachment", sa.String(length=128), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_vk_media_cache_attachment", "vk_media_cache", ["attachment"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_vk_media_cache_attachment", table_name="vk_media_cache")
+    op.drop_table("vk_media_cache")
@@ -0,0 +1,33 @@
+"""job status counters
+
+Revision ID: 0003_job_status_counters
+Revises: 0002_vk_media_cache
+Create Date: 2026-03-15 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_job_status_counters"
+down_revision = "0002_vk_media_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_status_counters",
+        sa.Column("status", sa.String(length=32), primary_key=True),
+        sa.Column("count", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        "INSERT INTO job_status_counters (status, count) "
+        "SELECT status, count(*) FROM jobs GROUP BY status"
+    )
+    op.create_index("ix_jobs_created_at", "jobs", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_created_at", table_name="jobs")
+    op.drop_table("job_status_counters")
@@ -0,0 +1,133 @@
+"""partition jobs by month, add jobs_archive
+
+Revision ID: 0004_jobs_partitioning
+Revises: 0003_job_status_counters
+Create Date: 2026-04-01 00:00:00.000000
+"""
+
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_jobs_partitioning"
+down_revision = "0003_job_status_counters"
+branch_labels = None
+depends_on = None
+
+
+PARTITIONS_AHEAD = 2
+
+JOB_COLUMNS = (
+    "id, type, status, retries, last_error, tg_post_id, media_group_id, created_at, updated_at"
+)
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+
+    op.execute("ALTER TABLE jobs RENAME TO jobs_legacy")
+    op.execute("ALTER TABLE jobs_legacy RENAME CONSTRAINT jobs_pkey TO jobs_legacy_pkey")
+    op.drop_index("ix_jobs_tg_post_id", table_name="jobs_legacy")
+    op.drop_index("ix_jobs_media_group_id", table_name="jobs_legacy")
+    op.drop_index("ix_jobs_created_at", table_name="jobs_legacy")
+
+    op.execute(
+        """
+        CREATE TABLE jobs (
+            id integer NOT NULL DEFAULT nextval('jobs_id_seq'),
+            type varchar(64) NOT NULL,
+            status varchar(32) NOT NULL,
+            retries integer NOT NULL DEFAULT 0,
+            last_error text,
+            tg_post_id integer,
+            media_group_id varchar(64),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT jobs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE jobs_id_seq OWNED BY jobs.id")
+    op.execute("CREATE TABLE jobs_default PARTITION OF jobs DEFAULT")
+
+    now = datetime.now(timezone.utc)
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM jobs_legacy")).scalar() or now
+    month = _month_start(min(oldest, now).astimezone(timezone.utc))
+    last = _add_months(_month_start(now), PARTITIONS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE jobs_p{month:%Y%m} PARTITION OF jobs "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+
+    op.execute(f"INSERT INTO jobs ({JOB_COLUMNS}) SELECT {JOB_COLUMNS} FROM jobs_legacy")
+    op.execute("DROP TABLE jobs_legacy")
+
+    op.create_index("ix_jobs_tg_post_id", "jobs", ["tg_post_id"])
+    op.create_index("ix_jobs_media_group_id", "jobs", ["media_group_id"])
+    op.create_index("ix_jobs_created_at", "jobs", ["created_at"])
+
+    op.create_table(
+        "jobs_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("type", sa.String(length=64), nullable=False),
+        sa.Column("status", sa.String(length=32), nullable=False),
+        sa.Column("retries", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("tg_post_id", sa.Integer(), nullable=True),
+        sa.Column("media_group_id", sa.String(length=64), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_jobs_archive_tg_post_id", "jobs_archive", ["tg_post_id"])
+    op.create_index("ix_jobs_archive_created_at", "jobs_archive", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_archive_created_at", table_name="jobs_archive")
+    op.drop_index("ix_jobs_archive_tg_post_id", table_name="jobs_archive")
+    op.drop_table("jobs_archive")
+
+    op.execute("ALTER TABLE jobs RENAME TO jobs_partitioned")
+    op.execute("ALTER TABLE jobs_partitioned RENAME CONSTRAINT jobs_pkey TO jobs_partitioned_pkey")
+    op.drop_index("ix_jobs_tg_post_id", table_name="jobs_partitioned")
+    op.drop_index("ix_jobs_media_group_id", table_name="jobs_partitioned")
+    op.drop_index("ix_jobs_created_at", table_name="jobs_partitioned")
+
+    op.execute(
+        """
+        CREATE TABLE jobs (
+            id integer NOT NULL DEFAULT nextval('jobs_id_seq'),
+            type varchar(64) NOT NULL,
+            status varchar(32) NOT NULL,
+            retries integer NOT NULL DEFAULT 0,
+            last_error text,
+            tg_post_id integer,
+            media_group_id varchar(64),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT jobs_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE jobs_id_seq OWNED BY jobs.id")
+    op.execute(f"INSERT INTO jobs ({JOB_COLUMNS}) SELECT {JOB_COLUMNS} FROM jobs_partitioned")
+    op.execute("DROP TABLE jobs_partitioned CASCADE")
+
+    op.create_index("ix_jobs_tg_post_id", "jobs", ["tg_post_id"])
+    op.create_index("ix_jobs_media_group_id", "jobs", ["media_group_id"])
+    op.create_index("ix_jobs_created_at", "jobs", ["created_at"])
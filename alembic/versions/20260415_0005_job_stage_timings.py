@@ -0,0 +1,28 @@
+"""job stage timings
+
+Revision ID: 0005_job_stage_timings
+Revises: 0004_jobs_partitioning
+Create Date: 2026-04-15 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0005_job_stage_timings"
+down_revision = "0004_jobs_partitioning"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("stage_timings", postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.add_column(
+        "jobs_archive", sa.Column("stage_timings", postgresql.JSONB(astext_type=sa.Text()), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("jobs_archive", "stage_timings")
+    op.drop_column("jobs", "stage_timings")
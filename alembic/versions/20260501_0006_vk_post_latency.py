@@ -0,0 +1,31 @@
+"""vk post latency columns
+
+Revision ID: 0006_vk_post_latency
+Revises: 0005_job_stage_timings
+Create Date: 2026-05-01 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_vk_post_latency"
+down_revision = "0005_job_stage_timings"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("vk_posts", sa.Column("ingest_delay_ms", sa.Integer(), nullable=True))
+    op.add_column("vk_posts", sa.Column("queue_wait_ms", sa.Integer(), nullable=True))
+    op.add_column("vk_posts", sa.Column("processing_ms", sa.Integer(), nullable=True))
+    op.add_column("vk_posts", sa.Column("total_ms", sa.Integer(), nullable=True))
+    op.create_index("ix_vk_posts_created_at", "vk_posts", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_vk_posts_created_at", table_name="vk_posts")
+    op.drop_column("vk_posts", "total_ms")
+    op.drop_column("vk_posts", "processing_ms")
+    op.drop_column("vk_posts", "queue_wait_ms")
+    op.drop_column("vk_posts", "ingest_delay_ms")
@@ -0,0 +1,40 @@
+"""staged media
+
+Revision ID: 0007_staged_media
+Revises: 0006_vk_post_latency
+Create Date: 2026-05-15 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_staged_media"
+down_revision = "0006_vk_post_latency"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "staged_media",
+        sa.Column(
+            "tg_media_item_id",
+            sa.Integer(),
+            sa.ForeignKey("tg_media_items.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("vk_group_id", sa.BigInteger(), primary_key=True),
+        sa.Column("status", sa.String(length=32), nullable=False),
+        sa.Column("attachment", sa.String(length=128), nullable=True),
+        sa.Column("note", sa.Text(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_staged_media_expires_at", "staged_media", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_staged_media_expires_at", table_name="staged_media")
+    op.drop_table("staged_media")
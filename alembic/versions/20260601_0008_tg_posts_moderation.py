@@ -0,0 +1,28 @@
+"""tg posts awaiting approval index
+
+Revision ID: 0008_tg_posts_moderation
+Revises: 0007_staged_media
+Create Date: 2026-06-01 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_tg_posts_moderation"
+down_revision = "0007_staged_media"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_tg_posts_awaiting_approval",
+        "tg_posts",
+        ["id"],
+        postgresql_where=sa.text("status = 'awaiting_approval'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_tg_posts_awaiting_approval", table_name="tg_posts")
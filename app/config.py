@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import os
-from typing import List
+from typing import Dict, List
 
 from dotenv import load_dotenv
 
@@ -20,16 +20,50 @@ class Settings:
     VK_USER_DEVICE_ID: str | None
     VK_USER_STATE: str | None
     VK_USER_TOKEN_EXPIRES_AT: int | None
+    VK_USER_TOKEN_REFRESH_AHEAD_SEC: int
     VK_API_VERSION: str
     VK_ID_OAUTH_URL: str
     MODE: str
     LIMIT_STRATEGY: str
     ALBUM_FINALIZE_DELAY_SEC: int
+    ALBUM_SCHEDULER_TICK_SEC: float
     MAX_FILE_SIZE_MB: int
     DATABASE_URL: str
     REDIS_URL: str
     LOG_LEVEL: str
     TEMP_DIR: str
+    POLLER_MODE: str
+    POLLER_PIPELINE_DEPTH: int
+    POLLER_ADMIN_CONCURRENCY: int
+    RUNTIME_SETTINGS_TTL_SEC: int
+    MEDIA_RELAY_MODE: str
+    MEDIA_RELAY_BUFFER_MB: int
+    UPLOAD_CONCURRENCY: int
+    MEDIA_CACHE_TTL_DAYS: int
+    HTTP_MAX_CONNECTIONS: int
+    HTTP_POOL_LIMITS: Dict[str, int]
+    HTTP_KEEPALIVE_EXPIRY_SEC: float
+    HTTP2_ENABLED: bool
+    VK_RATE_LIMIT_PER_SEC: float
+    VK_USER_RATE_LIMIT_PER_SEC: float
+    VK_RATE_LIMIT_METHODS: Dict[str, float]
+    VK_RATE_LIMIT_RETRIES: int
+    JOBS_RETENTION_DAYS: int
+    JOBS_ARCHIVE_ENABLED: bool
+    JOBS_PARTITIONS_AHEAD: int
+    PAYLOAD_RETENTION_DAYS: int
+    RETENTION_INTERVAL_SEC: int
+    POLLER_METRICS_PORT: int
+    WORKER_METRICS_PORT: int
+    LATENCY_SLO_SEC: int
+    MEDIA_PREFETCH_ENABLED: bool
+    STAGED_MEDIA_TTL_SEC: int
+    MODERATION_STAGED_TTL_SEC: int
+    STAGED_MEDIA_WAIT_SEC: int
+    DOWNLOAD_CACHE_MB: int
+    HEAVY_MEDIA_MB: int
+    LIGHT_TASK_TIME_LIMIT_SEC: int
+    HEAVY_TASK_TIME_LIMIT_SEC: int
 
 
 def _parse_int_list(value: str | None) -> List[int]:
@@ -44,6 +78,29 @@ def _parse_int_list(value: str | None) -> List[int]:
     return items
 
 
+def _parse_str_map(value: str | None) -> Dict[str, str]:
+    items: Dict[str, str] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, raw = part.partition("=")
+        items[key.strip()] = raw.strip()
+    return items
+
+
+def _parse_int_map(value: str | None) -> Dict[str, int]:
+    return {key: int(raw) for key, raw in _parse_str_map(value).items()}
+
+
+def _parse_float_map(value: str | None) -> Dict[str, float]:
+    return {key: float(raw) for key, raw in _parse_str_map(value).items()}
+
+
+def _parse_bool(value: str | None) -> bool:
+    return (value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _require(name: str) -> str:
     value = os.getenv(name)
     if not value:
@@ -88,16 +145,50 @@ def get_settings() -> Settings:
         VK_USER_DEVICE_ID=os.getenv("VK_USER_DEVICE_ID") or None,
         VK_USER_STATE=os.getenv("VK_USER_STATE") or None,
         VK_USER_TOKEN_EXPIRES_AT=_parse_int(os.getenv("VK_USER_TOKEN_EXPIRES_AT")),
+        VK_USER_TOKEN_REFRESH_AHEAD_SEC=int(os.getenv("VK_USER_TOKEN_REFRESH_AHEAD_SEC", "600")),
         VK_API_VERSION=os.getenv("VK_API_VERSION", "5.199"),
         VK_ID_OAUTH_URL=os.getenv("VK_ID_OAUTH_URL", "https://id.vk.ru/oauth2/auth"),
         MODE=os.getenv("MODE", "auto"),
         LIMIT_STRATEGY=os.getenv("LIMIT_STRATEGY", "truncate"),
         ALBUM_FINALIZE_DELAY_SEC=int(os.getenv("ALBUM_FINALIZE_DELAY_SEC", "3")),
+        ALBUM_SCHEDULER_TICK_SEC=float(os.getenv("ALBUM_SCHEDULER_TICK_SEC", "0.5")),
         MAX_FILE_SIZE_MB=int(os.getenv("MAX_FILE_SIZE_MB", "200")),
         DATABASE_URL=database_url,
         REDIS_URL=redis_url,
         LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
         TEMP_DIR=os.getenv("TEMP_DIR", "/tmp/tg_vk_bot"),
+        POLLER_MODE=os.getenv("POLLER_MODE", "sync"),
+        POLLER_PIPELINE_DEPTH=int(os.getenv("POLLER_PIPELINE_DEPTH", "2")),
+        POLLER_ADMIN_CONCURRENCY=int(os.getenv("POLLER_ADMIN_CONCURRENCY", "4")),
+        RUNTIME_SETTINGS_TTL_SEC=int(os.getenv("RUNTIME_SETTINGS_TTL_SEC", "30")),
+        MEDIA_RELAY_MODE=os.getenv("MEDIA_RELAY_MODE", "tempfile"),
+        MEDIA_RELAY_BUFFER_MB=int(os.getenv("MEDIA_RELAY_BUFFER_MB", "8")),
+        UPLOAD_CONCURRENCY=int(os.getenv("UPLOAD_CONCURRENCY", "4")),
+        MEDIA_CACHE_TTL_DAYS=int(os.getenv("MEDIA_CACHE_TTL_DAYS", "30")),
+        HTTP_MAX_CONNECTIONS=int(os.getenv("HTTP_MAX_CONNECTIONS", "10")),
+        HTTP_POOL_LIMITS=_parse_int_map(os.getenv("HTTP_POOL_LIMITS", "")),
+        HTTP_KEEPALIVE_EXPIRY_SEC=float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SEC", "30")),
+        HTTP2_ENABLED=_parse_bool(os.getenv("HTTP2_ENABLED", "false")),
+        VK_RATE_LIMIT_PER_SEC=float(os.getenv("VK_RATE_LIMIT_PER_SEC", "20")),
+        VK_USER_RATE_LIMIT_PER_SEC=float(os.getenv("VK_USER_RATE_LIMIT_PER_SEC", "3")),
+        VK_RATE_LIMIT_METHODS=_parse_float_map(os.getenv("VK_RATE_LIMIT_METHODS", "")),
+        VK_RATE_LIMIT_RETRIES=int(os.getenv("VK_RATE_LIMIT_RETRIES", "3")),
+        JOBS_RETENTION_DAYS=int(os.getenv("JOBS_RETENTION_DAYS", "90")),
+        JOBS_ARCHIVE_ENABLED=_parse_bool(os.getenv("JOBS_ARCHIVE_ENABLED", "true")),
+        JOBS_PARTITIONS_AHEAD=int(os.getenv("JOBS_PARTITIONS_AHEAD", "2")),
+        PAYLOAD_RETENTION_DAYS=int(os.getenv("PAYLOAD_RETENTION_DAYS", "30")),
+        RETENTION_INTERVAL_SEC=int(os.getenv("RETENTION_INTERVAL_SEC", "3600")),
+        POLLER_METRICS_PORT=int(os.getenv("POLLER_METRICS_PORT", "9101")),
+        WORKER_METRICS_PORT=int(os.getenv("WORKER_METRICS_PORT", "9102")),
+        LATENCY_SLO_SEC=int(os.getenv("LATENCY_SLO_SEC", "60")),
+        MEDIA_PREFETCH_ENABLED=_parse_bool(os.getenv("MEDIA_PREFETCH_ENABLED", "true")),
+        STAGED_MEDIA_TTL_SEC=int(os.getenv("STAGED_MEDIA_TTL_SEC", "21600")),
+        MODERATION_STAGED_TTL_SEC=int(os.getenv("MODERATION_STAGED_TTL_SEC", "172800")),
+        STAGED_MEDIA_WAIT_SEC=int(os.getenv("STAGED_MEDIA_WAIT_SEC", "120")),
+        DOWNLOAD_CACHE_MB=int(os.getenv("DOWNLOAD_CACHE_MB", "2048")),
+        HEAVY_MEDIA_MB=int(os.getenv("HEAVY_MEDIA_MB", "20")),
+        LIGHT_TASK_TIME_LIMIT_SEC=int(os.getenv("LIGHT_TASK_TIME_LIMIT_SEC", "300")),
+        HEAVY_TASK_TIME_LIMIT_SEC=int(os.getenv("HEAVY_TASK_TIME_LIMIT_SEC", "3600")),
     )
 
     return _settings
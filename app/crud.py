@@ -1,19 +1,24 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import Iterable, List, Tuple
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Tuple, cast
 
-from sqlalchemy import select, update
+from sqlalchemy import CursorResult, Text, case, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.models import (
     AlbumState,
     Job,
+    JobStatusCounter,
     Setting,
+    StagedMedia,
     TgMediaItem,
     TgPost,
     TgState,
+    VkMediaCache,
     VkPost,
 )
 
@@ -37,14 +42,15 @@ def get_last_update_id(session: Session) -> int:
     return int(state.last_update_id)
 
 
-def set_last_update_id(session: Session, value: int) -> None:
+def set_last_update_id(session: Session, value: int, commit: bool = True) -> None:
     state = session.get(TgState, 1)
     if state is None:
         state = TgState(id=1, last_update_id=value)
         session.add(state)
     else:
         state.last_update_id = value
-    session.commit()
+    if commit:
+        session.commit()
 
 
 def get_setting(session: Session, key: str, default: str | None = None) -> str | None:
@@ -63,6 +69,21 @@ def set_setting(session: Session, key: str, value: str) -> None:
     session.commit()
 
 
+def get_settings_values(session: Session, keys: Iterable[str]) -> Dict[str, str]:
+    return dict(session.execute(select(Setting.key, Setting.value).where(Setting.key.in_(list(keys)))).all())
+
+
+def set_settings_values(session: Session, values: Dict[str, str]) -> None:
+    stmt = pg_insert(Setting).values([{"key": key, "value": value} for key, value in values.items()])
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Setting.key],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+    )
+    session.commit()
+
+
 def _parse_int_list(value: str | None) -> List[int]:
     if not value:
         return []
@@ -75,12 +96,18 @@ def _parse_int_list(value: str | None) -> List[int]:
     return items
 
 
+_RUNTIME_KEYS = ("autoposting_enabled", "mode", "limit_strategy", "vk_group_id", "source_channel_ids")
+
+
 def get_runtime_settings(session: Session, defaults: dict) -> dict:
-    autoposting_raw = get_setting(session, "autoposting_enabled", str(defaults["autoposting_enabled"]))
-    mode = get_setting(session, "mode", defaults["mode"])
-    limit_strategy = get_setting(session, "limit_strategy", defaults["limit_strategy"])
-    vk_group_id_raw = get_setting(session, "vk_group_id", str(defaults["vk_group_id"]))
-    source_raw = get_setting(session, "source_channel_ids", defaults.get("source_channel_ids", ""))
+    stored = dict(
+        session.execute(select(Setting.key, Setting.value).where(Setting.key.in_(_RUNTIME_KEYS))).all()
+    )
+    autoposting_raw = stored.get("autoposting_enabled", str(defaults["autoposting_enabled"]))
+    mode = stored.get("mode", defaults["mode"])
+    limit_strategy = stored.get("limit_strategy", defaults["limit_strategy"])
+    vk_group_id_raw = stored.get("vk_group_id", str(defaults["vk_group_id"]))
+    source_raw = stored.get("source_channel_ids", defaults.get("source_channel_ids", ""))
 
     return {
         "autoposting_enabled": str(autoposting_raw).lower() == "true",
@@ -91,53 +118,72 @@ def get_runtime_settings(session: Session, defaults: dict) -> dict:
     }
 
 
-def create_tg_post(
-    session: Session,
-    channel_id: int,
-    message_id: int,
-    date: datetime,
-    text: str | None,
-    media_group_id: str | None,
-    payload_json: dict,
-) -> Tuple[TgPost, bool]:
-    tg_post = TgPost(
-        channel_id=channel_id,
-        message_id=message_id,
-        date=date,
-        text=text,
-        media_group_id=media_group_id,
-        status="ingested",
-        payload_json=payload_json,
+def insert_tg_posts(session: Session, rows: List[dict]) -> Dict[Tuple[int, int], int]:
+    if not rows:
+        return {}
+    stmt = (
+        pg_insert(TgPost)
+        .values([{"status": "ingested", **row} for row in rows])
+        .on_conflict_do_nothing(constraint="uq_tg_msg")
+        .returning(TgPost.id, TgPost.channel_id, TgPost.message_id)
     )
-    try:
-        session.add(tg_post)
-        session.flush()
-        created = True
-    except IntegrityError:
-        session.rollback()
-        tg_post = session.execute(
-            select(TgPost).where(
-                TgPost.channel_id == channel_id, TgPost.message_id == message_id
-            )
-        ).scalar_one()
-        created = False
-    return tg_post, created
+    created: Dict[Tuple[int, int], int] = {}
+    for tg_post_id, channel_id, message_id in session.execute(stmt).all():
+        created[(int(channel_id), int(message_id))] = int(tg_post_id)
+    return created
 
 
 def add_media_items(session: Session, tg_post_id: int, items: Iterable[dict]) -> None:
-    for item in items:
-        session.add(
-            TgMediaItem(
-                tg_post_id=tg_post_id,
-                type=item["type"],
-                file_id=item["file_id"],
-                file_unique_id=item.get("file_unique_id"),
-                mime_type=item.get("mime_type"),
-                file_name=item.get("file_name"),
-                size=item.get("size"),
-                order_index=item.get("order_index", 0),
-            )
-        )
+    bulk_add_media_items(session, [(tg_post_id, item) for item in items])
+
+
+def bulk_add_media_items(session: Session, items: Iterable[Tuple[int, dict]]) -> None:
+    rows = [
+        {
+            "tg_post_id": tg_post_id,
+            "type": item["type"],
+            "file_id": item["file_id"],
+            "file_unique_id": item.get("file_unique_id"),
+            "mime_type": item.get("mime_type"),
+            "file_name": item.get("file_name"),
+            "size": item.get("size"),
+            "order_index": item.get("order_index", 0),
+        }
+        for tg_post_id, item in items
+    ]
+    if rows:
+        session.execute(insert(TgMediaItem), rows)
+
+
+def bulk_touch_album_states(session: Session, first_post_ids: Dict[str, int]) -> None:
+    if not first_post_ids:
+        return
+    now = utcnow()
+    stmt = pg_insert(AlbumState).values(
+        [
+            {
+                "media_group_id": media_group_id,
+                "status": "pending",
+                "last_seen_at": now,
+                "first_tg_post_id": tg_post_id,
+            }
+            for media_group_id, tg_post_id in first_post_ids.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AlbumState.media_group_id],
+        set_={
+            "last_seen_at": stmt.excluded.last_seen_at,
+            "status": case(
+                (AlbumState.status == "finalized", AlbumState.status),
+                else_="pending",
+            ),
+            "first_tg_post_id": func.coalesce(
+                AlbumState.first_tg_post_id, stmt.excluded.first_tg_post_id
+            ),
+        },
+    )
+    session.execute(stmt)
 
 
 def touch_album_state(
@@ -206,6 +252,34 @@ def list_recent_tg_posts(session: Session, limit: int) -> List[TgPost]:
     )
 
 
+def list_tg_posts_by_status(session: Session, status: str, limit: int) -> List[TgPost]:
+    return (
+        session.execute(
+            select(TgPost).where(TgPost.status == status).order_by(TgPost.id).limit(limit)
+        )
+        .scalars()
+        .all()
+    )
+
+
+def transition_tg_posts(
+    session: Session, tg_post_ids: List[int] | None, from_status: str, to_status: str
+) -> List[Tuple[int, str | None]]:
+    # Naming one item of an album moves the whole album; None moves every post in from_status.
+    stmt = update(TgPost).where(TgPost.status == from_status)
+    if tg_post_ids is not None:
+        if not tg_post_ids:
+            return []
+        albums = select(TgPost.media_group_id).where(
+            TgPost.id.in_(tg_post_ids), TgPost.media_group_id.is_not(None)
+        )
+        stmt = stmt.where(TgPost.id.in_(tg_post_ids) | TgPost.media_group_id.in_(albums))
+    rows = session.execute(
+        stmt.values(status=to_status, updated_at=utcnow()).returning(TgPost.id, TgPost.media_group_id)
+    ).all()
+    return sorted((tg_post_id, media_group_id) for tg_post_id, media_group_id in rows)
+
+
 def list_media_items_for_posts(session: Session, tg_post_ids: List[int]) -> List[TgMediaItem]:
     if not tg_post_ids:
         return []
@@ -232,6 +306,49 @@ def list_media_items_for_post(session: Session, tg_post_id: int) -> List[TgMedia
     )
 
 
+def get_media_profile_for_posts(
+    session: Session, tg_post_ids: List[int]
+) -> List[Tuple[str, int | None]]:
+    if not tg_post_ids:
+        return []
+    rows = session.execute(
+        select(TgMediaItem.type, TgMediaItem.size).where(TgMediaItem.tg_post_id.in_(tg_post_ids))
+    ).all()
+    return [(media_type, size) for media_type, size in rows]
+
+
+def get_media_profile_for_album(session: Session, media_group_id: str) -> List[Tuple[str, int | None]]:
+    rows = session.execute(
+        select(TgMediaItem.type, TgMediaItem.size)
+        .join(TgPost, TgPost.id == TgMediaItem.tg_post_id)
+        .where(TgPost.media_group_id == media_group_id)
+    ).all()
+    return [(media_type, size) for media_type, size in rows]
+
+
+def count_media_items_for_posts(session: Session, tg_post_ids: List[int]) -> Dict[int, int]:
+    if not tg_post_ids:
+        return {}
+    rows = session.execute(
+        select(TgMediaItem.tg_post_id, func.count())
+        .where(TgMediaItem.tg_post_id.in_(tg_post_ids))
+        .group_by(TgMediaItem.tg_post_id)
+    ).all()
+    counts = {tg_post_id: 0 for tg_post_id in tg_post_ids}
+    counts.update({tg_post_id: int(count) for tg_post_id, count in rows})
+    return counts
+
+
+def get_posted_tg_post_ids(session: Session, tg_post_ids: List[int]) -> set[int]:
+    if not tg_post_ids:
+        return set()
+    return set(
+        session.execute(select(VkPost.tg_post_id).where(VkPost.tg_post_id.in_(tg_post_ids)))
+        .scalars()
+        .all()
+    )
+
+
 def get_vk_post(session: Session, tg_post_id: int) -> VkPost | None:
     return (
         session.execute(select(VkPost).where(VkPost.tg_post_id == tg_post_id))
@@ -248,6 +365,7 @@ def record_vk_post(
     status: str,
     attachments_count: int,
     vk_response_json: dict,
+    latency: Dict[str, int] | None = None,
 ) -> None:
     vk_post = VkPost(
         tg_post_id=tg_post_id,
@@ -256,6 +374,7 @@ def record_vk_post(
         status=status,
         attachments_count=attachments_count,
         vk_response_json=vk_response_json,
+        **(latency or {}),
     )
     try:
         session.add(vk_post)
@@ -264,6 +383,40 @@ def record_vk_post(
         session.rollback()
 
 
+LATENCY_COMPONENTS = ("ingest_delay_ms", "queue_wait_ms", "processing_ms", "total_ms")
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+def get_latency_percentiles(session: Session, since: datetime, slo_ms: int) -> dict:
+    aggregates = [
+        func.percentile_cont(quantile).within_group(getattr(VkPost, component))
+        for component in LATENCY_COMPONENTS
+        for quantile in LATENCY_QUANTILES
+    ]
+    row = session.execute(
+        select(func.count(), func.count().filter(VkPost.total_ms <= slo_ms), *aggregates).where(
+            VkPost.created_at >= since, VkPost.total_ms.is_not(None)
+        )
+    ).one()
+    values = iter(row[2:])
+    percentiles = {
+        component: {f"p{int(quantile * 100)}": next(values) for quantile in LATENCY_QUANTILES}
+        for component in LATENCY_COMPONENTS
+    }
+    return {"count": int(row[0]), "within_slo": int(row[1]), "percentiles": percentiles}
+
+
+def bump_job_counters(session: Session, deltas: Dict[str, int]) -> None:
+    stmt = pg_insert(JobStatusCounter).values(
+        [{"status": status, "count": delta} for status, delta in sorted(deltas.items())]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JobStatusCounter.status],
+        set_={"count": JobStatusCounter.count + stmt.excluded.count},
+    )
+    session.execute(stmt)
+
+
 def create_job(
     session: Session,
     job_type: str,
@@ -283,6 +436,7 @@ def create_job(
     )
     session.add(job)
     session.flush()
+    bump_job_counters(session, {status: 1})
     return job
 
 
@@ -292,15 +446,20 @@ def update_job(
     status: str,
     retries: int | None = None,
     last_error: str | None = None,
+    stage_timings: dict | None = None,
 ) -> None:
     job = session.get(Job, job_id)
     if job is None:
         return
+    if job.status != status:
+        bump_job_counters(session, {job.status: -1, status: 1})
     job.status = status
     if retries is not None:
         job.retries = retries
     if last_error is not None:
         job.last_error = last_error
+    if stage_timings is not None:
+        job.stage_timings = stage_timings
 
 
 def list_failed_jobs(session: Session, limit: int) -> List[Job]:
@@ -314,11 +473,47 @@ def list_failed_jobs(session: Session, limit: int) -> List[Job]:
 
 
 def count_jobs_by_status(session: Session) -> dict:
-    rows = session.execute(select(Job.status, Job.id)).all()
-    counts: dict[str, int] = {}
-    for status, _ in rows:
-        counts[status] = counts.get(status, 0) + 1
-    return counts
+    rows = session.execute(select(Job.status, func.count()).group_by(Job.status)).all()
+    return {status: int(count) for status, count in rows}
+
+
+def get_job_status_counters(session: Session) -> dict:
+    rows = session.execute(
+        select(JobStatusCounter.status, JobStatusCounter.count).where(JobStatusCounter.count != 0)
+    ).all()
+    return {status: int(count) for status, count in rows}
+
+
+def count_recent_jobs_by_status(session: Session) -> Dict[str, dict]:
+    now = utcnow()
+    hour_ago = now - timedelta(hours=1)
+    day_ago = now - timedelta(days=1)
+    rows = session.execute(
+        select(
+            Job.status,
+            func.count().filter(Job.created_at >= hour_ago),
+            func.count(),
+        )
+        .where(Job.created_at >= day_ago)
+        .group_by(Job.status)
+    ).all()
+    last_hour = {status: int(hour) for status, hour, _ in rows if hour}
+    last_day = {status: int(day) for status, _, day in rows}
+    return {"last_hour": last_hour, "last_day": last_day}
+
+
+def list_slowest_jobs(session: Session, limit: int, since: datetime) -> List[Job]:
+    total_ms = Job.stage_timings["total_ms"].as_integer()
+    return (
+        session.execute(
+            select(Job)
+            .where(Job.created_at >= since, Job.stage_timings.is_not(None))
+            .order_by(total_ms.desc())
+            .limit(limit)
+        )
+        .scalars()
+        .all()
+    )
 
 
 def get_last_job_errors(session: Session, limit: int = 5) -> List[Job]:
@@ -332,3 +527,246 @@ def get_last_job_errors(session: Session, limit: int = 5) -> List[Job]:
         .scalars()
         .all()
     )
+
+
+def get_media_cache_entries(
+    session: Session, vk_group_id: int, keys: List[Tuple[str, str]]
+) -> List[VkMediaCache]:
+    if not keys:
+        return []
+    return (
+        session.execute(
+            select(VkMediaCache).where(
+                VkMediaCache.vk_group_id == vk_group_id,
+                tuple_(VkMediaCache.file_unique_id, VkMediaCache.media_type).in_(keys),
+                VkMediaCache.expires_at > utcnow(),
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+def upsert_media_cache_entry(
+    session: Session,
+    file_unique_id: str,
+    vk_group_id: int,
+    media_type: str,
+    attachment: str,
+    expires_at: datetime,
+) -> None:
+    stmt = pg_insert(VkMediaCache).values(
+        file_unique_id=file_unique_id,
+        vk_group_id=vk_group_id,
+        media_type=media_type,
+        attachment=attachment,
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[VkMediaCache.file_unique_id, VkMediaCache.vk_group_id, VkMediaCache.media_type],
+        set_={"attachment": stmt.excluded.attachment, "expires_at": stmt.excluded.expires_at},
+    )
+    session.execute(stmt)
+
+
+def delete_media_cache_entries(
+    session: Session, vk_group_id: int, attachments: List[str]
+) -> List[Tuple[str, str]]:
+    if not attachments:
+        return []
+    rows = session.execute(
+        delete(VkMediaCache)
+        .where(VkMediaCache.vk_group_id == vk_group_id, VkMediaCache.attachment.in_(attachments))
+        .returning(VkMediaCache.file_unique_id, VkMediaCache.media_type)
+    ).all()
+    return [(file_unique_id, media_type) for file_unique_id, media_type in rows]
+
+
+def claim_staged_media(
+    session: Session, tg_media_item_ids: List[int], vk_group_id: int, expires_at: datetime
+) -> List[int]:
+    if not tg_media_item_ids:
+        return []
+    stmt = (
+        pg_insert(StagedMedia)
+        .values(
+            [
+                {
+                    "tg_media_item_id": item_id,
+                    "vk_group_id": vk_group_id,
+                    "status": "pending",
+                    "expires_at": expires_at,
+                }
+                for item_id in tg_media_item_ids
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=[StagedMedia.tg_media_item_id, StagedMedia.vk_group_id])
+        .returning(StagedMedia.tg_media_item_id)
+    )
+    return list(session.execute(stmt).scalars().all())
+
+
+def fail_pending_staged_media(
+    session: Session, tg_media_item_ids: List[int], vk_group_id: int, note: str
+) -> int:
+    if not tg_media_item_ids:
+        return 0
+    result = session.execute(
+        update(StagedMedia)
+        .where(
+            StagedMedia.tg_media_item_id.in_(tg_media_item_ids),
+            StagedMedia.vk_group_id == vk_group_id,
+            StagedMedia.status == "pending",
+        )
+        .values(status="failed", note=note, updated_at=utcnow())
+    )
+    return cast(CursorResult, result).rowcount
+
+
+def checkpoint_staged_media(
+    session: Session,
+    tg_media_item_id: int,
+    vk_group_id: int,
+    attachment: str | None,
+    note: str | None,
+    expires_at: datetime,
+) -> None:
+    stmt = pg_insert(StagedMedia).values(
+        tg_media_item_id=tg_media_item_id,
+        vk_group_id=vk_group_id,
+        status="ready",
+        attachment=attachment,
+        note=note,
+        expires_at=expires_at,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StagedMedia.tg_media_item_id, StagedMedia.vk_group_id],
+        set_={
+            "status": stmt.excluded.status,
+            "attachment": stmt.excluded.attachment,
+            "note": stmt.excluded.note,
+            "expires_at": func.greatest(StagedMedia.expires_at, stmt.excluded.expires_at),
+            "updated_at": utcnow(),
+        },
+    )
+    session.execute(stmt)
+
+
+def get_ready_staged_media(
+    session: Session, tg_media_item_ids: List[int], vk_group_id: int
+) -> Dict[int, Tuple[str | None, str | None]]:
+    if not tg_media_item_ids:
+        return {}
+    rows = session.execute(
+        select(StagedMedia.tg_media_item_id, StagedMedia.attachment, StagedMedia.note).where(
+            StagedMedia.tg_media_item_id.in_(tg_media_item_ids),
+            StagedMedia.vk_group_id == vk_group_id,
+            StagedMedia.status == "ready",
+            StagedMedia.expires_at > utcnow(),
+        )
+    ).all()
+    return {item_id: (attachment, note) for item_id, attachment, note in rows}
+
+
+def get_pending_staged_media(
+    session: Session, tg_media_item_ids: List[int], vk_group_id: int
+) -> List[int]:
+    if not tg_media_item_ids:
+        return []
+    rows = session.execute(
+        select(StagedMedia.tg_media_item_id).where(
+            StagedMedia.tg_media_item_id.in_(tg_media_item_ids),
+            StagedMedia.vk_group_id == vk_group_id,
+            StagedMedia.status == "pending",
+            StagedMedia.expires_at > utcnow(),
+        )
+    ).scalars()
+    return list(rows)
+
+
+def delete_staged_media(session: Session, tg_media_item_ids: List[int], vk_group_id: int) -> int:
+    if not tg_media_item_ids:
+        return 0
+    # Pending rows belong to a prefetch still in flight; they expire and are collected later.
+    result = session.execute(
+        delete(StagedMedia).where(
+            StagedMedia.tg_media_item_id.in_(tg_media_item_ids),
+            StagedMedia.vk_group_id == vk_group_id,
+            StagedMedia.status != "pending",
+        )
+    )
+    return cast(CursorResult, result).rowcount
+
+
+def expire_staged_media_for_posts(session: Session, tg_post_ids: List[int]) -> int:
+    if not tg_post_ids:
+        return 0
+    items = select(TgMediaItem.id).where(TgMediaItem.tg_post_id.in_(tg_post_ids))
+    result = session.execute(
+        update(StagedMedia)
+        .where(StagedMedia.tg_media_item_id.in_(items))
+        .values(expires_at=utcnow(), updated_at=utcnow())
+    )
+    return cast(CursorResult, result).rowcount
+
+
+def count_ready_staged_media_for_posts(
+    session: Session, tg_post_ids: List[int], vk_group_id: int
+) -> Dict[int, int]:
+    if not tg_post_ids:
+        return {}
+    rows = session.execute(
+        select(TgMediaItem.tg_post_id, func.count())
+        .join(StagedMedia, StagedMedia.tg_media_item_id == TgMediaItem.id)
+        .where(
+            TgMediaItem.tg_post_id.in_(tg_post_ids),
+            StagedMedia.vk_group_id == vk_group_id,
+            StagedMedia.status == "ready",
+            StagedMedia.expires_at > utcnow(),
+        )
+        .group_by(TgMediaItem.tg_post_id)
+    ).all()
+    counts = {tg_post_id: 0 for tg_post_id in tg_post_ids}
+    counts.update({tg_post_id: int(count) for tg_post_id, count in rows})
+    return counts
+
+
+def pop_expired_staged_media(session: Session, limit: int = 500) -> List[Tuple[int, str | None]]:
+    expired = (
+        select(StagedMedia.tg_media_item_id, StagedMedia.vk_group_id)
+        .where(StagedMedia.expires_at <= utcnow())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = session.execute(
+        delete(StagedMedia)
+        .where(tuple_(StagedMedia.tg_media_item_id, StagedMedia.vk_group_id).in_(expired))
+        .returning(StagedMedia.vk_group_id, StagedMedia.attachment)
+    ).all()
+    return [(vk_group_id, attachment) for vk_group_id, attachment in rows]
+
+
+def get_cached_attachment_set(session: Session, vk_group_id: int, attachments: List[str]) -> set[str]:
+    if not attachments:
+        return set()
+    rows = session.execute(
+        select(VkMediaCache.attachment).where(
+            VkMediaCache.vk_group_id == vk_group_id, VkMediaCache.attachment.in_(attachments)
+        )
+    ).scalars()
+    return set(rows)
+
+
+def get_posted_attachment_set(session: Session, vk_group_id: int, attachments: List[str]) -> set[str]:
+    if not attachments:
+        return set()
+    # Posts recorded before attachments were stored in vk_response_json never match.
+    posted = VkPost.vk_response_json["attachments"]
+    rows = session.execute(
+        select(posted).where(
+            VkPost.vk_owner_id == -int(vk_group_id),
+            posted.has_any(array(attachments, type_=Text)),
+        )
+    ).scalars()
+    wanted = set(attachments)
+    return {attachment for row in rows for attachment in row if attachment in wanted}
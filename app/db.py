@@ -16,7 +16,10 @@ _engine = create_engine(
     future=True,
 )
 
-SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True)
+# Tasks read rows loaded inside a session_scope after it has committed and closed.
+SessionLocal = sessionmaker(
+    bind=_engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True
+)
 
 
 @contextmanager
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, Iterable, Tuple
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.logging_setup import get_logger
+from app.utils.redis_client import get_redis
+
+
+logger = get_logger(__name__)
+
+_LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+TG_UPDATES_PER_BATCH = Histogram(
+    "tg_updates_per_batch",
+    "Updates returned by one getUpdates call",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100),
+)
+TG_GET_UPDATES_SECONDS = Histogram(
+    "tg_get_updates_seconds",
+    "getUpdates round trip, including the long-poll wait",
+    buckets=_LATENCY_BUCKETS,
+)
+INGEST_TRANSACTION_SECONDS = Histogram(
+    "ingest_transaction_seconds",
+    "Time to persist one batch of updates and the offset",
+    buckets=_LATENCY_BUCKETS,
+)
+MEDIA_STAGE_SECONDS = Histogram(
+    "media_stage_seconds",
+    "Time spent per repost stage",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+MEDIA_BYTES = Counter(
+    "media_bytes",
+    "Media bytes moved between Telegram and VK",
+    ["direction"],
+)
+RETRIES = Counter(
+    "retries",
+    "Retried calls by call site",
+    ["name"],
+)
+REPOST_LATENCY_SECONDS = Histogram(
+    "repost_latency_seconds",
+    "Telegram publish to VK post latency and its components",
+    ["component"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 300, 600, 1800),
+)
+STAGED_MEDIA = Counter(
+    "staged_media",
+    "Prefetched media items by outcome",
+    ["outcome"],
+)
+DOWNLOAD_CACHE_REQUESTS = Counter(
+    "download_cache_requests",
+    "Local download cache lookups by result",
+    ["result"],
+)
+DOWNLOAD_CACHE_EVICTIONS = Counter(
+    "download_cache_evictions",
+    "Files evicted from the local download cache",
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "lock_wait_seconds",
+    "Time spent acquiring a Redis lock",
+    ["lock"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+LOCK_HOLD_SECONDS = Histogram(
+    "lock_hold_seconds",
+    "Time a Redis lock was held before release",
+    ["lock"],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 900, 3600),
+)
+
+
+def record_retry(name: str) -> None:
+    RETRIES.labels(name).inc()
+
+
+class QueueDepthCollector:
+    def __init__(self, redis_url: str, queues: Iterable[str], extra_keys: dict | None = None) -> None:
+        self.redis_url = redis_url
+        self.queues = list(queues)
+        self.extra_keys = extra_keys or {}
+
+    def collect(self):
+        depth = GaugeMetricFamily("celery_queue_depth", "Messages waiting in a Celery queue", labels=["queue"])
+        pending = GaugeMetricFamily("redis_pending_items", "Items waiting in a Redis sorted set", labels=["key"])
+        try:
+            client = get_redis(self.redis_url)
+            for queue in self.queues:
+                depth.add_metric([queue], client.llen(queue))
+            for label, key in self.extra_keys.items():
+                pending.add_metric([label], client.zcard(key))
+        except Exception as exc:
+            logger.warning("metrics_queue_depth_failed", extra={"error": str(exc)})
+        yield depth
+        yield pending
+
+
+class LatencyCollector:
+    # Percentiles come from SQL over vk_posts so they cover every worker, not one process.
+    def __init__(self, load: Callable[[], Dict[str, dict]]) -> None:
+        self.load = load
+
+    def collect(self):
+        quantiles = GaugeMetricFamily(
+            "repost_latency_percentile_seconds",
+            "Latency percentiles over a sliding window",
+            labels=["window", "component", "quantile"],
+        )
+        slo = GaugeMetricFamily(
+            "repost_latency_slo_ratio", "Share of posts within the latency SLO", labels=["window"]
+        )
+        try:
+            windows = self.load()
+        except Exception as exc:
+            logger.warning("metrics_latency_failed", extra={"error": str(exc)})
+            windows = {}
+        for window, stats in windows.items():
+            if stats["count"]:
+                slo.add_metric([window], stats["within_slo"] / stats["count"])
+            for component, values in stats["percentiles"].items():
+                for quantile, value in values.items():
+                    if value is not None:
+                        quantiles.add_metric(
+                            [window, component.removesuffix("_ms"), quantile], value / 1000
+                        )
+        yield quantiles
+        yield slo
+
+
+class DownloadCacheCollector:
+    # Disk usage is read at scrape time so every worker process sharing the volume agrees.
+    def __init__(self, usage: Callable[[], Tuple[int, int]]) -> None:
+        self.usage = usage
+
+    def collect(self):
+        size = GaugeMetricFamily("download_cache_bytes", "Bytes stored in the local download cache")
+        files = GaugeMetricFamily("download_cache_files", "Files stored in the local download cache")
+        try:
+            used, count = self.usage()
+            size.add_metric([], used)
+            files.add_metric([], count)
+        except Exception as exc:
+            logger.warning("metrics_download_cache_failed", extra={"error": str(exc)})
+        yield size
+        yield files
+
+
+def _serving_registry() -> CollectorRegistry:
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_metrics_server(port: int, collectors: Iterable[Collector] = ()) -> None:
+    if port <= 0:
+        return
+    registry = _serving_registry()
+    for collector in collectors:
+        registry.register(collector)
+    start_http_server(port, registry=registry)
+    logger.info("metrics_server_started", extra={"port": port})
+
+
+def mark_process_dead(pid: int) -> None:
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(pid)
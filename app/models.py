@@ -6,11 +6,13 @@ from sqlalchemy import (
     BigInteger,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
     func,
+    text as sql_text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -39,7 +41,14 @@ class Setting(Base):
 
 class TgPost(Base):
     __tablename__ = "tg_posts"
-    __table_args__ = (UniqueConstraint("channel_id", "message_id", name="uq_tg_msg"),)
+    __table_args__ = (
+        UniqueConstraint("channel_id", "message_id", name="uq_tg_msg"),
+        Index(
+            "ix_tg_posts_awaiting_approval",
+            "id",
+            postgresql_where=sql_text("status = 'awaiting_approval'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     channel_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
@@ -94,8 +103,12 @@ class VkPost(Base):
     status: Mapped[str] = mapped_column(String(32), nullable=False)
     attachments_count: Mapped[int] = mapped_column(Integer, nullable=False)
     vk_response_json: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    ingest_delay_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    queue_wait_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    processing_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    total_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), nullable=False
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
     )
 
 
@@ -112,6 +125,8 @@ class AlbumState(Base):
     )
 
 
+# Range-partitioned by created_at (monthly) in migration 0004; the real primary key is
+# (id, created_at) but ids come from one sequence, so the ORM keys on id alone.
 class Job(Base):
     __tablename__ = "jobs"
 
@@ -122,6 +137,64 @@ class Job(Base):
     last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
     tg_post_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
     media_group_id: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)
+    stage_timings: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+class JobArchive(Base):
+    __tablename__ = "jobs_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    type: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[str] = mapped_column(String(32), nullable=False)
+    retries: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    tg_post_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)
+    media_group_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    stage_timings: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class JobStatusCounter(Base):
+    __tablename__ = "job_status_counters"
+
+    status: Mapped[str] = mapped_column(String(32), primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+class VkMediaCache(Base):
+    __tablename__ = "vk_media_cache"
+
+    file_unique_id: Mapped[str] = mapped_column(String(256), primary_key=True)
+    vk_group_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    media_type: Mapped[str] = mapped_column(String(32), primary_key=True)
+    attachment: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+class StagedMedia(Base):
+    __tablename__ = "staged_media"
+
+    tg_media_item_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tg_media_items.id", ondelete="CASCADE"), primary_key=True
+    )
+    vk_group_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[str] = mapped_column(String(32), nullable=False)
+    attachment: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    note: Mapped[str | None] = mapped_column(Text, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
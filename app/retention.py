@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import re
+from typing import Dict, List, cast
+
+from sqlalchemy import CursorResult, text
+from sqlalchemy.orm import Session
+
+from app.crud import bump_job_counters, get_setting, set_setting, utcnow
+
+
+JOB_COLUMNS = (
+    "id, type, status, retries, last_error, tg_post_id, media_group_id, stage_timings, "
+    "created_at, updated_at"
+)
+
+_PARTITION_RE = re.compile(r"^jobs_p(\d{4})(\d{2})$")
+
+# Keeps only what build_tg_link reads, so old posts still link back to Telegram.
+_SLIM_PAYLOAD = (
+    "jsonb_strip_nulls(jsonb_build_object("
+    "'update_id', payload_json->'update_id', "
+    "'channel_post', jsonb_build_object("
+    "'message_id', payload_json->'channel_post'->'message_id', "
+    "'chat', jsonb_build_object("
+    "'id', payload_json->'channel_post'->'chat'->'id', "
+    "'username', payload_json->'channel_post'->'chat'->'username'))))"
+)
+
+_PAYLOAD_CURSOR_KEY = "payload_slimmed_through_id"
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"jobs_p{month:%Y%m}"
+
+
+def list_job_partitions(session: Session) -> Dict[str, datetime]:
+    names = session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'jobs'::regclass"
+        )
+    ).scalars()
+    partitions: Dict[str, datetime] = {}
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions[name] = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+    return partitions
+
+
+def _job_counts(session: Session, table: str, where: str = "", params: dict | None = None) -> Dict[str, int]:
+    rows = session.execute(
+        text(f"SELECT status, count(*) FROM {table} {where} GROUP BY status"), params or {}
+    ).all()
+    return {status: int(count) for status, count in rows}
+
+
+def _create_job_partition(session: Session, month: datetime) -> str:
+    name = partition_name(month)
+    lower = month.isoformat()
+    upper = add_months(month, 1).isoformat()
+    session.execute(text(f"CREATE TABLE {name} (LIKE jobs INCLUDING DEFAULTS)"))
+    # Rows that fell into the default partition for this month must move first, or ATTACH fails.
+    session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM jobs_default "
+            f"WHERE created_at >= :lower AND created_at < :upper RETURNING {JOB_COLUMNS}) "
+            f"INSERT INTO {name} ({JOB_COLUMNS}) SELECT {JOB_COLUMNS} FROM moved"
+        ),
+        {"lower": month, "upper": add_months(month, 1)},
+    )
+    session.execute(
+        text(f"ALTER TABLE jobs ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')")
+    )
+    return name
+
+
+def ensure_job_partitions(session: Session, ahead: int) -> List[str]:
+    existing = list_job_partitions(session)
+    current = month_start(utcnow())
+    created: List[str] = []
+    for offset in range(max(0, ahead) + 1):
+        month = add_months(current, offset)
+        if partition_name(month) in existing:
+            continue
+        created.append(_create_job_partition(session, month))
+    session.commit()
+    return created
+
+
+def _archive_jobs(session: Session, source: str, where: str = "", params: dict | None = None) -> None:
+    session.execute(
+        text(
+            f"INSERT INTO jobs_archive ({JOB_COLUMNS}) SELECT {JOB_COLUMNS} FROM {source} {where} "
+            "ON CONFLICT (id) DO NOTHING"
+        ),
+        params or {},
+    )
+
+
+def compact_job_partitions(session: Session, retention_days: int, archive: bool) -> List[str]:
+    if retention_days <= 0:
+        return []
+    cutoff = utcnow() - timedelta(days=retention_days)
+    removed: List[str] = []
+    for name, month in sorted(list_job_partitions(session).items(), key=lambda item: item[1]):
+        if add_months(month, 1) > cutoff:
+            continue
+        counts = _job_counts(session, name)
+        if archive:
+            _archive_jobs(session, name)
+        session.execute(text(f"ALTER TABLE jobs DETACH PARTITION {name}"))
+        session.execute(text(f"DROP TABLE {name}"))
+        if counts:
+            bump_job_counters(session, {status: -count for status, count in counts.items()})
+        session.commit()
+        removed.append(name)
+
+    where = "WHERE created_at < :cutoff"
+    counts = _job_counts(session, "jobs_default", where, {"cutoff": cutoff})
+    if counts:
+        if archive:
+            _archive_jobs(session, "jobs_default", where, {"cutoff": cutoff})
+        session.execute(text(f"DELETE FROM jobs_default {where}"), {"cutoff": cutoff})
+        bump_job_counters(session, {status: -count for status, count in counts.items()})
+        session.commit()
+        removed.append("jobs_default")
+    return removed
+
+
+def slim_tg_payloads(session: Session, retention_days: int, batch_size: int = 1000) -> int:
+    if retention_days <= 0:
+        return 0
+    cutoff = utcnow() - timedelta(days=retention_days)
+    after = int(get_setting(session, _PAYLOAD_CURSOR_KEY, "0") or 0)
+    slimmed = 0
+    while True:
+        ids = session.execute(
+            text(
+                "SELECT id FROM tg_posts WHERE id > :after AND created_at < :cutoff "
+                "ORDER BY id LIMIT :limit"
+            ),
+            {"after": after, "cutoff": cutoff, "limit": batch_size},
+        ).scalars().all()
+        if not ids:
+            return slimmed
+        result = session.execute(
+            text(
+                f"UPDATE tg_posts SET payload_json = {_SLIM_PAYLOAD} "
+                f"WHERE id = ANY(:ids) AND payload_json <> {_SLIM_PAYLOAD}"
+            ),
+            {"ids": list(ids)},
+        )
+        slimmed += cast(CursorResult, result).rowcount or 0
+        after = ids[-1]
+        set_setting(session, _PAYLOAD_CURSOR_KEY, str(after))
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from app.crud import get_runtime_settings
+from app.db import session_scope
+from app.logging_setup import get_logger
+from app.utils.redis_client import get_redis
+
+
+SETTINGS_CHANNEL = "tg_vk_bot:settings_changed"
+
+logger = get_logger(__name__)
+
+
+def defaults_from_settings(settings) -> dict:
+    return {
+        "autoposting_enabled": True,
+        "mode": settings.MODE,
+        "limit_strategy": settings.LIMIT_STRATEGY,
+        "vk_group_id": settings.VK_GROUP_ID,
+        "source_channel_ids": ",".join(str(x) for x in settings.SOURCE_CHANNEL_IDS),
+    }
+
+
+class RuntimeSettingsCache:
+    def __init__(self, settings) -> None:
+        self.settings = settings
+        self.ttl = settings.RUNTIME_SETTINGS_TTL_SEC
+        self._value: dict | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener_pid: int | None = None
+
+    def get(self) -> dict:
+        self._ensure_listener()
+        value = self._value
+        if value is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return value
+
+        with self._lock:
+            value = self._value
+            if value is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return value
+            generation = self._generation
+            with session_scope() as session:
+                value = get_runtime_settings(session, defaults_from_settings(self.settings))
+            # Don't cache a value read before an invalidation that raced with the load.
+            if generation == self._generation:
+                self._value = value
+                self._loaded_at = time.monotonic()
+            return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._value = None
+
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            thread = threading.Thread(
+                target=self._listen, name="runtime-settings-listener", daemon=True
+            )
+            thread.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = get_redis(self.settings.REDIS_URL).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(SETTINGS_CHANNEL)
+                # Anything published while we were disconnected is lost, so start fresh.
+                self.invalidate()
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.invalidate()
+            except Exception as exc:
+                logger.warning("runtime_settings_listener_failed", extra={"error": str(exc)})
+                self.invalidate()
+                time.sleep(1)
+
+
+_cache: RuntimeSettingsCache | None = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache(settings) -> RuntimeSettingsCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RuntimeSettingsCache(settings)
+    return _cache
+
+
+def get_runtime(settings) -> dict:
+    return _get_cache(settings).get()
+
+
+def publish_settings_changed(settings) -> None:
+    _get_cache(settings).invalidate()
+    try:
+        get_redis(settings.REDIS_URL).publish(SETTINGS_CHANNEL, "1")
+    except Exception as exc:
+        logger.warning("runtime_settings_publish_failed", extra={"error": str(exc)})
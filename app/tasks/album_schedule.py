@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import time
+from typing import Iterable, List
+
+from app.config import get_settings
+from app.utils.redis_client import get_redis
+
+
+ALBUM_DEADLINES_KEY = "tg_vk_bot:album_deadlines"
+
+# Pops due albums atomically, so concurrent schedulers never emit the same album twice.
+_POP_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+settings = get_settings()
+_pop_due_script = None
+
+
+def schedule_album_finalizes(media_group_ids: Iterable[str], delay: float) -> None:
+    deadline = time.time() + delay
+    # Re-adding an album moves its deadline, which is what debounces the quiet window.
+    mapping = {media_group_id: deadline for media_group_id in media_group_ids}
+    if mapping:
+        get_redis(settings.REDIS_URL).zadd(ALBUM_DEADLINES_KEY, mapping)
+
+
+def schedule_album_finalize(media_group_id: str, delay: float) -> None:
+    schedule_album_finalizes([media_group_id], delay)
+
+
+def pop_due_albums(limit: int = 100) -> List[str]:
+    global _pop_due_script
+    if _pop_due_script is None:
+        _pop_due_script = get_redis(settings.REDIS_URL).register_script(_POP_DUE_LUA)
+    due = _pop_due_script(keys=[ALBUM_DEADLINES_KEY], args=[time.time(), limit])
+    return [item.decode() if isinstance(item, bytes) else item for item in due]
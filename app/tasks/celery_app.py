@@ -1,11 +1,30 @@
 from __future__ import annotations
 
+import os
+
 from celery import Celery
+from kombu import Queue
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown
 
 from app.config import get_settings
+from app.logging_setup import get_logger
+from app.metrics import (
+    DownloadCacheCollector,
+    QueueDepthCollector,
+    mark_process_dead,
+    start_metrics_server,
+)
+from app.utils.download_cache import get_download_cache
+from app.utils.http import close_http_clients, open_http_clients
 
 
 settings = get_settings()
+logger = get_logger(__name__)
+
+# Posts are routed by media size/type (app.tasks.routing) so video transfers never hold up
+# text and photo posts; workers without -Q consume both queues.
+LIGHT_QUEUE = "tg_vk_bot"
+HEAVY_QUEUE = "tg_vk_bot_heavy"
 
 celery_app = Celery(
     "tg_vk_bot",
@@ -14,11 +33,50 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_default_queue="tg_vk_bot",
+    task_default_queue=LIGHT_QUEUE,
+    task_queues=(Queue(LIGHT_QUEUE), Queue(HEAVY_QUEUE)),
     task_acks_late=True,
     worker_prefetch_multiplier=1,
     broker_connection_retry_on_startup=True,
+    beat_schedule={
+        "compact-storage": {
+            "task": "app.tasks.maintenance.compact_storage",
+            "schedule": float(settings.RETENTION_INTERVAL_SEC),
+        },
+        "gc-staged-media": {
+            "task": "app.tasks.maintenance.gc_staged_media",
+            "schedule": float(settings.RETENTION_INTERVAL_SEC),
+        },
+    },
 )
 
+
+@worker_init.connect
+def _start_metrics_server(**_: object) -> None:
+    if settings.WORKER_METRICS_PORT > 0 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        logger.warning("metrics_multiproc_dir_missing")
+    try:
+        start_metrics_server(
+            settings.WORKER_METRICS_PORT,
+            [
+                QueueDepthCollector(settings.REDIS_URL, [LIGHT_QUEUE, HEAVY_QUEUE]),
+                DownloadCacheCollector(get_download_cache().usage),
+            ],
+        )
+    except OSError as exc:
+        logger.error("metrics_server_failed", extra={"error": str(exc)})
+
+
+@worker_process_init.connect
+def _open_http_clients(**_: object) -> None:
+    open_http_clients()
+
+
+@worker_process_shutdown.connect
+def _close_worker_process(**_: object) -> None:
+    close_http_clients()
+    mark_process_dead(os.getpid())
+
+
 # Ensure task modules are imported so Celery registers them.
-from app.tasks import repost  # noqa: F401
+from app.tasks import maintenance, repost  # noqa: F401
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from app.config import get_settings
+from app.crud import get_cached_attachment_set, get_posted_attachment_set, pop_expired_staged_media
+from app.db import session_scope
+from app.logging_setup import get_logger
+from app.metrics import STAGED_MEDIA
+from app.retention import compact_job_partitions, ensure_job_partitions, slim_tg_payloads
+from app.tasks.celery_app import celery_app
+from app.utils.locks import RedisLock
+from app.vk.client import VKClient
+from app.vk.token_manager import get_user_access_token
+from app.vk.uploads import delete_uploaded_attachments
+
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+
+@celery_app.task
+def compact_storage() -> None:
+    lock = RedisLock(settings.REDIS_URL, "compact_storage", ttl=max(60, settings.RETENTION_INTERVAL_SEC))
+    if not lock.acquire():
+        logger.info("compact_storage_skipped", extra={"reason": "already running"})
+        return
+    try:
+        with session_scope() as session:
+            created = ensure_job_partitions(session, settings.JOBS_PARTITIONS_AHEAD)
+        with session_scope() as session:
+            removed = compact_job_partitions(
+                session, settings.JOBS_RETENTION_DAYS, settings.JOBS_ARCHIVE_ENABLED
+            )
+        with session_scope() as session:
+            slimmed = slim_tg_payloads(session, settings.PAYLOAD_RETENTION_DAYS)
+        logger.info(
+            "compact_storage_done",
+            extra={"partitions_created": created, "partitions_removed": removed, "payloads_slimmed": slimmed},
+        )
+    finally:
+        lock.release()
+
+
+@celery_app.task
+def gc_staged_media(batch_size: int = 500) -> None:
+    expired = 0
+    orphans: List[str] = []
+    while True:
+        with session_scope() as session:
+            rows = pop_expired_staged_media(session, batch_size)
+            by_group: Dict[int, List[str]] = {}
+            for vk_group_id, attachment in rows:
+                if attachment:
+                    by_group.setdefault(vk_group_id, []).append(attachment)
+            # Attachments that made it into the media cache are still reused by reposts, and
+            # ones recorded in vk_posts are live on the wall.
+            for vk_group_id, attachments in by_group.items():
+                kept = get_cached_attachment_set(session, vk_group_id, attachments)
+                kept |= get_posted_attachment_set(session, vk_group_id, attachments)
+                orphans.extend(a for a in attachments if a not in kept)
+        expired += len(rows)
+        if len(rows) < batch_size:
+            break
+
+    deleted = 0
+    if orphans:
+        vk_client = VKClient(settings.VK_ACCESS_TOKEN, settings.VK_API_VERSION)
+        deleted = delete_uploaded_attachments(vk_client, orphans, get_user_access_token())
+    STAGED_MEDIA.labels("expired").inc(expired)
+    logger.info(
+        "gc_staged_media_done",
+        extra={"expired": expired, "orphans": len(orphans), "vk_deleted": deleted},
+    )
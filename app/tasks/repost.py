@@ -1,53 +1,75 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import time
+from typing import IO, Callable, Dict, List, Tuple, cast
+
+import httpx
 
 from app.config import get_settings
 from app.crud import (
+    checkpoint_staged_media,
+    claim_staged_media,
     create_job,
+    delete_staged_media,
+    fail_pending_staged_media,
     get_album_posts,
-    get_runtime_settings,
+    get_pending_staged_media,
+    get_posted_tg_post_ids,
+    get_ready_staged_media,
     get_tg_post_by_id,
-    get_vk_post,
     list_media_items_for_post,
     list_media_items_for_posts,
     mark_album_finalized,
     record_vk_post,
     update_job,
+    utcnow,
 )
 from app.db import session_scope
 from app.logging_setup import get_logger, setup_logging
+from app.metrics import MEDIA_BYTES, REPOST_LATENCY_SECONDS, STAGED_MEDIA
 from app.models import AlbumState
+from app.runtime_settings import get_runtime
+from app.tasks.album_schedule import schedule_album_finalize
 from app.tasks.celery_app import celery_app
 from app.tasks.utils import build_tg_link, notify_admins
-from app.tg.client import TelegramClient
-from app.utils.files import cleanup_file, ensure_dir
+from app.tg.client import TelegramAPIError, TelegramClient
+from app.utils.download_cache import get_download_cache
+from app.utils.files import ensure_dir
 from app.utils.locks import RedisLock
+from app.utils.relay import RelayError
+from app.utils.timing import StageTimer
 from app.vk.client import VKClient
+from app.vk.media_cache import get_cached_attachments, invalidate_attachments, store_attachments
 from app.vk.token_manager import get_user_access_token
-from app.vk.uploads import upload_document, upload_photo, upload_video
-from app.vk.wall import post_to_wall
+from app.vk.types import VKAPIError
+from app.vk.uploads import (
+    PendingPhoto,
+    UploadSource,
+    get_photo_upload_server,
+    save_wall_photos,
+    upload_document,
+    upload_photo_to_server,
+    reserve_video,
+    upload_video,
+)
+from app.vk.wall import post_many_to_wall, post_to_wall
 
 
 settings = get_settings()
 setup_logging(settings.LOG_LEVEL)
 logger = get_logger(__name__)
 
+# (attachment, note) for a finished item. Uploaded photos are PendingPhoto until the batched save.
+MediaResult = Tuple[str | None, str | None]
+UploadResult = Tuple[str | PendingPhoto | None, str | None]
 
-def _defaults_from_settings() -> dict:
-    return {
-        "autoposting_enabled": True,
-        "mode": settings.MODE,
-        "limit_strategy": settings.LIMIT_STRATEGY,
-        "vk_group_id": settings.VK_GROUP_ID,
-        "source_channel_ids": ",".join(str(x) for x in settings.SOURCE_CHANNEL_IDS),
-    }
+_STAGED_POLL_SEC = 1.0
 
 
 def _load_runtime() -> dict:
-    with session_scope() as session:
-        return get_runtime_settings(session, _defaults_from_settings())
+    return get_runtime(settings)
 
 
 def _chunk_list(items: List[str], size: int) -> List[List[str]]:
@@ -65,63 +87,315 @@ def _build_message(base_text: str | None, notes: List[str]) -> str:
     return base
 
 
-def _upload_media_items(
-    media_items,
+def _media_item_dict(item) -> dict:
+    return {
+        "id": item.id,
+        "type": item.type,
+        "file_id": item.file_id,
+        "file_unique_id": item.file_unique_id,
+        "mime_type": item.mime_type,
+        "file_name": item.file_name,
+        "size": item.size,
+        "order_index": item.order_index,
+        "tg_post_id": item.tg_post_id,
+    }
+
+
+def _upload_source(
+    item: dict,
+    source: UploadSource,
+    vk_client: VKClient,
+    vk_group_id: int,
+    user_token: str | None,
+    photo_upload_url: str | None = None,
+    video_save: dict | None = None,
+) -> str | PendingPhoto:
+    file_name_hint = item.get("file_name") or item["file_id"]
+    if item["type"] == "photo":
+        # Photos are only pushed to the upload server here; saves are batched afterwards.
+        return upload_photo_to_server(
+            vk_client, source, vk_group_id, user_token=user_token, upload_url=photo_upload_url
+        )
+    if item["type"] == "video":
+        return upload_video(
+            vk_client, source, vk_group_id, title=file_name_hint, user_token=user_token, save=video_save
+        )
+    return upload_document(
+        vk_client, source, vk_group_id, title=file_name_hint, user_token=user_token
+    )
+
+
+def _upload_media_item(
+    item: dict,
     tg_client: TelegramClient,
     vk_client: VKClient,
     vk_group_id: int,
-) -> Tuple[List[str], List[str]]:
-    ensure_dir(settings.TEMP_DIR)
-    attachments: List[str] = []
-    notes: List[str] = []
+    user_token: str | None,
+    timer: StageTimer,
+    index: int,
+    photo_upload_url: str | None = None,
+) -> UploadResult:
+    file_id = item["file_id"]
+    file_name_hint = item.get("file_name") or file_id
+    if item["type"] not in {"photo", "video", "document"}:
+        return None, f"Skipped unsupported type: {item['type']}"
 
     max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
-    user_token = get_user_access_token()
+    too_big_note = f"Skipped {file_name_hint}: exceeds {settings.MAX_FILE_SIZE_MB}MB"
+    with timer.stage("getfile", item=index):
+        info = tg_client.get_file(file_id)
+    file_size = int(info.get("file_size") or 0)
+    if file_size > max_bytes:
+        return None, too_big_note
+
+    video_save = None
+    if settings.MEDIA_RELAY_MODE == "stream" and file_size and info.get("file_path"):
+        if item["type"] == "video":
+            # Kept for the temp file fallback, which must upload into the same video.
+            video_save = reserve_video(vk_client, vk_group_id, file_name_hint, user_token)
+        stream = tg_client.relay_file(info, settings.MEDIA_RELAY_BUFFER_MB * 1024 * 1024)
+        try:
+            with timer.stage("upload", item=index):
+                # RelayStream is a RawIOBase, which typeshed does not count as IO[bytes].
+                source = cast(IO[bytes], stream)
+                result = _upload_source(
+                    item, source, vk_client, vk_group_id, user_token, photo_upload_url, video_save
+                )
+            MEDIA_BYTES.labels("download").inc(file_size)
+            MEDIA_BYTES.labels("upload").inc(file_size)
+            return result, None
+        except (httpx.HTTPError, RelayError) as exc:
+            logger.warning(
+                "media_relay_failed_fallback",
+                extra={"file_id": file_id, "error": str(exc)},
+            )
+        finally:
+            stream.close()
+
+    if not info.get("file_path"):
+        raise TelegramAPIError("Missing file_path in getFile response")
+    with timer.stage("download", item=index):
+        # Keyed by file_unique_id, so retries and reposts to other groups skip the download.
+        downloaded = get_download_cache().acquire(
+            item.get("file_unique_id"),
+            lambda dest_path: tg_client.download_file(info["file_path"], dest_path),
+        )
+    try:
+        if downloaded.size > max_bytes:
+            return None, too_big_note
+        if not downloaded.hit:
+            MEDIA_BYTES.labels("download").inc(downloaded.size)
+        with timer.stage("upload", item=index):
+            result = _upload_source(
+                item, downloaded.path, vk_client, vk_group_id, user_token, photo_upload_url, video_save
+            )
+        MEDIA_BYTES.labels("upload").inc(downloaded.size)
+        return result, None
+    finally:
+        downloaded.release()
+
+
+def _lookup_cached_attachments(media_items, vk_group_id: int) -> dict:
+    keys = [
+        (item["file_unique_id"], item["type"])
+        for item in media_items
+        if item.get("file_unique_id")
+    ]
+    try:
+        return get_cached_attachments(vk_group_id, keys)
+    except Exception as exc:
+        logger.warning("vk_media_cache_lookup_failed", extra={"error": str(exc)})
+        return {}
+
+
+def _cached_attachment(item: dict, cached: dict) -> str | None:
+    file_unique_id = item.get("file_unique_id")
+    if not file_unique_id:
+        return None
+    return cached.get((file_unique_id, item["type"]))
+
+
+def _upload_media_results(
+    media_items,
+    known: Dict[int, MediaResult],
+    tg_client: TelegramClient,
+    vk_client: VKClient,
+    vk_group_id: int,
+    timer: StageTimer,
+    on_done: Callable[[int, MediaResult], None] | None = None,
+) -> List[MediaResult]:
+    if len(known) == len(media_items):
+        return [known[index] for index in range(len(media_items))]
+    ensure_dir(settings.TEMP_DIR)
 
-    for item in media_items:
-        file_id = item["file_id"]
-        file_name_hint = item.get("file_name") or file_id
+    with timer.stage("token"):
+        user_token = get_user_access_token()
 
-        downloaded = tg_client.download_file_by_id(file_id, settings.TEMP_DIR, max_bytes)
-        if downloaded is None:
-            notes.append(f"Skipped {file_name_hint}: exceeds {settings.MAX_FILE_SIZE_MB}MB")
-            continue
+    photo_upload_url = None
+    if any(item["type"] == "photo" and index not in known for index, item in enumerate(media_items)):
+        # One upload server serves every photo of the post.
+        with timer.stage("upload_server"):
+            photo_upload_url = get_photo_upload_server(vk_client, vk_group_id, user_token)
 
+    def upload(index: int, item: dict) -> UploadResult:
+        if index in known:
+            return known[index]
+        value, note = _upload_media_item(
+            item, tg_client, vk_client, vk_group_id, user_token, timer, index, photo_upload_url
+        )
+        # Photos only become attachments after the batched save below.
+        if on_done and not isinstance(value, PendingPhoto):
+            on_done(index, (value, note))
+        return value, note
+
+    width = min(max(1, settings.UPLOAD_CONCURRENCY), len(media_items))
+    finished: Dict[int, UploadResult] = {}
+    error: BaseException | None = None
+    if width <= 1:
+        for index, item in enumerate(media_items):
+            try:
+                finished[index] = upload(index, item)
+            except Exception as exc:
+                error = exc
+                break
+    else:
+        with ThreadPoolExecutor(max_workers=width, thread_name_prefix="media-upload") as executor:
+            futures = [
+                executor.submit(upload, index, item) for index, item in enumerate(media_items)
+            ]
+            for future in futures:
+                if future.exception() is not None:
+                    for other in futures:
+                        other.cancel()
+                    break
+        # Leaving the executor waited for uploads already running; their photos are saved below.
+        for index, future in enumerate(futures):
+            if future.cancelled():
+                continue
+            if future.exception() is None:
+                finished[index] = future.result()
+            elif error is None:
+                error = future.exception()
+
+    results: Dict[int, MediaResult] = {}
+    pending: List[Tuple[int, PendingPhoto, str | None]] = []
+    for index, (value, note) in sorted(finished.items()):
+        if isinstance(value, PendingPhoto):
+            pending.append((index, value, note))
+        else:
+            results[index] = (value, note)
+    if pending:
+        # Also runs when a later item failed, so a retry does not send these photos again.
         try:
-            if item["type"] == "photo":
-                attachment = upload_photo(
-                    vk_client,
-                    downloaded.path,
-                    vk_group_id,
-                    user_token=user_token,
-                )
-            elif item["type"] == "video":
-                attachment = upload_video(
-                    vk_client,
-                    downloaded.path,
-                    vk_group_id,
-                    title=file_name_hint,
-                    user_token=user_token,
-                )
-            elif item["type"] == "document":
-                attachment = upload_document(
-                    vk_client,
-                    downloaded.path,
-                    vk_group_id,
-                    title=file_name_hint,
-                    user_token=user_token,
+            with timer.stage("save"):
+                saved = save_wall_photos(vk_client, [photo for _, photo, _ in pending], user_token)
+        except Exception as exc:
+            if error is None:
+                raise
+            logger.warning("photo_save_after_failure_failed", extra={"error": str(exc)})
+        else:
+            for (index, _, note), attachment in zip(pending, saved, strict=True):
+                results[index] = (attachment, note)
+                if on_done:
+                    on_done(index, results[index])
+    if error is not None:
+        raise error
+    # Collected by index, so attachments keep the album order.
+    return [results[index] for index in range(len(media_items))]
+
+
+def _checkpointer(
+    media_items, vk_group_id: int, ttl_sec: int
+) -> Callable[[int, MediaResult], None]:
+    expires_at = utcnow() + timedelta(seconds=ttl_sec)
+
+    def checkpoint(index: int, result: MediaResult) -> None:
+        # Lets a retry resume from the items that did not finish instead of re-transferring all.
+        attachment, note = result
+        try:
+            with session_scope() as session:
+                checkpoint_staged_media(
+                    session, media_items[index]["id"], vk_group_id, attachment, note, expires_at
                 )
-            else:
-                notes.append(f"Skipped unsupported type: {item['type']}")
-                continue
+        except Exception as exc:
+            logger.warning(
+                "media_checkpoint_failed",
+                extra={"tg_media_item_id": media_items[index]["id"], "error": str(exc)},
+            )
+
+    return checkpoint
+
 
+def _upload_media_items(
+    media_items,
+    tg_client: TelegramClient,
+    vk_client: VKClient,
+    vk_group_id: int,
+    timer: StageTimer,
+    use_cache: bool = True,
+    staged: Dict[int, MediaResult] | None = None,
+) -> Tuple[List[str], List[str]]:
+    attachments: List[str] = []
+    notes: List[str] = []
+
+    cached = _lookup_cached_attachments(media_items, vk_group_id) if use_cache else {}
+    known: Dict[int, MediaResult] = {}
+    for index, item in enumerate(media_items):
+        hit = _cached_attachment(item, cached)
+        if hit:
+            known[index] = (hit, None)
+        elif staged is not None and item["id"] in staged:
+            known[index] = staged[item["id"]]
+    if staged is not None:
+        used = sum(1 for item in media_items if item["id"] in staged)
+        STAGED_MEDIA.labels("used").inc(used)
+        STAGED_MEDIA.labels("missed").inc(len(media_items) - len(known))
+
+    results = _upload_media_results(
+        media_items,
+        known,
+        tg_client,
+        vk_client,
+        vk_group_id,
+        timer,
+        on_done=_checkpointer(media_items, vk_group_id, settings.STAGED_MEDIA_TTL_SEC),
+    )
+
+    new_entries = []
+    for item, (attachment, note) in zip(media_items, results, strict=True):
+        if attachment:
             attachments.append(attachment)
-        finally:
-            cleanup_file(downloaded.path)
+            if item.get("file_unique_id") and not _cached_attachment(item, cached):
+                new_entries.append((item["file_unique_id"], item["type"], attachment))
+        if note:
+            notes.append(note)
+
+    if new_entries:
+        try:
+            store_attachments(vk_group_id, new_entries)
+        except Exception as exc:
+            logger.warning("vk_media_cache_store_failed", extra={"error": str(exc)})
 
     return attachments, notes
 
 
+def _wait_for_staged(tg_media_item_ids: List[int], vk_group_id: int) -> Dict[int, MediaResult]:
+    # Items a prefetch has claimed are still on their way to VK; uploading them here as well
+    # would transfer them twice. Claims still pending at the deadline are uploaded by the caller.
+    deadline = time.monotonic() + settings.STAGED_MEDIA_WAIT_SEC
+    while True:
+        with session_scope() as session:
+            pending = get_pending_staged_media(session, tg_media_item_ids, vk_group_id)
+            if not pending or time.monotonic() >= deadline:
+                if pending:
+                    logger.warning(
+                        "staged_media_wait_expired",
+                        extra={"vk_group_id": vk_group_id, "pending": len(pending)},
+                    )
+                return get_ready_staged_media(session, tg_media_item_ids, vk_group_id)
+        time.sleep(_STAGED_POLL_SEC)
+
+
 def _post_with_limit_strategy(
     vk_client: VKClient,
     vk_group_id: int,
@@ -142,13 +416,14 @@ def _post_with_limit_strategy(
     if limit_strategy == "split_posts":
         chunks = _chunk_list(attachments, 10)
         total = len(chunks)
+        parts = []
         for idx, chunk in enumerate(chunks, start=1):
             prefix = f"{idx}/{total} "
             part_message = prefix + (message or "")
             if idx == 1:
                 part_message = _build_message(part_message, notes)
-            response = post_to_wall(vk_client, vk_group_id, part_message, chunk)
-            responses.append(response)
+            parts.append((part_message, chunk))
+        responses.extend(post_many_to_wall(vk_client, vk_group_id, parts))
         return responses
 
     trunc_notes = list(notes)
@@ -160,9 +435,167 @@ def _post_with_limit_strategy(
     return responses
 
 
+def _release_staged(media_items, vk_group_id: int) -> None:
+    # Once attachments may be on the wall, their staged rows must not expire into gc_staged_media.
+    try:
+        with session_scope() as session:
+            delete_staged_media(session, [item["id"] for item in media_items], vk_group_id)
+    except Exception as exc:
+        logger.warning("staged_media_release_failed", extra={"error": str(exc)})
+
+
+def _post_and_release(
+    media_items, vk_group_id: int, post: Callable[[], List[dict]], splits: bool
+) -> List[dict]:
+    try:
+        responses = post()
+    except VKAPIError:
+        # A rejected single post published nothing; a split post may be partly on the wall.
+        if splits:
+            _release_staged(media_items, vk_group_id)
+        raise
+    except Exception:
+        # The post may have gone through before the connection failed.
+        _release_staged(media_items, vk_group_id)
+        raise
+    _release_staged(media_items, vk_group_id)
+    return responses
+
+
+def _post_with_cache_recovery(
+    media_items,
+    attachments: List[str],
+    notes: List[str],
+    tg_client: TelegramClient,
+    vk_client: VKClient,
+    vk_group_id: int,
+    message: str,
+    limit_strategy: str,
+    tg_link: str,
+    timer: StageTimer,
+) -> Tuple[List[str], List[dict]]:
+    def post(attachments: List[str], notes: List[str]) -> List[dict]:
+        with timer.stage("wall_post"):
+            return _post_with_limit_strategy(
+                vk_client, vk_group_id, message, attachments, limit_strategy, tg_link, notes
+            )
+
+    # A split post may already be partly on the wall, so only single posts are retried.
+    splits = len(attachments) > 10 and limit_strategy == "split_posts"
+    try:
+        return attachments, _post_and_release(
+            media_items, vk_group_id, lambda: post(attachments, notes), splits
+        )
+    except VKAPIError as exc:
+        if splits or not exc.is_invalid_attachment_error():
+            raise
+        if not invalidate_attachments(vk_group_id, attachments):
+            raise
+        logger.warning("vk_cached_attachment_rejected", extra={"error": str(exc)})
+
+    attachments, notes = _upload_media_items(
+        media_items, tg_client, vk_client, vk_group_id, timer, use_cache=False
+    )
+    splits = len(attachments) > 10 and limit_strategy == "split_posts"
+    return attachments, _post_and_release(
+        media_items, vk_group_id, lambda: post(attachments, notes), splits
+    )
+
+
+def _latency(
+    posted_at: datetime, ingested_at: datetime, enqueued_at: float | None, started_at: float
+) -> Dict[str, int] | None:
+    # Manual /repost and /retry_failed runs carry no enqueue time and stay out of the SLO.
+    if enqueued_at is None:
+        return None
+    finished_at = time.time()
+    latency = {
+        "ingest_delay_ms": max(0, int((ingested_at - posted_at).total_seconds() * 1000)),
+        "queue_wait_ms": max(0, int((started_at - enqueued_at) * 1000)),
+        "processing_ms": int((finished_at - started_at) * 1000),
+        "total_ms": max(0, int((finished_at - posted_at.timestamp()) * 1000)),
+    }
+    for component, value in latency.items():
+        REPOST_LATENCY_SECONDS.labels(component.removesuffix("_ms")).observe(value / 1000)
+    return latency
+
+
+def _prefetch_items(media_items, vk_group_id: int, ttl_sec: int | None, log_extra: dict) -> None:
+    cached = _lookup_cached_attachments(media_items, vk_group_id)
+    media_items = [item for item in media_items if not _cached_attachment(item, cached)]
+    if not media_items:
+        return
+
+    ttl_sec = ttl_sec or settings.STAGED_MEDIA_TTL_SEC
+    expires_at = utcnow() + timedelta(seconds=ttl_sec)
+    with session_scope() as session:
+        claimed = set(
+            claim_staged_media(session, [item["id"] for item in media_items], vk_group_id, expires_at)
+        )
+    media_items = [item for item in media_items if item["id"] in claimed]
+    if not media_items:
+        return
+
+    tg_client = TelegramClient(settings.TG_BOT_TOKEN)
+    vk_client = VKClient(settings.VK_ACCESS_TOKEN, settings.VK_API_VERSION)
+    try:
+        _upload_media_results(
+            media_items,
+            {},
+            tg_client,
+            vk_client,
+            vk_group_id,
+            StageTimer(),
+            on_done=_checkpointer(media_items, vk_group_id, ttl_sec),
+        )
+    except Exception as exc:
+        # Items that finished stay staged; finalize uploads the rest itself.
+        with session_scope() as session:
+            failed = fail_pending_staged_media(
+                session, [item["id"] for item in media_items], vk_group_id, str(exc)
+            )
+        STAGED_MEDIA.labels("staged").inc(len(media_items) - failed)
+        STAGED_MEDIA.labels("failed").inc(failed)
+        logger.warning("media_prefetch_failed", extra={**log_extra, "error": str(exc)})
+        return
+
+    STAGED_MEDIA.labels("staged").inc(len(media_items))
+    logger.info("media_prefetched", extra={**log_extra, "count": len(media_items)})
+
+
+@celery_app.task
+def prefetch_media(tg_post_id: int, ttl_sec: int | None = None) -> None:
+    vk_group_id = _load_runtime()["vk_group_id"]
+    with session_scope() as session:
+        if get_posted_tg_post_ids(session, [tg_post_id]):
+            return
+        media_items = [
+            _media_item_dict(item) for item in list_media_items_for_post(session, tg_post_id)
+        ]
+    _prefetch_items(media_items, vk_group_id, ttl_sec, {"tg_post_id": tg_post_id})
+
+
+@celery_app.task
+def prefetch_album(media_group_id: str, ttl_sec: int | None = None) -> None:
+    # One task per album and batch, so its photos share an upload server and one batched save.
+    # Items an earlier batch already claimed are skipped by the claim.
+    vk_group_id = _load_runtime()["vk_group_id"]
+    with session_scope() as session:
+        post_ids = [post.id for post in get_album_posts(session, media_group_id)]
+        if not post_ids or get_posted_tg_post_ids(session, post_ids):
+            return
+        media_items = [
+            _media_item_dict(item) for item in list_media_items_for_posts(session, post_ids)
+        ]
+    _prefetch_items(media_items, vk_group_id, ttl_sec, {"media_group_id": media_group_id})
+
+
 @celery_app.task(bind=True)
-def repost_tg_post(self, tg_post_id: int) -> None:
-    runtime = _load_runtime()
+def repost_tg_post(self, tg_post_id: int, enqueued_at: float | None = None) -> None:
+    started_at = time.time()
+    timer = StageTimer()
+    with timer.stage("runtime"):
+        runtime = _load_runtime()
     vk_group_id = runtime["vk_group_id"]
 
     job_id = None
@@ -171,132 +604,139 @@ def repost_tg_post(self, tg_post_id: int) -> None:
         job_id = job.id
 
     try:
-        with session_scope() as session:
+        with timer.stage("db_load"), session_scope() as session:
             tg_post = get_tg_post_by_id(session, tg_post_id)
             if tg_post is None:
                 update_job(session, job_id, "failed", last_error="TG post not found")
                 return
-            existing = get_vk_post(session, tg_post_id)
-            if existing:
+            if get_posted_tg_post_ids(session, [tg_post_id]):
                 update_job(session, job_id, "success", last_error="Already posted")
                 return
             if tg_post.media_group_id:
                 update_job(session, job_id, "success", last_error="Album item; waiting for finalize")
                 return
             media_items = [
-                {
-                    "type": item.type,
-                    "file_id": item.file_id,
-                    "file_unique_id": item.file_unique_id,
-                    "mime_type": item.mime_type,
-                    "file_name": item.file_name,
-                    "size": item.size,
-                    "order_index": item.order_index,
-                    "tg_post_id": item.tg_post_id,
-                }
-                for item in list_media_items_for_post(session, tg_post_id)
+                _media_item_dict(item) for item in list_media_items_for_post(session, tg_post_id)
             ]
             payload_json = tg_post.payload_json
+        with timer.stage("staged_wait"):
+            staged = _wait_for_staged([item["id"] for item in media_items], vk_group_id)
 
         tg_client = TelegramClient(settings.TG_BOT_TOKEN)
         vk_client = VKClient(settings.VK_ACCESS_TOKEN, settings.VK_API_VERSION)
 
-        attachments, notes = _upload_media_items(media_items, tg_client, vk_client, vk_group_id)
+        # Only moderated single posts are prefetched, so an empty result is not a miss here.
+        attachments, notes = _upload_media_items(
+            media_items, tg_client, vk_client, vk_group_id, timer, staged=staged or None
+        )
         if not attachments and not (tg_post.text or "").strip():
             with session_scope() as session:
-                update_job(session, job_id, "success", last_error="Empty post")
+                update_job(
+                    session,
+                    job_id,
+                    "success",
+                    last_error="Empty post",
+                    stage_timings=timer.as_dict(),
+                )
             return
 
         tg_link = build_tg_link(payload_json, tg_post.channel_id, tg_post.message_id)
-        responses = _post_with_limit_strategy(
+        attachments, responses = _post_with_cache_recovery(
+            media_items,
+            attachments,
+            notes,
+            tg_client,
             vk_client,
             vk_group_id,
             tg_post.text or "",
-            attachments,
             runtime["limit_strategy"],
             tg_link,
-            notes,
+            timer,
         )
 
         vk_owner_id = -int(vk_group_id)
         vk_post_id = int(responses[0].get("post_id", 0)) if responses else 0
         with session_scope() as session:
-            record_vk_post(
-                session,
-                tg_post_id=tg_post_id,
-                vk_owner_id=vk_owner_id,
-                vk_post_id=vk_post_id,
-                status="posted",
-                attachments_count=len(attachments),
-                vk_response_json={"responses": responses},
-            )
-            update_job(session, job_id, "success")
+            with timer.stage("db_record"):
+                record_vk_post(
+                    session,
+                    tg_post_id=tg_post_id,
+                    vk_owner_id=vk_owner_id,
+                    vk_post_id=vk_post_id,
+                    status="posted",
+                    attachments_count=len(attachments),
+                    vk_response_json={"responses": responses, "attachments": attachments},
+                    latency=_latency(tg_post.date, tg_post.created_at, enqueued_at, started_at),
+                )
+            update_job(session, job_id, "success", stage_timings=timer.as_dict())
         logger.info("repost_success", extra={"tg_post_id": tg_post_id})
     except Exception as exc:
         with session_scope() as session:
-            update_job(session, job_id, "failed", last_error=str(exc))
+            update_job(
+                session, job_id, "failed", last_error=str(exc), stage_timings=timer.as_dict()
+            )
         notify_admins(f"Repost failed for tg_post_id={tg_post_id}: {exc}")
         logger.error("repost_failed", extra={"tg_post_id": tg_post_id, "error": str(exc)})
         raise
 
 
 @celery_app.task(bind=True)
-def finalize_album(self, media_group_id: str) -> None:
-    lock = RedisLock(settings.REDIS_URL, f"album:{media_group_id}", ttl=120)
+def finalize_album(self, media_group_id: str, enqueued_at: float | None = None) -> None:
+    started_at = time.time()
+    # Renewed while held, but never past the heavy queue's hard time limit.
+    lock = RedisLock(
+        settings.REDIS_URL,
+        f"album:{media_group_id}",
+        ttl=120,
+        max_hold=settings.HEAVY_TASK_TIME_LIMIT_SEC + 60,
+    )
     if not lock.acquire(timeout=0):
         logger.info("album_lock_busy", extra={"media_group_id": media_group_id})
         return
 
-    runtime = _load_runtime()
-    vk_group_id = runtime["vk_group_id"]
+    timer = StageTimer()
     job_id = None
     try:
+        with timer.stage("runtime"):
+            runtime = _load_runtime()
+        vk_group_id = runtime["vk_group_id"]
         with session_scope() as session:
-            job = create_job(session, "finalize_album", "running", media_group_id=media_group_id)
-            job_id = job.id
             state = session.get(AlbumState, media_group_id)
             if state and state.status == "finalized":
-                update_job(session, job_id, "success", last_error="Already finalized")
+                logger.info("album_already_finalized", extra={"media_group_id": media_group_id})
                 return
             if state and state.last_seen_at:
                 now = datetime.now(tz=timezone.utc)
                 elapsed = (now - state.last_seen_at).total_seconds()
                 if elapsed < settings.ALBUM_FINALIZE_DELAY_SEC:
-                    delay = max(1, int(settings.ALBUM_FINALIZE_DELAY_SEC - elapsed))
-                    finalize_album.apply_async(args=[media_group_id], countdown=delay)
-                    update_job(session, job_id, "success", last_error="Rescheduled waiting for album")
+                    # Hand the album back to the debounce scheduler rather than queueing a task.
+                    delay = settings.ALBUM_FINALIZE_DELAY_SEC - elapsed
+                    schedule_album_finalize(media_group_id, delay)
                     logger.info(
                         "album_finalize_rescheduled",
                         extra={"media_group_id": media_group_id, "delay": delay},
                     )
                     return
+            job = create_job(session, "finalize_album", "running", media_group_id=media_group_id)
+            job_id = job.id
 
-        with session_scope() as session:
+        with timer.stage("db_load"), session_scope() as session:
             posts = get_album_posts(session, media_group_id)
             if not posts:
                 update_job(session, job_id, "failed", last_error="No posts for album")
                 return
-            for post in posts:
-                if get_vk_post(session, post.id):
-                    mark_album_finalized(session, media_group_id)
-                    update_job(session, job_id, "success", last_error="Album already posted")
-                    return
             post_ids = [p.id for p in posts]
+            if get_posted_tg_post_ids(session, post_ids):
+                mark_album_finalized(session, media_group_id)
+                update_job(session, job_id, "success", last_error="Album already posted")
+                return
             media_items = [
-                {
-                    "type": item.type,
-                    "file_id": item.file_id,
-                    "file_unique_id": item.file_unique_id,
-                    "mime_type": item.mime_type,
-                    "file_name": item.file_name,
-                    "size": item.size,
-                    "order_index": item.order_index,
-                    "tg_post_id": item.tg_post_id,
-                }
-                for item in list_media_items_for_posts(session, post_ids)
+                _media_item_dict(item) for item in list_media_items_for_posts(session, post_ids)
             ]
             payload_json = posts[0].payload_json
             message = next((p.text for p in posts if p.text), "")
+        with timer.stage("staged_wait"):
+            staged = _wait_for_staged([item["id"] for item in media_items], vk_group_id)
 
         post_order = {post.id: post.message_id for post in posts}
         media_items.sort(
@@ -311,40 +751,52 @@ def finalize_album(self, media_group_id: str) -> None:
         tg_client = TelegramClient(settings.TG_BOT_TOKEN)
         vk_client = VKClient(settings.VK_ACCESS_TOKEN, settings.VK_API_VERSION)
 
-        attachments, notes = _upload_media_items(media_items, tg_client, vk_client, vk_group_id)
+        attachments, notes = _upload_media_items(
+            media_items, tg_client, vk_client, vk_group_id, timer, staged=staged
+        )
 
         tg_link = build_tg_link(payload_json, posts[0].channel_id, posts[0].message_id)
-        responses = _post_with_limit_strategy(
+        attachments, responses = _post_with_cache_recovery(
+            media_items,
+            attachments,
+            notes,
+            tg_client,
             vk_client,
             vk_group_id,
             message,
-            attachments,
             runtime["limit_strategy"],
             tg_link,
-            notes,
+            timer,
         )
 
         vk_owner_id = -int(vk_group_id)
         vk_post_id = int(responses[0].get("post_id", 0)) if responses else 0
 
+        # One wall post per album: measured once, on the album's first row, for both the
+        # histogram and the SQL percentiles.
+        latency = _latency(posts[0].date, posts[0].created_at, enqueued_at, started_at)
         with session_scope() as session:
-            mark_album_finalized(session, media_group_id)
-            for post in posts:
-                record_vk_post(
-                    session,
-                    tg_post_id=post.id,
-                    vk_owner_id=vk_owner_id,
-                    vk_post_id=vk_post_id,
-                    status="posted",
-                    attachments_count=len(attachments),
-                    vk_response_json={"responses": responses},
-                )
-            update_job(session, job_id, "success")
+            with timer.stage("db_record"):
+                mark_album_finalized(session, media_group_id)
+                for post in posts:
+                    record_vk_post(
+                        session,
+                        tg_post_id=post.id,
+                        vk_owner_id=vk_owner_id,
+                        vk_post_id=vk_post_id,
+                        status="posted",
+                        attachments_count=len(attachments),
+                        vk_response_json={"responses": responses, "attachments": attachments},
+                        latency=latency if post is posts[0] else None,
+                    )
+            update_job(session, job_id, "success", stage_timings=timer.as_dict())
         logger.info("album_finalize_success", extra={"media_group_id": media_group_id})
     except Exception as exc:
         with session_scope() as session:
             if job_id:
-                update_job(session, job_id, "failed", last_error=str(exc))
+                update_job(
+                    session, job_id, "failed", last_error=str(exc), stage_timings=timer.as_dict()
+                )
         notify_admins(f"Album finalize failed for media_group_id={media_group_id}: {exc}")
         logger.error("album_finalize_failed", extra={"media_group_id": media_group_id, "error": str(exc)})
         raise
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Tuple
+
+from app.config import get_settings
+from app.crud import get_media_profile_for_album, get_media_profile_for_posts
+from app.db import session_scope
+from app.logging_setup import get_logger
+from app.tasks.celery_app import HEAVY_QUEUE, LIGHT_QUEUE
+from app.tasks.repost import finalize_album, prefetch_album, prefetch_media, repost_tg_post
+
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+MediaProfile = Iterable[Tuple[str, int | None]]
+
+
+def classify(media: MediaProfile) -> str:
+    document_bytes = 0
+    for media_type, size in media:
+        # Even short videos pay for video.save and a slow upload endpoint.
+        if media_type == "video":
+            return HEAVY_QUEUE
+        # Photos are capped at 10 MB by Telegram, so text and photo posts always stay light.
+        if media_type != "photo":
+            document_bytes += size or 0
+    return HEAVY_QUEUE if document_bytes >= settings.HEAVY_MEDIA_MB * 1024 * 1024 else LIGHT_QUEUE
+
+
+def _options(queue: str) -> Dict[str, Any]:
+    limit = (
+        settings.HEAVY_TASK_TIME_LIMIT_SEC
+        if queue == HEAVY_QUEUE
+        else settings.LIGHT_TASK_TIME_LIMIT_SEC
+    )
+    # The soft limit raises inside the task, so the job is marked failed before the hard kill.
+    return {"queue": queue, "soft_time_limit": limit, "time_limit": limit + 60}
+
+
+def _post_profile(tg_post_id: int) -> MediaProfile:
+    with session_scope() as session:
+        return get_media_profile_for_posts(session, [tg_post_id])
+
+
+def enqueue_repost(
+    tg_post_id: int, media: MediaProfile | None = None, enqueued_at: float | None = None
+) -> str:
+    queue = classify(_post_profile(tg_post_id) if media is None else media)
+    kwargs = {} if enqueued_at is None else {"enqueued_at": enqueued_at}
+    repost_tg_post.apply_async(args=[tg_post_id], kwargs=kwargs, **_options(queue))
+    logger.info("tg_post_enqueued", extra={"tg_post_id": tg_post_id, "queue": queue})
+    return queue
+
+
+def enqueue_finalize(media_group_id: str, enqueued_at: float | None = None) -> str:
+    with session_scope() as session:
+        media = get_media_profile_for_album(session, media_group_id)
+    queue = classify(media)
+    kwargs = {} if enqueued_at is None else {"enqueued_at": enqueued_at}
+    finalize_album.apply_async(args=[media_group_id], kwargs=kwargs, **_options(queue))
+    logger.info("album_finalize_enqueued", extra={"media_group_id": media_group_id, "queue": queue})
+    return queue
+
+
+def enqueue_prefetch(
+    tg_post_id: int, media: MediaProfile | None = None, ttl_sec: int | None = None
+) -> str:
+    queue = classify(_post_profile(tg_post_id) if media is None else media)
+    kwargs = {} if ttl_sec is None else {"ttl_sec": ttl_sec}
+    prefetch_media.apply_async(args=[tg_post_id], kwargs=kwargs, **_options(queue))
+    return queue
+
+
+def enqueue_album_prefetch(
+    media_group_id: str, media: MediaProfile, ttl_sec: int | None = None
+) -> str:
+    queue = classify(media)
+    kwargs = {} if ttl_sec is None else {"ttl_sec": ttl_sec}
+    prefetch_album.apply_async(args=[media_group_id], kwargs=kwargs, **_options(queue))
+    return queue
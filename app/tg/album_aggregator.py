@@ -1,7 +1,49 @@
 from __future__ import annotations
 
-from app.tasks.repost import finalize_album
+import threading
+import time
 
+from app.logging_setup import get_logger
+from app.tasks.album_schedule import pop_due_albums, schedule_album_finalize
+from app.tasks.routing import enqueue_finalize
 
-def schedule_album_finalize(media_group_id: str, delay: int) -> None:
-    finalize_album.apply_async(args=[media_group_id], countdown=delay)
+
+logger = get_logger(__name__)
+
+
+class AlbumFinalizeScheduler:
+    def __init__(self, tick_seconds: float = 0.5) -> None:
+        self.tick_seconds = tick_seconds
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="album-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def run_once(self) -> int:
+        emitted = 0
+        for media_group_id in pop_due_albums():
+            try:
+                enqueue_finalize(media_group_id, enqueued_at=time.time())
+                emitted += 1
+            except Exception as exc:
+                # Put it back so the next tick tries again instead of dropping the album.
+                schedule_album_finalize(media_group_id, 0)
+                logger.error(
+                    "album_finalize_enqueue_failed",
+                    extra={"media_group_id": media_group_id, "error": str(exc)},
+                )
+        return emitted
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:
+                logger.error("album_scheduler_failed", extra={"error": str(exc)})
+                time.sleep(1)
+            self._stopped.wait(self.tick_seconds)
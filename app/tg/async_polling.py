@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Coroutine, Dict, List, TypeVar
+
+from app.config import get_settings
+from app.crud import ensure_defaults, get_last_update_id
+from app.db import session_scope
+from app.logging_setup import get_logger, setup_logging
+from app.metrics import TG_GET_UPDATES_SECONDS, TG_UPDATES_PER_BATCH
+from app.tg.album_aggregator import AlbumFinalizeScheduler
+from app.tg.client import AsyncTelegramClient
+from app.runtime_settings import get_runtime
+from app.tg.polling import commit_offset, handle_other_update, persist_updates, start_poller_metrics
+
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class LoopBoundTelegramClient:
+    # Lets sync handlers running in worker threads reply through the loop's AsyncClient.
+    def __init__(self, client: AsyncTelegramClient, loop: asyncio.AbstractEventLoop) -> None:
+        self._client = client
+        self._loop = loop
+
+    def _call(self, coro: Coroutine[Any, Any, T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def send_message(self, chat_id: int, text: str) -> None:
+        self._call(self._client.send_message(chat_id, text))
+
+    def get_chat(self, chat_id_or_username: str) -> Dict[str, Any]:
+        return self._call(self._client.get_chat(chat_id_or_username))
+
+
+def _prepare_state() -> int:
+    with session_scope() as session:
+        ensure_defaults(session)
+        return get_last_update_id(session)
+
+
+class _Progress:
+    # Telegram drops every update below the offset a getUpdates call sends, so the fetch loop may
+    # only send offsets up to the last batch that is persisted and whose admin commands ran.
+    def __init__(self, last_update_id: int) -> None:
+        self.done = last_update_id
+        self.fetched = last_update_id
+        self._advanced = asyncio.Event()
+
+    def mark_done(self, update_id: int) -> None:
+        if update_id > self.done:
+            self.done = update_id
+            self._advanced.set()
+
+    async def wait_past(self, update_id: int) -> None:
+        while self.done <= update_id:
+            self._advanced.clear()
+            await self._advanced.wait()
+
+
+async def _fetch_loop(
+    tg_client: AsyncTelegramClient,
+    batches: asyncio.Queue[List[Dict[str, Any]]],
+    progress: _Progress,
+) -> None:
+    while True:
+        done = progress.done
+        try:
+            with TG_GET_UPDATES_SECONDS.time():
+                updates = await tg_client.get_updates(offset=done + 1, timeout=30)
+        except Exception as exc:
+            logger.error("tg_getupdates_failed", extra={"error": str(exc)})
+            await asyncio.sleep(2)
+            continue
+        TG_UPDATES_PER_BATCH.observe(len(updates))
+        # Queued batches are returned again until they are done; only the tail past them is new.
+        fresh = [update for update in updates if int(update["update_id"]) > progress.fetched]
+        if not fresh:
+            if updates:
+                # Polling again would return the same queued updates at once.
+                await progress.wait_past(done)
+            continue
+        progress.fetched = max(int(update["update_id"]) for update in fresh)
+        await batches.put(fresh)
+
+
+async def _handle_other(
+    update: Dict[str, Any],
+    settings,
+    tg_client: LoopBoundTelegramClient,
+    semaphore: asyncio.Semaphore,
+) -> None:
+    try:
+        await asyncio.to_thread(handle_other_update, update, settings, tg_client)
+    finally:
+        semaphore.release()
+
+
+async def _commit_after(
+    previous: asyncio.Task[None] | None,
+    handlers: List[asyncio.Task[None]],
+    last_update_id: int,
+    progress: _Progress,
+) -> None:
+    # Chained per batch, so the offset only passes admin commands once they ran, in fetch order.
+    if previous is not None:
+        await previous
+    await asyncio.gather(*handlers, return_exceptions=True)
+    try:
+        await asyncio.to_thread(commit_offset, last_update_id)
+    except Exception as exc:
+        logger.error("offset_commit_failed", extra={"error": str(exc), "update_id": last_update_id})
+    progress.mark_done(last_update_id)
+
+
+async def _process_loop(
+    batches: asyncio.Queue[List[Dict[str, Any]]],
+    settings,
+    tg_client: LoopBoundTelegramClient,
+    progress: _Progress,
+) -> None:
+    semaphore = asyncio.Semaphore(settings.POLLER_ADMIN_CONCURRENCY)
+    committing: asyncio.Task[None] | None = None
+    while True:
+        updates = await batches.get()
+        other_updates = [update for update in updates if not update.get("channel_post")]
+        if committing is not None and committing.done():
+            committing = None
+        # Batches are persisted one at a time in fetch order. The ingest transaction commits the
+        # offset only when no admin command of this or an earlier batch is still outstanding.
+        commit = not other_updates and committing is None
+        while True:
+            try:
+                runtime = await asyncio.to_thread(get_runtime, settings)
+                await asyncio.to_thread(persist_updates, updates, settings, runtime, commit)
+                break
+            except Exception as exc:
+                logger.error("batch_persist_failed", extra={"error": str(exc)})
+                await asyncio.sleep(2)
+
+        last_update_id = max(int(update["update_id"]) for update in updates)
+        handlers: List[asyncio.Task[None]] = []
+        for update in other_updates:
+            await semaphore.acquire()
+            handlers.append(asyncio.create_task(_handle_other(update, settings, tg_client, semaphore)))
+        if commit:
+            progress.mark_done(last_update_id)
+        else:
+            committing = asyncio.create_task(
+                _commit_after(committing, handlers, last_update_id, progress)
+            )
+        batches.task_done()
+
+
+async def run(settings) -> None:
+    last_update_id = await asyncio.to_thread(_prepare_state)
+    start_poller_metrics(settings)
+    AlbumFinalizeScheduler(settings.ALBUM_SCHEDULER_TICK_SEC).start()
+
+    tg_client = AsyncTelegramClient(settings.TG_BOT_TOKEN)
+    bound_client = LoopBoundTelegramClient(tg_client, asyncio.get_running_loop())
+    batches: asyncio.Queue[List[Dict[str, Any]]] = asyncio.Queue(
+        maxsize=max(1, settings.POLLER_PIPELINE_DEPTH)
+    )
+    progress = _Progress(last_update_id)
+    try:
+        await asyncio.gather(
+            _fetch_loop(tg_client, batches, progress),
+            _process_loop(batches, settings, bound_client, progress),
+        )
+    finally:
+        await tg_client.aclose()
+
+
+def main() -> None:
+    settings = get_settings()
+    setup_logging(settings.LOG_LEVEL)
+    logger.info("poller_start", extra={"mode": settings.MODE, "poller_mode": "async"})
+    asyncio.run(run(settings))
+
+
+if __name__ == "__main__":
+    main()
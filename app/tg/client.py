@@ -2,12 +2,14 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Protocol
 
 import httpx
 
 from app.logging_setup import get_logger
-from app.utils.retry import retry
+from app.utils.http import TELEGRAM, get_http_client
+from app.utils.relay import RelayStream
+from app.utils.retry import async_retry, retry
 
 
 class TelegramAPIError(RuntimeError):
@@ -21,13 +23,23 @@ class DownloadedFile:
     file_name: str
 
 
+_ALLOWED_UPDATES = ["channel_post", "edited_channel_post", "message"]
+
+
+class BotReplier(Protocol):
+    # What admin command handlers need; the async poller supplies a loop-bound wrapper.
+    def send_message(self, chat_id: int, text: str) -> None: ...
+
+    def get_chat(self, chat_id_or_username: str) -> Dict[str, Any]: ...
+
+
 class TelegramClient:
-    def __init__(self, token: str, timeout: int = 30) -> None:
+    def __init__(self, token: str, timeout: int = 30, http_client: httpx.Client | None = None) -> None:
         self.token = token
         self.base_url = f"https://api.telegram.org/bot{token}"
         self.file_base_url = f"https://api.telegram.org/file/bot{token}"
         self.timeout = timeout
-        self._client = httpx.Client()
+        self._client = http_client or get_http_client(TELEGRAM)
         self.logger = get_logger(__name__)
 
     def _request(self, method: str, params: Dict[str, Any] | None = None, timeout: int | None = None) -> Any:
@@ -38,6 +50,7 @@ class TelegramClient:
 
         response = retry(
             do_request,
+            name="tg_request",
             on_retry=lambda attempt, exc, delay: self.logger.warning(
                 "tg_request_retry",
                 extra={"method": method, "attempt": attempt, "delay": delay, "error": str(exc)},
@@ -53,7 +66,7 @@ class TelegramClient:
         params = {
             "offset": offset,
             "timeout": timeout,
-            "allowed_updates": ["channel_post", "edited_channel_post", "message"],
+            "allowed_updates": _ALLOWED_UPDATES,
         }
         result = self._request("getUpdates", params=params, timeout=timeout + 10)
         return result or []
@@ -86,6 +99,7 @@ class TelegramClient:
 
         size = retry(
             do_download,
+            name="tg_download",
             on_retry=lambda attempt, exc, delay: self.logger.warning(
                 "tg_download_retry",
                 extra={"attempt": attempt, "delay": delay, "error": str(exc)},
@@ -94,8 +108,27 @@ class TelegramClient:
         os.replace(temp_path, dest_path)
         return size
 
+    def iter_file(self, file_path: str) -> Iterator[bytes]:
+        url = f"{self.file_base_url}/{file_path}"
+        with self._client.stream("GET", url, timeout=self.timeout + 30) as response:
+            response.raise_for_status()
+            yield from response.iter_bytes(chunk_size=64 * 1024)
+
+    def relay_file(self, file_info: Dict[str, Any], max_buffer_bytes: int) -> RelayStream:
+        file_path = file_info["file_path"]
+        return RelayStream(
+            self.iter_file(file_path),
+            size=int(file_info["file_size"]),
+            name=os.path.basename(file_path),
+            max_chunks=max_buffer_bytes // (64 * 1024),
+        )
+
     def download_file_by_id(self, file_id: str, dest_dir: str, max_size_bytes: int) -> DownloadedFile | None:
-        info = self.get_file(file_id)
+        return self.download_file_info(self.get_file(file_id), dest_dir, max_size_bytes)
+
+    def download_file_info(
+        self, info: Dict[str, Any], dest_dir: str, max_size_bytes: int
+    ) -> DownloadedFile | None:
         file_path = info.get("file_path")
         file_size = int(info.get("file_size", 0))
         if file_size and file_size > max_size_bytes:
@@ -112,3 +145,54 @@ class TelegramClient:
                 pass
             return None
         return DownloadedFile(path=dest_path, size=actual_size, file_name=file_name)
+
+
+class AsyncTelegramClient:
+    def __init__(self, token: str, timeout: int = 30) -> None:
+        self.token = token
+        self.base_url = f"https://api.telegram.org/bot{token}"
+        self.timeout = timeout
+        self._client = httpx.AsyncClient()
+        self.logger = get_logger(__name__)
+
+    async def _request(
+        self, method: str, params: Dict[str, Any] | None = None, timeout: int | None = None
+    ) -> Any:
+        url = f"{self.base_url}/{method}"
+
+        async def do_request() -> httpx.Response:
+            return await self._client.post(url, data=params, timeout=timeout or self.timeout)
+
+        response = await async_retry(
+            do_request,
+            name="tg_request",
+            on_retry=lambda attempt, exc, delay: self.logger.warning(
+                "tg_request_retry",
+                extra={"method": method, "attempt": attempt, "delay": delay, "error": str(exc)},
+            ),
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if not payload.get("ok"):
+            raise TelegramAPIError(payload.get("description", "Telegram API error"))
+        return payload.get("result")
+
+    async def get_updates(self, offset: int, timeout: int = 30) -> List[Dict[str, Any]]:
+        params = {
+            "offset": offset,
+            "timeout": timeout,
+            "allowed_updates": _ALLOWED_UPDATES,
+        }
+        result = await self._request("getUpdates", params=params, timeout=timeout + 10)
+        return result or []
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        params = {"chat_id": chat_id, "text": text}
+        await self._request("sendMessage", params=params)
+
+    async def get_chat(self, chat_id_or_username: str) -> Dict[str, Any]:
+        params = {"chat_id": chat_id_or_username}
+        return await self._request("getChat", params=params)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
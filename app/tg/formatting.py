@@ -16,3 +16,43 @@ def format_post_preview(post_id: int, channel_id: int, message_id: int, date: da
     preview = shorten(text, 80)
     date_str = date.isoformat()
     return f"#{post_id} channel={channel_id} msg={message_id} date={date_str} media={media_count} text=\"{preview}\""
+
+
+def format_pending_post(preview: str, staged_count: int, media_group_id: str | None) -> str:
+    line = f"{preview} staged={staged_count}"
+    if media_group_id:
+        line += f" album={media_group_id}"
+    return line
+
+
+def format_job_timings(job_id: int, job_type: str, status: str, timings: dict) -> str:
+    stages = sorted((timings.get("stages") or {}).items(), key=lambda item: item[1], reverse=True)
+    stage_str = " ".join(f"{name}={ms}ms" for name, ms in stages)
+    line = f"job#{job_id} {job_type} {status} total={timings.get('total_ms', 0)}ms {stage_str}".rstrip()
+    items = timings.get("items") or []
+    if items:
+        slowest = max(items, key=lambda item: sum(v for k, v in item.items() if k != "index"))
+        item_str = " ".join(f"{k}={v}ms" for k, v in slowest.items() if k != "index")
+        line += f"\n  slowest item #{slowest['index']}: {item_str}"
+    return line
+
+
+def _format_percentiles(values: dict) -> str:
+    return " ".join(
+        f"{name}={value / 1000:.1f}s" if value is not None else f"{name}=-"
+        for name, value in values.items()
+    )
+
+
+def format_latency_window(window: str, stats: dict, slo_sec: int) -> str:
+    if not stats["count"]:
+        return f"{window}: no posts"
+    percentiles = stats["percentiles"]
+    share = 100 * stats["within_slo"] / stats["count"]
+    return (
+        f"{window}: n={stats['count']} within {slo_sec}s={share:.1f}% "
+        f"total {_format_percentiles(percentiles['total_ms'])}\n"
+        f"  ingest {_format_percentiles(percentiles['ingest_delay_ms'])}\n"
+        f"  queue {_format_percentiles(percentiles['queue_wait_ms'])}\n"
+        f"  processing {_format_percentiles(percentiles['processing_ms'])}"
+    )
@@ -1,99 +1,194 @@
 from __future__ import annotations
 
+from datetime import timedelta
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 from app.config import get_settings
 from app.crud import (
-    add_media_items,
-    count_jobs_by_status,
-    create_tg_post,
+    bulk_add_media_items,
+    bulk_touch_album_states,
+    count_media_items_for_posts,
+    count_ready_staged_media_for_posts,
+    count_recent_jobs_by_status,
     ensure_defaults,
+    expire_staged_media_for_posts,
+    get_job_status_counters,
+    get_latency_percentiles,
     get_last_job_errors,
     get_last_update_id,
-    get_runtime_settings,
     get_tg_post_by_ids,
+    insert_tg_posts,
     list_failed_jobs,
-    list_media_items_for_post,
     list_recent_tg_posts,
+    list_slowest_jobs,
+    list_tg_posts_by_status,
     set_last_update_id,
     set_setting,
-    touch_album_state,
+    transition_tg_posts,
+    utcnow,
 )
 from app.db import session_scope
 from app.logging_setup import get_logger, setup_logging
-from app.tasks.repost import finalize_album, repost_tg_post
-from app.tg.album_aggregator import schedule_album_finalize
-from app.tg.client import TelegramClient
+from app.metrics import (
+    INGEST_TRANSACTION_SECONDS,
+    TG_GET_UPDATES_SECONDS,
+    TG_UPDATES_PER_BATCH,
+    LatencyCollector,
+    QueueDepthCollector,
+    start_metrics_server,
+)
+from app.runtime_settings import get_runtime, publish_settings_changed
+from app.tasks.album_schedule import ALBUM_DEADLINES_KEY, schedule_album_finalizes
+from app.tasks.celery_app import HEAVY_QUEUE, LIGHT_QUEUE
+from app.tasks.routing import enqueue_album_prefetch, enqueue_finalize, enqueue_prefetch, enqueue_repost
+from app.tg.album_aggregator import AlbumFinalizeScheduler
+from app.tg.client import BotReplier, TelegramClient
 from app.tg.commands import is_admin, parse_command
-from app.tg.formatting import format_post_preview
-from app.tg.updates import parse_channel_post
+from app.tg.formatting import (
+    format_job_timings,
+    format_latency_window,
+    format_pending_post,
+    format_post_preview,
+)
+from app.tg.updates import ParsedTGPost, parse_channel_post
 
 
 logger = get_logger(__name__)
 
 
-def _defaults_from_settings(settings) -> dict:
-    return {
-        "autoposting_enabled": True,
-        "mode": settings.MODE,
-        "limit_strategy": settings.LIMIT_STRATEGY,
-        "vk_group_id": settings.VK_GROUP_ID,
-        "source_channel_ids": ",".join(str(x) for x in settings.SOURCE_CHANNEL_IDS),
-    }
-
-
 def should_autopost(runtime: dict) -> bool:
     return runtime["autoposting_enabled"] and runtime["mode"] == "auto"
 
 
-def handle_channel_post(update: Dict[str, Any], settings, runtime: dict) -> None:
-    parsed = parse_channel_post(update)
-    if runtime["source_channel_ids"] and parsed.channel_id not in runtime["source_channel_ids"]:
-        logger.info("tg_channel_ignored", extra={"channel_id": parsed.channel_id})
-        return
-
-    tg_post_id = None
-    created = False
+def ingest_channel_posts(
+    updates: List[Dict[str, Any]],
+    runtime: dict,
+    last_update_id: int | None = None,
+) -> List[Tuple[int, ParsedTGPost]]:
+    parsed_posts: List[ParsedTGPost] = []
+    for update in updates:
+        try:
+            parsed = parse_channel_post(update)
+        except Exception as exc:
+            logger.error(
+                "tg_post_parse_failed",
+                extra={"error": str(exc), "update_id": update.get("update_id")},
+            )
+            continue
+        if runtime["source_channel_ids"] and parsed.channel_id not in runtime["source_channel_ids"]:
+            logger.info("tg_channel_ignored", extra={"channel_id": parsed.channel_id})
+            continue
+        parsed_posts.append(parsed)
 
+    status = "awaiting_approval" if runtime["mode"] == "moderation" else "ingested"
+    created: List[Tuple[int, ParsedTGPost]] = []
     with session_scope() as session:
-        tg_post, created = create_tg_post(
+        created_ids = insert_tg_posts(
             session,
-            channel_id=parsed.channel_id,
-            message_id=parsed.message_id,
-            date=parsed.date,
-            text=parsed.text,
-            media_group_id=parsed.media_group_id,
-            payload_json=parsed.payload_json,
+            [
+                {
+                    "channel_id": parsed.channel_id,
+                    "message_id": parsed.message_id,
+                    "date": parsed.date,
+                    "text": parsed.text,
+                    "media_group_id": parsed.media_group_id,
+                    "payload_json": parsed.payload_json,
+                    "status": status,
+                }
+                for parsed in parsed_posts
+            ],
         )
-        tg_post_id = tg_post.id
-        if created and parsed.media_items:
-            add_media_items(session, tg_post.id, parsed.media_items)
-        if created and parsed.media_group_id:
-            touch_album_state(session, parsed.media_group_id, first_tg_post_id=tg_post.id)
-
-    if not created:
-        logger.info(
-            "tg_post_duplicate",
-            extra={"channel_id": parsed.channel_id, "message_id": parsed.message_id},
-        )
-        return
+        media_items: List[Tuple[int, dict]] = []
+        album_first_posts: Dict[str, int] = {}
+        for parsed in parsed_posts:
+            tg_post_id = created_ids.pop((parsed.channel_id, parsed.message_id), None)
+            if tg_post_id is None:
+                logger.info(
+                    "tg_post_duplicate",
+                    extra={"channel_id": parsed.channel_id, "message_id": parsed.message_id},
+                )
+                continue
+            created.append((tg_post_id, parsed))
+            media_items.extend((tg_post_id, item) for item in parsed.media_items)
+            if parsed.media_group_id:
+                album_first_posts.setdefault(parsed.media_group_id, tg_post_id)
+
+        bulk_add_media_items(session, media_items)
+        bulk_touch_album_states(session, album_first_posts)
+        if last_update_id is not None:
+            set_last_update_id(session, last_update_id, commit=False)
+
+    return created
+
+
+def _media_profile(parsed: ParsedTGPost) -> List[Tuple[str, int | None]]:
+    return [(item["type"], item.get("size")) for item in parsed.media_items]
+
+
+def dispatch_ingested(created: List[Tuple[int, ParsedTGPost]], settings, runtime: dict) -> None:
+    albums: List[str] = []
+    album_media: Dict[str, List[Tuple[str, int | None]]] = {}
+    moderation = runtime["mode"] == "moderation"
+    for tg_post_id, parsed in created:
+        if moderation:
+            # Media is uploaded while the post waits for /approve, which then only calls wall.post.
+            if parsed.media_items and settings.MEDIA_PREFETCH_ENABLED:
+                if parsed.media_group_id:
+                    album_media.setdefault(parsed.media_group_id, []).extend(_media_profile(parsed))
+                else:
+                    enqueue_prefetch(
+                        tg_post_id, _media_profile(parsed), ttl_sec=settings.MODERATION_STAGED_TTL_SEC
+                    )
+            continue
+
+        if parsed.media_group_id:
+            albums.append(parsed.media_group_id)
+            logger.info(
+                "album_item_ingested",
+                extra={"media_group_id": parsed.media_group_id, "tg_post_id": tg_post_id},
+            )
+            # Upload while the quiet window runs so finalize only has to call wall.post.
+            if parsed.media_items and settings.MEDIA_PREFETCH_ENABLED and should_autopost(runtime):
+                album_media.setdefault(parsed.media_group_id, []).extend(_media_profile(parsed))
+            continue
 
-    if parsed.media_group_id:
         if should_autopost(runtime):
-            schedule_album_finalize(parsed.media_group_id, settings.ALBUM_FINALIZE_DELAY_SEC)
-        logger.info(
-            "album_item_ingested",
-            extra={"media_group_id": parsed.media_group_id, "tg_post_id": tg_post_id},
-        )
-        return
+            enqueue_repost(tg_post_id, _media_profile(parsed), enqueued_at=time.time())
+
+    # One prefetch per album, so its photos share an upload server and a batched save.
+    ttl_sec = settings.MODERATION_STAGED_TTL_SEC if moderation else None
+    for media_group_id, media in album_media.items():
+        enqueue_album_prefetch(media_group_id, media, ttl_sec=ttl_sec)
+
+    if albums and should_autopost(runtime):
+        schedule_album_finalizes(albums, settings.ALBUM_FINALIZE_DELAY_SEC)
+
+
+def handle_channel_post(update: Dict[str, Any], settings, runtime: dict) -> None:
+    created = ingest_channel_posts([update], runtime)
+    dispatch_ingested(created, settings, runtime)
+
+
+LATENCY_WINDOWS = {"1h": timedelta(hours=1), "24h": timedelta(days=1), "7d": timedelta(days=7)}
 
-    if should_autopost(runtime):
-        repost_tg_post.apply_async(args=[tg_post_id])
-        logger.info("tg_post_enqueued", extra={"tg_post_id": tg_post_id})
+
+def load_latency_windows(session, settings, windows: Dict[str, timedelta]) -> Dict[str, dict]:
+    now = utcnow()
+    slo_ms = settings.LATENCY_SLO_SEC * 1000
+    return {
+        name: get_latency_percentiles(session, now - span, slo_ms) for name, span in windows.items()
+    }
 
 
-def _format_status(runtime: dict, last_update_id: int, job_counts: dict, last_errors) -> str:
+def _format_status(
+    runtime: dict,
+    last_update_id: int,
+    job_counts: dict,
+    recent_counts: dict,
+    latency: str,
+    last_errors,
+) -> str:
     lines = [
         "Status:",
         f"MODE={runtime['mode']}",
@@ -102,6 +197,9 @@ def _format_status(runtime: dict, last_update_id: int, job_counts: dict, last_er
         f"VK_GROUP_ID={runtime['vk_group_id']}",
         f"last_update_id={last_update_id}",
         f"jobs={job_counts}",
+        f"jobs_last_hour={recent_counts['last_hour']}",
+        f"jobs_last_day={recent_counts['last_day']}",
+        f"latency {latency}",
     ]
     if last_errors:
         lines.append("Recent errors:")
@@ -110,7 +208,12 @@ def _format_status(runtime: dict, last_update_id: int, job_counts: dict, last_er
     return "\n".join(lines)
 
 
-def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramClient) -> None:
+def _update_setting(session, settings, key: str, value: str) -> None:
+    set_setting(session, key, value)
+    publish_settings_changed(settings)
+
+
+def handle_admin_message(message: Dict[str, Any], settings, tg_client: BotReplier) -> None:
     user = message.get("from") or {}
     user_id = user.get("id")
     if user_id is None or not is_admin(int(user_id), settings.ADMIN_IDS):
@@ -121,10 +224,9 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
         return
 
     chat_id = message["chat"]["id"]
+    runtime = get_runtime(settings)
 
     with session_scope() as session:
-        defaults = _defaults_from_settings(settings)
-        runtime = get_runtime_settings(session, defaults)
 
         if cmd.name == "help":
             response = (
@@ -135,6 +237,11 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
                 "/last N\n"
                 "/repost <channel_id> <message_id> OR /repost <message_id>\n"
                 "/retry_failed N\n"
+                "/pending N\n"
+                "/approve <post_id> [post_id ...] | all\n"
+                "/reject <post_id> [post_id ...] | all\n"
+                "/slow N\n"
+                "/latency\n"
                 "/set_target <vk_group_id>\n"
                 "/set_source <channel_id or @channel>\n"
                 "/set_mode auto|moderation"
@@ -144,19 +251,22 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
 
         if cmd.name == "status":
             last_update_id = get_last_update_id(session)
-            counts = count_jobs_by_status(session)
+            counts = get_job_status_counters(session)
+            recent = count_recent_jobs_by_status(session)
+            windows = load_latency_windows(session, settings, {"1h": LATENCY_WINDOWS["1h"]})
+            latency = format_latency_window("1h", windows["1h"], settings.LATENCY_SLO_SEC)
             errors = get_last_job_errors(session, limit=3)
-            response = _format_status(runtime, last_update_id, counts, errors)
+            response = _format_status(runtime, last_update_id, counts, recent, latency, errors)
             tg_client.send_message(chat_id, response)
             return
 
         if cmd.name == "enable":
-            set_setting(session, "autoposting_enabled", "true")
+            _update_setting(session, settings, "autoposting_enabled", "true")
             tg_client.send_message(chat_id, "Autoposting enabled")
             return
 
         if cmd.name == "disable":
-            set_setting(session, "autoposting_enabled", "false")
+            _update_setting(session, settings, "autoposting_enabled", "false")
             tg_client.send_message(chat_id, "Autoposting disabled")
             return
 
@@ -164,7 +274,7 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
             if not cmd.args or cmd.args[0] not in {"auto", "moderation"}:
                 tg_client.send_message(chat_id, "Usage: /set_mode auto|moderation")
                 return
-            set_setting(session, "mode", cmd.args[0])
+            _update_setting(session, settings, "mode", cmd.args[0])
             tg_client.send_message(chat_id, f"Mode set to {cmd.args[0]}")
             return
 
@@ -172,7 +282,7 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
             if not cmd.args:
                 tg_client.send_message(chat_id, "Usage: /set_target <vk_group_id>")
                 return
-            set_setting(session, "vk_group_id", cmd.args[0])
+            _update_setting(session, settings, "vk_group_id", cmd.args[0])
             tg_client.send_message(chat_id, f"Target VK group set to {cmd.args[0]}")
             return
 
@@ -190,7 +300,7 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
                     return
             else:
                 channel_id = int(arg)
-            set_setting(session, "source_channel_ids", str(channel_id))
+            _update_setting(session, settings, "source_channel_ids", str(channel_id))
             tg_client.send_message(chat_id, f"Source channel set to {channel_id}")
             return
 
@@ -200,9 +310,9 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
             if not posts:
                 tg_client.send_message(chat_id, "No posts found")
                 return
+            media_counts = count_media_items_for_posts(session, [post.id for post in posts])
             lines = []
             for post in posts:
-                media_items = list_media_items_for_post(session, post.id)
                 lines.append(
                     format_post_preview(
                         post.id,
@@ -210,7 +320,7 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
                         post.message_id,
                         post.date,
                         post.text,
-                        len(media_items),
+                        media_counts[post.id],
                     )
                 )
             tg_client.send_message(chat_id, "\n".join(lines))
@@ -235,10 +345,10 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
                 tg_client.send_message(chat_id, "Post not found in DB. Wait for ingestion or check IDs.")
                 return
             if tg_post.media_group_id:
-                finalize_album.apply_async(args=[tg_post.media_group_id])
+                enqueue_finalize(tg_post.media_group_id)
                 tg_client.send_message(chat_id, f"Album finalize queued for media_group_id={tg_post.media_group_id}")
             else:
-                repost_tg_post.apply_async(args=[tg_post.id])
+                enqueue_repost(tg_post.id)
                 tg_client.send_message(chat_id, f"Repost queued for tg_post_id={tg_post.id}")
             return
 
@@ -250,52 +360,207 @@ def handle_admin_message(message: Dict[str, Any], settings, tg_client: TelegramC
                 return
             for job in jobs:
                 if job.tg_post_id:
-                    repost_tg_post.apply_async(args=[job.tg_post_id])
+                    enqueue_repost(job.tg_post_id)
                 elif job.media_group_id:
-                    finalize_album.apply_async(args=[job.media_group_id])
+                    enqueue_finalize(job.media_group_id)
             tg_client.send_message(chat_id, f"Requeued {len(jobs)} job(s)")
             return
 
+        if cmd.name == "pending":
+            limit = int(cmd.args[0]) if cmd.args else 10
+            posts = list_tg_posts_by_status(session, "awaiting_approval", limit)
+            if not posts:
+                tg_client.send_message(chat_id, "No posts awaiting approval")
+                return
+            post_ids = [post.id for post in posts]
+            media_counts = count_media_items_for_posts(session, post_ids)
+            staged_counts = count_ready_staged_media_for_posts(
+                session, post_ids, runtime["vk_group_id"]
+            )
+            lines = [
+                format_pending_post(
+                    format_post_preview(
+                        post.id,
+                        post.channel_id,
+                        post.message_id,
+                        post.date,
+                        post.text,
+                        media_counts[post.id],
+                    ),
+                    staged_counts[post.id],
+                    post.media_group_id,
+                )
+                for post in posts
+            ]
+            tg_client.send_message(chat_id, "\n".join(lines))
+            return
+
+        if cmd.name in {"approve", "reject"}:
+            if not cmd.args:
+                tg_client.send_message(chat_id, f"Usage: /{cmd.name} <post_id> [post_id ...] | all")
+                return
+            selected = None if cmd.args == ["all"] else [int(arg.lstrip("#")) for arg in cmd.args]
+            if cmd.name == "reject":
+                moved = transition_tg_posts(session, selected, "awaiting_approval", "rejected")
+                expire_staged_media_for_posts(session, [tg_post_id for tg_post_id, _ in moved])
+                tg_client.send_message(chat_id, f"Rejected {len(moved)} post(s)")
+                return
+            moved = transition_tg_posts(session, selected, "awaiting_approval", "approved")
+            if not moved:
+                tg_client.send_message(chat_id, "No matching posts awaiting approval")
+                return
+            albums = list(dict.fromkeys(group for _, group in moved if group))
+            singles = [tg_post_id for tg_post_id, group in moved if not group]
+            for tg_post_id in singles:
+                enqueue_repost(tg_post_id)
+            for media_group_id in albums:
+                enqueue_finalize(media_group_id)
+            tg_client.send_message(
+                chat_id, f"Approved {len(singles)} post(s) and {len(albums)} album(s)"
+            )
+            return
+
+        if cmd.name == "latency":
+            windows = load_latency_windows(session, settings, LATENCY_WINDOWS)
+            lines = [f"End-to-end latency (SLO {settings.LATENCY_SLO_SEC}s):"]
+            lines.extend(
+                format_latency_window(name, stats, settings.LATENCY_SLO_SEC)
+                for name, stats in windows.items()
+            )
+            tg_client.send_message(chat_id, "\n".join(lines))
+            return
+
+        if cmd.name == "slow":
+            limit = int(cmd.args[0]) if cmd.args else 5
+            jobs = list_slowest_jobs(session, limit, since=utcnow() - timedelta(days=1))
+            if not jobs:
+                tg_client.send_message(chat_id, "No timed jobs in the last 24h")
+                return
+            lines = [
+                format_job_timings(job.id, job.type, job.status, job.stage_timings or {})
+                for job in jobs
+            ]
+            tg_client.send_message(chat_id, "\n".join(lines))
+            return
+
         tg_client.send_message(chat_id, "Unknown command. Use /help")
 
 
+def commit_offset(last_update_id: int) -> None:
+    with session_scope() as session:
+        set_last_update_id(session, last_update_id)
+
+
+def persist_updates(
+    updates: List[Dict[str, Any]], settings, runtime: dict, commit: bool = True
+) -> None:
+    if not updates:
+        return
+    last_update_id = max(int(update["update_id"]) for update in updates)
+    channel_updates = [update for update in updates if update.get("channel_post")]
+
+    try:
+        with INGEST_TRANSACTION_SECONDS.time():
+            created = ingest_channel_posts(
+                channel_updates, runtime, last_update_id=last_update_id if commit else None
+            )
+    except Exception as exc:
+        logger.error("batch_ingest_failed", extra={"error": str(exc), "size": len(channel_updates)})
+        created = []
+        for update in channel_updates:
+            try:
+                created.extend(ingest_channel_posts([update], runtime))
+            except Exception as item_exc:
+                logger.error(
+                    "update_processing_failed",
+                    extra={"error": str(item_exc), "update_id": update["update_id"]},
+                )
+        if commit:
+            commit_offset(last_update_id)
+
+    try:
+        dispatch_ingested(created, settings, runtime)
+    except Exception as exc:
+        logger.error("batch_dispatch_failed", extra={"error": str(exc)})
+
+
+def handle_other_update(update: Dict[str, Any], settings, tg_client: BotReplier) -> None:
+    update_id = int(update["update_id"])
+    try:
+        if update.get("edited_channel_post"):
+            logger.info("edited_channel_post_ignored")
+        elif update.get("message"):
+            handle_admin_message(update["message"], settings, tg_client)
+    except Exception as exc:
+        logger.error("update_processing_failed", extra={"error": str(exc), "update_id": update_id})
+
+
+def process_updates(updates: List[Dict[str, Any]], settings, runtime: dict, tg_client: BotReplier) -> None:
+    other_updates = [update for update in updates if not update.get("channel_post")]
+    # Admin commands are handled after ingest, so the offset may only pass them once they ran.
+    persist_updates(updates, settings, runtime, commit=not other_updates)
+    for update in other_updates:
+        handle_other_update(update, settings, tg_client)
+    if other_updates:
+        commit_offset(max(int(update["update_id"]) for update in updates))
+
+
+def _scrape_latency(settings) -> Dict[str, dict]:
+    windows = {name: LATENCY_WINDOWS[name] for name in ("1h", "24h")}
+    with session_scope() as session:
+        return load_latency_windows(session, settings, windows)
+
+
+def start_poller_metrics(settings) -> None:
+    try:
+        start_metrics_server(
+            settings.POLLER_METRICS_PORT,
+            [
+                QueueDepthCollector(
+                    settings.REDIS_URL,
+                    [LIGHT_QUEUE, HEAVY_QUEUE],
+                    {"album_deadlines": ALBUM_DEADLINES_KEY},
+                ),
+                LatencyCollector(lambda: _scrape_latency(settings)),
+            ],
+        )
+    except OSError as exc:
+        logger.error("metrics_server_failed", extra={"error": str(exc)})
+
+
 def main() -> None:
     settings = get_settings()
     setup_logging(settings.LOG_LEVEL)
+    if settings.POLLER_MODE == "async":
+        from app.tg.async_polling import main as async_main
+
+        async_main()
+        return
     logger.info("poller_start", extra={"mode": settings.MODE})
 
+    start_poller_metrics(settings)
     tg_client = TelegramClient(settings.TG_BOT_TOKEN)
+    AlbumFinalizeScheduler(settings.ALBUM_SCHEDULER_TICK_SEC).start()
 
     with session_scope() as session:
         ensure_defaults(session)
+        last_update_id = get_last_update_id(session)
 
     while True:
-        with session_scope() as session:
-            defaults = _defaults_from_settings(settings)
-            runtime = get_runtime_settings(session, defaults)
-            last_update_id = get_last_update_id(session)
+        runtime = get_runtime(settings)
 
         try:
-            updates = tg_client.get_updates(offset=last_update_id + 1, timeout=30)
+            with TG_GET_UPDATES_SECONDS.time():
+                updates = tg_client.get_updates(offset=last_update_id + 1, timeout=30)
         except Exception as exc:
             logger.error("tg_getupdates_failed", extra={"error": str(exc)})
             time.sleep(2)
             continue
+        TG_UPDATES_PER_BATCH.observe(len(updates))
 
-        for update in updates:
-            update_id = int(update["update_id"])
-            try:
-                if update.get("channel_post"):
-                    handle_channel_post(update, settings, runtime)
-                elif update.get("edited_channel_post"):
-                    logger.info("edited_channel_post_ignored")
-                elif update.get("message"):
-                    handle_admin_message(update["message"], settings, tg_client)
-            except Exception as exc:
-                logger.error("update_processing_failed", extra={"error": str(exc), "update_id": update_id})
-            finally:
-                with session_scope() as session:
-                    set_last_update_id(session, update_id)
+        process_updates(updates, settings, runtime, tg_client)
+        if updates:
+            last_update_id = max(int(update["update_id"]) for update in updates)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import os
+import re
+import sys
+import time
+from typing import Callable, Tuple
+import uuid
+
+# flock is POSIX-only; elsewhere the cache is disabled and every download is owned by its caller.
+if sys.platform != "win32":
+    import fcntl
+
+from app.config import get_settings
+from app.logging_setup import get_logger
+from app.metrics import DOWNLOAD_CACHE_EVICTIONS, DOWNLOAD_CACHE_REQUESTS
+from app.utils.files import cleanup_file, ensure_dir
+
+
+logger = get_logger(__name__)
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]")
+_STALE_PART_SEC = 86400
+
+
+@dataclass
+class CachedFile:
+    path: str
+    size: int
+    hit: bool
+    fd: int | None = None
+    owned: bool = False
+
+    def release(self) -> None:
+        # Closing the descriptor drops the shared lock that keeps eviction away from the file.
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.owned:
+            cleanup_file(self.path)
+
+
+class DownloadCache:
+    # Entries live in <root>/<file_unique_id>. Every user holds a shared flock on the entry while
+    # it reads it, and eviction only unlinks files it can lock exclusively, so the lock doubles as
+    # a cross-process reference count. The mtime is the LRU clock.
+    def __init__(self, root: str, budget_bytes: int) -> None:
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.budget_bytes = budget_bytes
+        self.enabled = budget_bytes > 0 and sys.platform != "win32"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, _UNSAFE.sub("_", key))
+
+    def _open_locked(self, path: str) -> int | None:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        # Evicted between open and lock: the inode is gone from the directory.
+        if os.fstat(fd).st_nlink == 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def acquire(self, key: str | None, download: Callable[[str], int]) -> CachedFile:
+        ensure_dir(self.tmp_dir)
+        if not self.enabled or not key:
+            DOWNLOAD_CACHE_REQUESTS.labels("bypass").inc()
+            return self._download_owned(download)
+
+        path = self._path(key)
+        fd = self._open_locked(path)
+        if fd is not None:
+            os.utime(path)
+            DOWNLOAD_CACHE_REQUESTS.labels("hit").inc()
+            return CachedFile(path=path, size=os.fstat(fd).st_size, hit=True, fd=fd)
+
+        DOWNLOAD_CACHE_REQUESTS.labels("miss").inc()
+        downloaded = self._download_owned(download)
+        if downloaded.size > self.budget_bytes:
+            return downloaded
+        # Lock before publishing so the new entry is referenced from the moment it is visible.
+        fd = os.open(downloaded.path, os.O_RDONLY)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        os.replace(downloaded.path, path)
+        self.evict()
+        return CachedFile(path=path, size=downloaded.size, hit=False, fd=fd)
+
+    def _download_owned(self, download: Callable[[str], int]) -> CachedFile:
+        # A unique name per download so concurrent misses for one key never share a .part file.
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            size = download(tmp_path)
+        except BaseException:
+            cleanup_file(tmp_path)
+            cleanup_file(tmp_path + ".part")
+            raise
+        return CachedFile(path=tmp_path, size=size, hit=False, owned=True)
+
+    def _entries(self):
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and not entry.name.startswith("."):
+                    yield entry
+
+    def usage(self) -> Tuple[int, int]:
+        if not os.path.isdir(self.root):
+            return 0, 0
+        sizes = [entry.stat().st_size for entry in self._entries()]
+        return sum(sizes), len(sizes)
+
+    def evict(self) -> int:
+        guard = os.open(os.path.join(self.root, ".evict.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            self._remove_stale_parts()
+            entries = []
+            for entry in self._entries():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for _, size, path in sorted(entries):
+                if total <= self.budget_bytes:
+                    break
+                if self._remove_unused(path):
+                    total -= size
+                    evicted += 1
+            if evicted:
+                DOWNLOAD_CACHE_EVICTIONS.inc(evicted)
+                logger.info("download_cache_evicted", extra={"count": evicted, "bytes": total})
+            return evicted
+        finally:
+            os.close(guard)
+
+    def _remove_unused(self, path: str) -> bool:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        try:
+            # A concurrent miss may have replaced the entry with a fresh, unlocked inode.
+            if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                return False
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False
+        finally:
+            os.close(fd)
+
+    def _remove_stale_parts(self) -> None:
+        # Leftovers of killed workers; live downloads touch their file continuously.
+        cutoff = time.time() - _STALE_PART_SEC
+        with os.scandir(self.tmp_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    cleanup_file(entry.path)
+
+
+_cache: DownloadCache | None = None
+
+
+def get_download_cache() -> DownloadCache:
+    global _cache
+    if _cache is None:
+        settings = get_settings()
+        _cache = DownloadCache(
+            os.path.join(settings.TEMP_DIR, "cache"), settings.DOWNLOAD_CACHE_MB * 1024 * 1024
+        )
+    return _cache
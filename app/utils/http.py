@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import threading
+from typing import Dict
+
+import httpx
+
+from app.config import get_settings
+from app.logging_setup import get_logger
+
+
+TELEGRAM = "telegram"
+VK_API = "vk_api"
+VK_UPLOAD = "vk_upload"
+CLIENT_NAMES = (TELEGRAM, VK_API, VK_UPLOAD)
+
+logger = get_logger(__name__)
+
+_clients: Dict[str, httpx.Client] = {}
+_clients_pid: int | None = None
+_lock = threading.Lock()
+
+
+def _http2_enabled() -> bool:
+    if not get_settings().HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("http2_unavailable", extra={"reason": "h2 package is not installed"})
+        return False
+    return True
+
+
+def _build_client(name: str) -> httpx.Client:
+    settings = get_settings()
+    max_connections = settings.HTTP_POOL_LIMITS.get(name, settings.HTTP_MAX_CONNECTIONS)
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SEC,
+    )
+    return httpx.Client(limits=limits, http2=_http2_enabled())
+
+
+def _drop_inherited_clients() -> None:
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        # Never reuse sockets inherited across fork; the parent still owns them.
+        _clients.clear()
+        _clients_pid = os.getpid()
+
+
+def get_http_client(name: str) -> httpx.Client:
+    client = _clients.get(name)
+    if client is not None and _clients_pid == os.getpid():
+        return client
+    with _lock:
+        _drop_inherited_clients()
+        client = _clients.get(name)
+        if client is None:
+            client = _build_client(name)
+            _clients[name] = client
+        return client
+
+
+def set_http_client(name: str, client: httpx.Client) -> None:
+    with _lock:
+        _drop_inherited_clients()
+        _clients[name] = client
+
+
+def open_http_clients() -> None:
+    for name in CLIENT_NAMES:
+        get_http_client(name)
+
+
+def close_http_clients() -> None:
+    with _lock:
+        clients = list(_clients.values()) if _clients_pid == os.getpid() else []
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
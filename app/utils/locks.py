@@ -1,34 +1,108 @@
 from __future__ import annotations
 
+import threading
 import time
 import uuid
 
-import redis
+from app.logging_setup import get_logger
+from app.metrics import LOCK_HOLD_SECONDS, LOCK_WAIT_SECONDS
+from app.utils.redis_client import get_redis
+
+
+logger = get_logger(__name__)
+
+# Release wakes one waiter through a list it can BLPOP on. The list holds at most one entry and
+# expires quickly, so a signal nobody was waiting for only costs the next waiter one extra SET.
+_RELEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('del', KEYS[1])
+    redis.call('lpush', KEYS[2], 1)
+    redis.call('ltrim', KEYS[2], 0, 0)
+    redis.call('pexpire', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_EXTEND = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_SIGNAL_TTL_MS = 5000
+# A holder that dies never signals, so waiters also retry once its TTL may have lapsed.
+# BLPOP treats a timeout rounding down to 0 ms as "block forever", hence the floor.
+_MAX_WAIT_SLICE_SEC = 1.0
+_MIN_WAIT_SLICE_SEC = 0.01
+_DEFAULT_MAX_HOLD_SEC = 3600
 
 
 class RedisLock:
-    def __init__(self, redis_url: str, key: str, ttl: int = 60):
-        self.client = redis.Redis.from_url(redis_url)
+    def __init__(self, redis_url: str, key: str, ttl: int = 60, max_hold: int = _DEFAULT_MAX_HOLD_SEC):
+        self.client = get_redis(redis_url)
         self.key = f"lock:{key}"
+        self.signal_key = f"{self.key}:released"
+        self.name = key.split(":", 1)[0]
         self.ttl = ttl
+        # The watchdog never extends the lock past this, so a hung holder cannot keep it forever.
+        self.max_hold = max(ttl, max_hold)
         self.token = uuid.uuid4().hex
+        self._release_script = self.client.register_script(_RELEASE)
+        self._extend_script = self.client.register_script(_EXTEND)
+        self._acquired_at: float | None = None
+        self._stop: threading.Event | None = None
 
-    def acquire(self, timeout: int = 0) -> bool:
-        end = time.time() + timeout
-        while True:
-            if self.client.set(self.key, self.token, nx=True, ex=self.ttl):
-                return True
-            if timeout == 0 or time.time() >= end:
-                return False
-            time.sleep(0.1)
+    def acquire(self, timeout: float = 0) -> bool:
+        started = time.monotonic()
+        deadline = started + timeout
+        try:
+            while True:
+                if self.client.set(self.key, self.token, nx=True, ex=self.ttl):
+                    self._acquired_at = time.monotonic()
+                    self._start_watchdog()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(max(remaining, _MIN_WAIT_SLICE_SEC), _MAX_WAIT_SLICE_SEC)
+                self.client.blpop([self.signal_key], timeout=wait)
+        finally:
+            LOCK_WAIT_SECONDS.labels(self.name).observe(time.monotonic() - started)
 
     def release(self) -> None:
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+        if self._acquired_at is None:
+            return
+        LOCK_HOLD_SECONDS.labels(self.name).observe(time.monotonic() - self._acquired_at)
+        self._acquired_at = None
         try:
-            value = self.client.get(self.key)
-            if value and value.decode() == self.token:
-                self.client.delete(self.key)
-        except Exception:
-            pass
+            self._release_script(keys=[self.key, self.signal_key], args=[self.token, _SIGNAL_TTL_MS])
+        except Exception as exc:
+            logger.warning("redis_lock_release_failed", extra={"lock": self.key, "error": str(exc)})
+
+    def _start_watchdog(self) -> None:
+        # Keeps the TTL short for crash recovery without letting a slow holder lose the lock.
+        self._stop = threading.Event()
+        threading.Thread(
+            target=self._renew, args=(self._stop,), name=f"lock-watchdog-{self.name}", daemon=True
+        ).start()
+
+    def _renew(self, stop: threading.Event) -> None:
+        deadline = time.monotonic() + self.max_hold
+        while not stop.wait(self.ttl / 3):
+            if time.monotonic() + self.ttl > deadline:
+                logger.warning("redis_lock_max_hold_reached", extra={"lock": self.key})
+                return
+            try:
+                if not self._extend_script(keys=[self.key], args=[self.token, self.ttl * 1000]):
+                    logger.warning("redis_lock_lost", extra={"lock": self.key})
+                    return
+            except Exception as exc:
+                logger.warning("redis_lock_renew_failed", extra={"lock": self.key, "error": str(exc)})
 
     def __enter__(self) -> "RedisLock":
         acquired = self.acquire()
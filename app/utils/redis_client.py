@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+import redis
+
+
+_clients: Dict[str, redis.Redis] = {}
+_lock = threading.Lock()
+
+
+def get_redis(redis_url: str) -> redis.Redis:
+    client = _clients.get(redis_url)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(redis_url)
+        if client is None:
+            # redis-py resets the pool on pid change, so one client per URL is fork-safe.
+            client = redis.Redis.from_url(redis_url)
+            _clients[redis_url] = client
+        return client
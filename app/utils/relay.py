@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import io
+import os
+import queue
+import threading
+from typing import Any, Iterator
+
+
+class RelayError(RuntimeError):
+    pass
+
+
+_EOF = object()
+
+
+# Read-only file object fed by a background producer through a bounded queue.
+# It reports a fixed length so httpx sends Content-Length for multipart uploads,
+# but it cannot be rewound, so callers must not retry with it.
+class RelayStream(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes], size: int, name: str, max_chunks: int = 64) -> None:
+        super().__init__()
+        self.name = name
+        self.size = size
+        self._chunks = chunks
+        self._queue: queue.Queue[Any] = queue.Queue(maxsize=max(1, max_chunks))
+        self._buffer = b""
+        self._position = 0
+        self._stopped = threading.Event()
+        self._producer = threading.Thread(target=self._produce, name=f"relay-{name}", daemon=True)
+        self._producer.start()
+
+    def _put(self, item: object) -> bool:
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        received = 0
+        try:
+            for chunk in self._chunks:
+                received += len(chunk)
+                if received > self.size:
+                    raise RelayError(f"Source exceeded declared size {self.size}")
+                if not self._put(chunk):
+                    return
+            if received != self.size:
+                raise RelayError(f"Source ended at {received} of {self.size} bytes")
+            self._put(_EOF)
+        except BaseException as exc:
+            self._put(exc)
+        finally:
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        # Only the probes httpx uses to learn the length and reset to the start are supported.
+        if whence == os.SEEK_END and offset == 0:
+            return self.size
+        if whence == os.SEEK_SET and offset == self._position:
+            return self._position
+        raise io.UnsupportedOperation("RelayStream is not rewindable")
+
+    def read(self, size: int = -1) -> bytes:
+        if self.closed:
+            raise ValueError("I/O operation on closed relay stream")
+        while not self._buffer:
+            item = self._queue.get()
+            if item is _EOF:
+                self._queue.put(_EOF)
+                return b""
+            if isinstance(item, BaseException):
+                self._queue.put(item)
+                raise RelayError(str(item)) from item
+            self._buffer = item
+        if size is None or size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._position += len(data)
+        return data
+
+    def close(self) -> None:
+        self._stopped.set()
+        super().close()
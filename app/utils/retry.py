@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 import random
 import time
-from typing import Callable, Iterable, Type
+from typing import Awaitable, Callable, Iterable, Type
 
 import httpx
 
+from app.metrics import record_retry
+
 
 def retry(
     func: Callable[[], object],
@@ -16,6 +19,7 @@ def retry(
     jitter: float = 0.1,
     exceptions: Iterable[Type[BaseException]] = (httpx.RequestError, httpx.TimeoutException),
     on_retry: Callable[[int, BaseException, float], None] | None = None,
+    name: str | None = None,
 ) -> object:
     attempt = 0
     while True:
@@ -27,6 +31,34 @@ def retry(
                 raise
             delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
             delay *= 1 + (random.random() * jitter)
+            record_retry(name or str(getattr(func, "__qualname__", "unknown")))
             if on_retry:
                 on_retry(attempt, exc, delay)
             time.sleep(delay)
+
+
+async def async_retry(
+    func: Callable[[], Awaitable[object]],
+    *,
+    tries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 10.0,
+    jitter: float = 0.1,
+    exceptions: Iterable[Type[BaseException]] = (httpx.RequestError, httpx.TimeoutException),
+    on_retry: Callable[[int, BaseException, float], None] | None = None,
+    name: str | None = None,
+) -> object:
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await func()
+        except tuple(exceptions) as exc:
+            if attempt >= tries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+            delay *= 1 + (random.random() * jitter)
+            record_retry(name or str(getattr(func, "__qualname__", "unknown")))
+            if on_retry:
+                on_retry(attempt, exc, delay)
+            await asyncio.sleep(delay)
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator
+
+from app.metrics import MEDIA_STAGE_SECONDS
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+        self._items: Dict[int, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str, item: int | None = None) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, item=item)
+
+    def add(self, name: str, seconds: float, item: int | None = None) -> None:
+        MEDIA_STAGE_SECONDS.labels(name).observe(seconds)
+        # Upload workers report from several threads at once.
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + seconds
+            if item is not None:
+                stages = self._items.setdefault(item, {})
+                stages[name] = stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_ms": _ms(time.perf_counter() - self._started),
+                "stages": {name: _ms(seconds) for name, seconds in self._stages.items()},
+                "items": [
+                    {"index": index, **{name: _ms(seconds) for name, seconds in stages.items()}}
+                    for index, stages in sorted(self._items.items())
+                ],
+            }
+
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000))
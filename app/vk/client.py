@@ -1,24 +1,61 @@
 from __future__ import annotations
 
+import time
 from typing import Any, Dict
 
 import httpx
 
+from app.config import get_settings
 from app.logging_setup import get_logger
+from app.metrics import record_retry
+from app.utils.http import VK_API, get_http_client
 from app.utils.retry import retry
+from app.vk.rate_limit import VKRateLimiter, get_rate_limiter
 from app.vk.types import VKAPIError
 
 
 class VKClient:
-    def __init__(self, access_token: str, api_version: str = "5.199") -> None:
+    def __init__(
+        self,
+        access_token: str,
+        api_version: str = "5.199",
+        http_client: httpx.Client | None = None,
+        rate_limiter: VKRateLimiter | None = None,
+    ) -> None:
         self.access_token = access_token
         self.api_version = api_version
         self.base_url = "https://api.vk.com/method"
-        self._client = httpx.Client()
+        self._client = http_client or get_http_client(VK_API)
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.rate_limit_retries = get_settings().VK_RATE_LIMIT_RETRIES
         self.logger = get_logger(__name__)
 
     def api(self, method: str, params: Dict[str, Any], token_override: str | None = None) -> Dict[str, Any]:
+        return self.api_raw(method, params, token_override).get("response") or {}
+
+    def api_raw(
+        self, method: str, params: Dict[str, Any], token_override: str | None = None
+    ) -> Dict[str, Any]:
+        attempt = 0
+        while True:
+            try:
+                return self._call(method, params, token_override)
+            except VKAPIError as exc:
+                attempt += 1
+                if not exc.is_rate_limit_error() or attempt > self.rate_limit_retries:
+                    raise
+                # Error 9 (flood control) needs a much longer pause than error 6.
+                delay = (1.0 if exc.code == 6 else 5.0) * attempt
+                record_retry("vk_rate_limit")
+                self.logger.warning(
+                    "vk_rate_limited",
+                    extra={"method": method, "code": exc.code, "attempt": attempt, "delay": delay},
+                )
+                time.sleep(delay)
+
+    def _call(self, method: str, params: Dict[str, Any], token_override: str | None) -> Dict[str, Any]:
         token = token_override or self.access_token
+        self.rate_limiter.acquire(token, method, user_token=token_override is not None)
         payload = dict(params)
         payload["access_token"] = token
         payload["v"] = self.api_version
@@ -29,6 +66,7 @@ class VKClient:
 
         response = retry(
             do_request,
+            name="vk_request",
             on_retry=lambda attempt, exc, delay: self.logger.warning(
                 "vk_request_retry",
                 extra={"method": method, "attempt": attempt, "delay": delay, "error": str(exc)},
@@ -39,4 +77,4 @@ class VKClient:
         if "error" in data:
             error = data["error"]
             raise VKAPIError(code=int(error.get("error_code", -1)), message=error.get("error_msg", ""), params=error)
-        return data.get("response") or {}
+        return data
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Union
+
+from app.logging_setup import get_logger
+from app.vk.client import VKClient
+from app.vk.types import VKAPIError
+
+
+logger = get_logger(__name__)
+
+
+# VK rejects execute requests with more than 25 API calls.
+MAX_EXECUTE_CALLS = 25
+
+CallResult = Union[Any, VKAPIError]
+
+
+@dataclass
+class BatchCall:
+    method: str
+    params: Dict[str, Any]
+
+
+def build_execute_code(calls: List[BatchCall]) -> str:
+    body = ",".join(
+        f"API.{call.method}({json.dumps(call.params, ensure_ascii=False)})" for call in calls
+    )
+    return f"return [{body}];"
+
+
+def _map_results(calls: List[BatchCall], data: Dict[str, Any]) -> List[CallResult]:
+    results = data.get("response") or []
+    # execute_errors lists only the failed calls, in call order; their slots hold false.
+    errors = list(data.get("execute_errors") or [])
+    mapped: List[CallResult] = []
+    # A truncated response is not an error for the whole batch: calls past its end get their own
+    # VKAPIError below, so callers can degrade per call.
+    for call, result in zip(calls[: len(results)], results, strict=True):
+        if result is False:
+            error = errors.pop(0) if errors else {}
+            mapped.append(
+                VKAPIError(
+                    code=int(error.get("error_code", -1)),
+                    message=error.get("error_msg", f"{call.method} failed inside execute"),
+                    params=error,
+                )
+            )
+        else:
+            mapped.append(result)
+    for call in calls[len(mapped) :]:
+        mapped.append(VKAPIError(code=-1, message=f"{call.method} missing from execute response"))
+    return mapped
+
+
+def execute_calls(
+    client: VKClient, calls: List[BatchCall], token_override: str | None = None
+) -> List[CallResult]:
+    results: List[CallResult] = []
+    for start in range(0, len(calls), MAX_EXECUTE_CALLS):
+        chunk = calls[start : start + MAX_EXECUTE_CALLS]
+        if len(chunk) == 1:
+            try:
+                results.append(client.api(chunk[0].method, chunk[0].params, token_override))
+            except VKAPIError as exc:
+                results.append(exc)
+            continue
+        data = client.api_raw("execute", {"code": build_execute_code(chunk)}, token_override)
+        results.extend(_map_results(chunk, data))
+    return results
+
+
+def execute_with_fallback(
+    client: VKClient, calls: List[BatchCall], user_token: str | None
+) -> List[CallResult]:
+    results = execute_calls(client, calls)
+    if not user_token:
+        return results
+    retry_indexes = [
+        idx
+        for idx, result in enumerate(results)
+        if isinstance(result, VKAPIError) and result.is_permission_error()
+    ]
+    if not retry_indexes:
+        return results
+    logger.warning("vk_permission_fallback", extra={"method": "execute", "count": len(retry_indexes)})
+    retried = execute_calls(client, [calls[idx] for idx in retry_indexes], token_override=user_token)
+    for idx, result in zip(retry_indexes, retried, strict=True):
+        results[idx] = result
+    return results
+
+
+def raise_first_error(results: List[CallResult]) -> List[Any]:
+    for result in results:
+        if isinstance(result, VKAPIError):
+            raise result
+    return results
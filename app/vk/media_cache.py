@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+from app.config import get_settings
+from app.crud import (
+    delete_media_cache_entries,
+    get_media_cache_entries,
+    upsert_media_cache_entry,
+    utcnow,
+)
+from app.db import session_scope
+from app.logging_setup import get_logger
+from app.utils.redis_client import get_redis
+
+
+settings = get_settings()
+logger = get_logger(__name__)
+
+CacheKey = Tuple[str, str]
+
+
+def _redis_key(vk_group_id: int, media_type: str, file_unique_id: str) -> str:
+    return f"vk_media:{vk_group_id}:{media_type}:{file_unique_id}"
+
+
+def _ttl_seconds() -> int:
+    return settings.MEDIA_CACHE_TTL_DAYS * 86400
+
+
+def get_cached_attachments(vk_group_id: int, keys: List[CacheKey]) -> Dict[CacheKey, str]:
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    found: Dict[CacheKey, str] = {}
+    try:
+        values = get_redis(settings.REDIS_URL).mget(
+            [_redis_key(vk_group_id, media_type, fuid) for fuid, media_type in keys]
+        )
+        for key, value in zip(keys, values, strict=True):
+            if value:
+                found[key] = value.decode() if isinstance(value, bytes) else value
+    except Exception as exc:
+        logger.warning("vk_media_cache_redis_failed", extra={"error": str(exc)})
+
+    missing = [key for key in keys if key not in found]
+    if not missing:
+        return found
+
+    with session_scope() as session:
+        entries = [
+            (entry.file_unique_id, entry.media_type, entry.attachment, entry.expires_at)
+            for entry in get_media_cache_entries(session, vk_group_id, missing)
+        ]
+
+    now = utcnow()
+    try:
+        pipe = get_redis(settings.REDIS_URL).pipeline(transaction=False)
+        for fuid, media_type, attachment, expires_at in entries:
+            ttl = int((expires_at - now).total_seconds())
+            if ttl > 0:
+                pipe.set(_redis_key(vk_group_id, media_type, fuid), attachment, ex=ttl)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("vk_media_cache_redis_failed", extra={"error": str(exc)})
+
+    for fuid, media_type, attachment, _ in entries:
+        found[(fuid, media_type)] = attachment
+    return found
+
+
+def store_attachments(vk_group_id: int, entries: List[Tuple[str, str, str]]) -> None:
+    ttl = _ttl_seconds()
+    if ttl <= 0 or not entries:
+        return
+    expires_at = utcnow() + timedelta(seconds=ttl)
+    with session_scope() as session:
+        for file_unique_id, media_type, attachment in entries:
+            upsert_media_cache_entry(
+                session,
+                file_unique_id=file_unique_id,
+                vk_group_id=vk_group_id,
+                media_type=media_type,
+                attachment=attachment,
+                expires_at=expires_at,
+            )
+    try:
+        pipe = get_redis(settings.REDIS_URL).pipeline(transaction=False)
+        for file_unique_id, media_type, attachment in entries:
+            pipe.set(_redis_key(vk_group_id, media_type, file_unique_id), attachment, ex=ttl)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("vk_media_cache_redis_failed", extra={"error": str(exc)})
+
+
+def invalidate_attachments(vk_group_id: int, attachments: List[str]) -> int:
+    with session_scope() as session:
+        removed = delete_media_cache_entries(session, vk_group_id, attachments)
+    if removed:
+        try:
+            get_redis(settings.REDIS_URL).delete(
+                *[_redis_key(vk_group_id, media_type, fuid) for fuid, media_type in removed]
+            )
+        except Exception as exc:
+            logger.warning("vk_media_cache_redis_failed", extra={"error": str(exc)})
+        logger.info(
+            "vk_media_cache_invalidated",
+            extra={"vk_group_id": vk_group_id, "count": len(removed)},
+        )
+    return len(removed)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Dict, List
+
+from redis.commands.core import Script
+
+from app.config import get_settings
+from app.logging_setup import get_logger
+from app.utils.redis_client import get_redis
+
+
+logger = get_logger(__name__)
+
+# Checks every bucket in KEYS against the matching rate in ARGV and only takes a
+# token when all of them have one, so the per-token and per-family limits stay
+# consistent across workers. Returns 0 on success or the wait in milliseconds.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local state = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i])
+    local capacity = math.max(1, rate)
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1])
+    local ts = tonumber(data[2])
+    if tokens == nil or ts == nil then
+        tokens = capacity
+        ts = now
+    end
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) * 1000 / rate))
+    end
+    state[i] = tokens
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i])
+    local tokens = state[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(math.max(1, rate) * 1000 / rate) + 1000)
+end
+return wait
+"""
+
+
+class VKRateLimiter:
+    def __init__(self, settings) -> None:
+        self.settings = settings
+        self._script: Script | None = None
+
+    def _buckets(self, token: str, method: str, user_token: bool) -> Dict[str, float]:
+        token_key = hashlib.sha256(token.encode()).hexdigest()[:16]
+        per_token = (
+            self.settings.VK_USER_RATE_LIMIT_PER_SEC
+            if user_token
+            else self.settings.VK_RATE_LIMIT_PER_SEC
+        )
+        buckets = {f"vk_rate:{token_key}": per_token}
+        family = method.split(".", 1)[0]
+        family_rate = self.settings.VK_RATE_LIMIT_METHODS.get(family)
+        if family_rate:
+            buckets[f"vk_rate:{token_key}:{family}"] = family_rate
+        return {key: rate for key, rate in buckets.items() if rate > 0}
+
+    def acquire(self, token: str, method: str, user_token: bool = False) -> float:
+        buckets = self._buckets(token, method, user_token)
+        if not buckets:
+            return 0.0
+        keys: List[str] = list(buckets)
+        rates = [str(buckets[key]) for key in keys]
+        waited = 0.0
+        while True:
+            try:
+                if self._script is None:
+                    self._script = get_redis(self.settings.REDIS_URL).register_script(
+                        _TOKEN_BUCKET_LUA
+                    )
+                wait_ms = int(self._script(keys=keys, args=rates))
+            except Exception as exc:
+                # Failing open keeps posting alive if Redis hiccups; VK error 6 is retried anyway.
+                logger.warning("vk_rate_limiter_unavailable", extra={"error": str(exc)})
+                return waited
+            if wait_ms <= 0:
+                return waited
+            delay = wait_ms / 1000
+            time.sleep(delay)
+            waited += delay
+
+
+_limiter: VKRateLimiter | None = None
+
+
+def get_rate_limiter() -> VKRateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = VKRateLimiter(get_settings())
+    return _limiter
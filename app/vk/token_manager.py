@@ -1,57 +1,71 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+import json
+import os
+import threading
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 import httpx
 
 from app.config import get_settings
-from app.crud import get_setting, set_setting
+from app.crud import get_settings_values, set_settings_values
 from app.db import session_scope
 from app.logging_setup import get_logger
+from app.utils.http import VK_API, get_http_client
 from app.utils.locks import RedisLock
+from app.utils.redis_client import get_redis
 from app.utils.retry import retry
 
 
 settings = get_settings()
 logger = get_logger(__name__)
 
+TOKEN_CACHE_KEY = "tg_vk_bot:vk_user_token"
+_BACKGROUND_RETRY_SEC = 10
 
-def _now() -> int:
-    return int(time.time())
-
-
-def _settings_get(key: str, fallback: str | None = None) -> str | None:
-    with session_scope() as session:
-        return get_setting(session, key, fallback)
+_STATE_KEYS = {
+    "access_token": "vk_user_access_token",
+    "refresh_token": "vk_user_refresh_token",
+    "expires_at": "vk_user_token_expires_at",
+    "client_id": "vk_user_client_id",
+    "device_id": "vk_user_device_id",
+    "state": "vk_user_state",
+}
 
 
-def _settings_set(key: str, value: str) -> None:
-    with session_scope() as session:
-        set_setting(session, key, value)
+def _now() -> int:
+    return int(time.time())
 
 
 def _load_token_state() -> Dict[str, Any]:
-    return {
-        "access_token": _settings_get("vk_user_access_token", settings.VK_USER_ACCESS_TOKEN),
-        "refresh_token": _settings_get("vk_user_refresh_token", settings.VK_USER_REFRESH_TOKEN),
-        "expires_at": _settings_get(
-            "vk_user_token_expires_at",
-            str(settings.VK_USER_TOKEN_EXPIRES_AT) if settings.VK_USER_TOKEN_EXPIRES_AT else None,
-        ),
-        "client_id": _settings_get("vk_user_client_id", settings.VK_USER_CLIENT_ID),
-        "device_id": _settings_get("vk_user_device_id", settings.VK_USER_DEVICE_ID),
-        "state": _settings_get("vk_user_state", settings.VK_USER_STATE),
+    defaults = {
+        "access_token": settings.VK_USER_ACCESS_TOKEN,
+        "refresh_token": settings.VK_USER_REFRESH_TOKEN,
+        "expires_at": str(settings.VK_USER_TOKEN_EXPIRES_AT) if settings.VK_USER_TOKEN_EXPIRES_AT else None,
+        "client_id": settings.VK_USER_CLIENT_ID,
+        "device_id": settings.VK_USER_DEVICE_ID,
+        "state": settings.VK_USER_STATE,
     }
+    with session_scope() as session:
+        stored = get_settings_values(session, _STATE_KEYS.values())
+    return {name: stored.get(key, defaults[name]) for name, key in _STATE_KEYS.items()}
 
 
 def _save_token_state(access_token: str, refresh_token: str, expires_at: int) -> None:
-    _settings_set("vk_user_access_token", access_token)
-    _settings_set("vk_user_refresh_token", refresh_token)
-    _settings_set("vk_user_token_expires_at", str(expires_at))
+    with session_scope() as session:
+        set_settings_values(
+            session,
+            {
+                "vk_user_access_token": access_token,
+                "vk_user_refresh_token": refresh_token,
+                "vk_user_token_expires_at": str(expires_at),
+            },
+        )
 
 
-def _refresh_token(state: Dict[str, Any]) -> str:
+def _refresh_token(state: Dict[str, Any]) -> Tuple[str, int]:
     params = {
         "grant_type": "refresh_token",
         "refresh_token": state["refresh_token"],
@@ -63,10 +77,11 @@ def _refresh_token(state: Dict[str, Any]) -> str:
         params["state"] = state["state"]
 
     def do_request() -> httpx.Response:
-        return httpx.post(settings.VK_ID_OAUTH_URL, data=params, timeout=30)
+        return get_http_client(VK_API).post(settings.VK_ID_OAUTH_URL, data=params, timeout=30)
 
     response = retry(
         do_request,
+        name="vk_token_refresh",
         on_retry=lambda attempt, exc, delay: logger.warning(
             "vk_token_refresh_retry",
             extra={"attempt": attempt, "delay": delay, "error": str(exc)},
@@ -82,32 +97,147 @@ def _refresh_token(state: Dict[str, Any]) -> str:
     expires_at = _now() + expires_in
     _save_token_state(access_token, refresh_token, expires_at)
     logger.info("vk_token_refreshed", extra={"expires_in": expires_in})
-    return access_token
+    return access_token, expires_at
+
+
+@dataclass(frozen=True)
+class _Token:
+    value: str | None
+    # 0 for tokens that cannot be refreshed; those are re-read from the database periodically.
+    expires_at: int
+    loaded_at: float
+
+    def remaining(self) -> int:
+        return self.expires_at - _now()
+
+
+def _token_from_state(state: Dict[str, Any]) -> _Token:
+    access_token = state.get("access_token")
+    refreshable = bool(access_token and state.get("refresh_token") and state.get("client_id"))
+    expires_at = 0
+    if refreshable:
+        # An unknown expiry counts as expired, so the first caller refreshes it.
+        expires_at = int(state.get("expires_at") or 1)
+    return _Token(access_token, expires_at, time.monotonic())
+
+
+class UserTokenProvider:
+    # The token is kept in-process and in Redis until it expires, so the common case costs no
+    # round-trip. Refreshes run once across all workers, ahead of expiry and off the task thread.
+    def __init__(self, settings) -> None:
+        self.settings = settings
+        self.refresh_ahead = settings.VK_USER_TOKEN_REFRESH_AHEAD_SEC
+        self._token: _Token | None = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._retry_at = 0.0
+        self._pid = os.getpid()
+
+    def get(self, min_ttl_seconds: int) -> str | None:
+        if self._pid != os.getpid():
+            # A lock or refresh thread inherited over fork belongs to the parent.
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._refreshing = False
+        token = self._token
+        if token is None or not self._usable(token, min_ttl_seconds):
+            token = self._load(min_ttl_seconds)
+        if token.expires_at and token.remaining() < self.refresh_ahead:
+            self._refresh_in_background()
+        return token.value
+
+    def _usable(self, token: _Token, min_ttl_seconds: int) -> bool:
+        if token.expires_at:
+            return token.remaining() > min_ttl_seconds
+        return time.monotonic() - token.loaded_at < self.settings.RUNTIME_SETTINGS_TTL_SEC
+
+    def _load(self, min_ttl_seconds: int) -> _Token:
+        token = self._from_redis()
+        if token is None or not self._usable(token, min_ttl_seconds):
+            token = _token_from_state(_load_token_state())
+            if token.expires_at and token.remaining() <= min_ttl_seconds:
+                token = self._refresh(timeout=5, min_remaining=min_ttl_seconds) or self._fallback(token)
+            else:
+                self._publish(token)
+        self._token = token
+        return token
+
+    def _fallback(self, token: _Token) -> _Token:
+        return self._from_redis() or token
+
+    def _refresh(self, timeout: int, min_remaining: int) -> _Token | None:
+        lock = RedisLock(self.settings.REDIS_URL, "vk_user_token_refresh", ttl=60)
+        if not lock.acquire(timeout=timeout):
+            logger.warning("vk_token_refresh_lock_busy")
+            return None
+        try:
+            # The refresh token is single-use: another worker may have refreshed while we waited.
+            state = _load_token_state()
+            token = _token_from_state(state)
+            if token.expires_at and token.remaining() <= min_remaining:
+                access_token, expires_at = _refresh_token(state)
+                token = _Token(access_token, expires_at, time.monotonic())
+            self._publish(token)
+            return token
+        finally:
+            lock.release()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._retry_at:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="vk-token-refresh", daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        token = None
+        try:
+            token = self._from_redis()
+            if token is None or token.remaining() < self.refresh_ahead:
+                token = self._refresh(timeout=0, min_remaining=self.refresh_ahead)
+            if token is not None:
+                self._token = token
+        except Exception as exc:
+            logger.warning("vk_token_background_refresh_failed", extra={"error": str(exc)})
+        finally:
+            if token is None or token.remaining() < self.refresh_ahead:
+                self._retry_at = time.monotonic() + _BACKGROUND_RETRY_SEC
+            self._refreshing = False
+
+    def _from_redis(self) -> _Token | None:
+        try:
+            raw = get_redis(self.settings.REDIS_URL).get(TOKEN_CACHE_KEY)
+        except Exception as exc:
+            logger.warning("vk_token_cache_read_failed", extra={"error": str(exc)})
+            return None
+        if not raw:
+            return None
+        data = json.loads(raw)
+        return _Token(data["access_token"], int(data["expires_at"]), time.monotonic())
 
+    def _publish(self, token: _Token) -> None:
+        ttl = token.remaining()
+        if not token.expires_at or ttl <= 0:
+            return
+        payload = json.dumps({"access_token": token.value, "expires_at": token.expires_at})
+        try:
+            get_redis(self.settings.REDIS_URL).set(TOKEN_CACHE_KEY, payload, ex=ttl)
+        except Exception as exc:
+            logger.warning("vk_token_cache_write_failed", extra={"error": str(exc)})
 
-def get_user_access_token(min_ttl_seconds: int = 120) -> str | None:
-    lock = RedisLock(settings.REDIS_URL, "vk_user_token_refresh", ttl=60)
-    if not lock.acquire(timeout=5):
-        logger.warning("vk_token_refresh_lock_busy")
-        return _settings_get("vk_user_access_token", settings.VK_USER_ACCESS_TOKEN)
-
-    try:
-        state = _load_token_state()
-        access_token = state.get("access_token")
-        refresh_token = state.get("refresh_token")
-        expires_at_raw = state.get("expires_at")
-        client_id = state.get("client_id")
-
-        if not access_token:
-            return None
 
-        if not refresh_token or not client_id:
-            return access_token
+_provider: UserTokenProvider | None = None
+_provider_lock = threading.Lock()
+
 
-        expires_at = int(expires_at_raw) if expires_at_raw else 0
-        if expires_at and (_now() + min_ttl_seconds) < expires_at:
-            return access_token
+def _get_provider() -> UserTokenProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = UserTokenProvider(settings)
+    return _provider
 
-        return _refresh_token(state)
-    finally:
-        lock.release()
+
+def get_user_access_token(min_ttl_seconds: int = 120) -> str | None:
+    return _get_provider().get(min_ttl_seconds)
@@ -15,3 +15,9 @@ class VKAPIError(RuntimeError):
 
     def is_permission_error(self) -> bool:
         return self.code in {5, 7, 15, 27, 30, 200}
+
+    def is_rate_limit_error(self) -> bool:
+        return self.code in {6, 9}
+
+    def is_invalid_attachment_error(self) -> bool:
+        return self.code == 100 and "attachment" in (self.message or "").lower()
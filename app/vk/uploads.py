@@ -1,18 +1,46 @@
 from __future__ import annotations
 
 import os
-from typing import Callable, Dict
+from dataclasses import dataclass
+from typing import IO, Any, Dict, List, Union
 
 import httpx
 
 from app.logging_setup import get_logger
+from app.utils.http import VK_UPLOAD, get_http_client
 from app.utils.retry import retry
 from app.vk.client import VKClient
+from app.vk.execute import BatchCall, execute_with_fallback, raise_first_error
 from app.vk.types import VKAPIError
 
 
 logger = get_logger(__name__)
 
+UploadSource = Union[str, IO[bytes]]
+
+
+def _source_name(source: UploadSource) -> str:
+    if isinstance(source, str):
+        return os.path.basename(source)
+    return os.path.basename(getattr(source, "name", "") or "file")
+
+
+def _post_file(upload_url: str, field: str, source: UploadSource, timeout: int) -> httpx.Response:
+    http_client = get_http_client(VK_UPLOAD)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            response = retry(
+                lambda: http_client.post(upload_url, files={field: f}, timeout=timeout),
+                name="vk_upload",
+            )
+    else:
+        # Streamed sources can't be rewound, so they get a single attempt.
+        response = http_client.post(
+            upload_url, files={field: (_source_name(source), source)}, timeout=timeout
+        )
+    response.raise_for_status()
+    return response
+
 
 def _call_with_fallback(
     client: VKClient, method: str, params: Dict, user_token: str | None
@@ -26,68 +54,119 @@ def _call_with_fallback(
         raise
 
 
-def upload_photo(client: VKClient, file_path: str, group_id: int, user_token: str | None = None) -> str:
+@dataclass
+class PendingPhoto:
+    group_id: int
+    uploaded: Dict[str, Any]
+
+
+def get_photo_upload_server(client: VKClient, group_id: int, user_token: str | None = None) -> str:
     server = _call_with_fallback(client, "photos.getWallUploadServer", {"group_id": group_id}, user_token)
-    upload_url = server["upload_url"]
-    with open(file_path, "rb") as f:
-        response = retry(lambda: httpx.post(upload_url, files={"photo": f}, timeout=60))
-    response.raise_for_status()
-    uploaded = response.json()
-    saved = _call_with_fallback(
-        client,
-        "photos.saveWallPhoto",
-        {
-            "group_id": group_id,
-            "photo": uploaded.get("photo"),
-            "server": uploaded.get("server"),
-            "hash": uploaded.get("hash"),
-        },
-        user_token,
-    )
-    item = saved[0]
-    return f"photo{item['owner_id']}_{item['id']}"
+    return server["upload_url"]
+
+
+def upload_photo_to_server(
+    client: VKClient,
+    source: UploadSource,
+    group_id: int,
+    user_token: str | None = None,
+    upload_url: str | None = None,
+) -> PendingPhoto:
+    upload_url = upload_url or get_photo_upload_server(client, group_id, user_token)
+    response = _post_file(upload_url, "photo", source, timeout=60)
+    return PendingPhoto(group_id=group_id, uploaded=response.json())
+
+
+def save_wall_photos(
+    client: VKClient, pending: List[PendingPhoto], user_token: str | None = None
+) -> List[str]:
+    calls = [
+        BatchCall(
+            "photos.saveWallPhoto",
+            {
+                "group_id": photo.group_id,
+                "photo": photo.uploaded.get("photo"),
+                "server": photo.uploaded.get("server"),
+                "hash": photo.uploaded.get("hash"),
+            },
+        )
+        for photo in pending
+    ]
+    saved = raise_first_error(execute_with_fallback(client, calls, user_token))
+    return [f"photo{item[0]['owner_id']}_{item[0]['id']}" for item in saved]
+
+
+def upload_photo(client: VKClient, source: UploadSource, group_id: int, user_token: str | None = None) -> str:
+    pending = upload_photo_to_server(client, source, group_id, user_token=user_token)
+    return save_wall_photos(client, [pending], user_token)[0]
 
 
 def upload_document(
     client: VKClient,
-    file_path: str,
+    source: UploadSource,
     group_id: int,
     title: str | None = None,
     user_token: str | None = None,
 ) -> str:
     server = _call_with_fallback(client, "docs.getWallUploadServer", {"group_id": group_id}, user_token)
     upload_url = server["upload_url"]
-    with open(file_path, "rb") as f:
-        response = retry(lambda: httpx.post(upload_url, files={"file": f}, timeout=60))
-    response.raise_for_status()
+    response = _post_file(upload_url, "file", source, timeout=60)
     uploaded = response.json()
     saved = _call_with_fallback(
         client,
         "docs.save",
-        {"file": uploaded.get("file"), "title": title or os.path.basename(file_path)},
+        {"file": uploaded.get("file"), "title": title or _source_name(source)},
         user_token,
     )
     doc = saved.get("doc") or saved.get("audio_message") or saved
     return f"doc{doc['owner_id']}_{doc['id']}"
 
 
+def reserve_video(
+    client: VKClient, group_id: int, title: str, user_token: str | None = None
+) -> Dict[str, Any]:
+    return _call_with_fallback(client, "video.save", {"group_id": group_id, "name": title}, user_token)
+
+
 def upload_video(
     client: VKClient,
-    file_path: str,
+    source: UploadSource,
     group_id: int,
     title: str | None = None,
     user_token: str | None = None,
+    save: Dict[str, Any] | None = None,
 ) -> str:
-    save = _call_with_fallback(
-        client,
-        "video.save",
-        {"group_id": group_id, "name": title or os.path.basename(file_path)},
-        user_token,
-    )
-    upload_url = save["upload_url"]
-    with open(file_path, "rb") as f:
-        response = retry(lambda: httpx.post(upload_url, files={"video_file": f}, timeout=120))
-    response.raise_for_status()
+    # video.save creates the video; a retried upload passes the same save to avoid an empty orphan.
+    if save is None:
+        save = reserve_video(client, group_id, title or _source_name(source), user_token)
+    _post_file(save["upload_url"], "video_file", source, timeout=120)
     owner_id = save.get("owner_id")
     video_id = save.get("video_id")
     return f"video{owner_id}_{video_id}"
+
+
+_DELETE_METHODS = {
+    "photo": ("photos.delete", "photo_id"),
+    "doc": ("docs.delete", "doc_id"),
+    "video": ("video.delete", "video_id"),
+}
+
+
+def delete_uploaded_attachments(
+    client: VKClient, attachments: List[str], user_token: str | None = None
+) -> int:
+    calls = []
+    for attachment in attachments:
+        kind = next((k for k in _DELETE_METHODS if attachment.startswith(k)), None)
+        if kind is None:
+            continue
+        owner_id, _, item_id = attachment[len(kind) :].partition("_")
+        method, id_field = _DELETE_METHODS[kind]
+        calls.append(BatchCall(method, {"owner_id": int(owner_id), id_field: int(item_id)}))
+    deleted = 0
+    for call, result in zip(calls, execute_with_fallback(client, calls, user_token), strict=True):
+        if isinstance(result, VKAPIError):
+            logger.warning("vk_delete_failed", extra={"method": call.method, "error": str(result)})
+        else:
+            deleted += 1
+    return deleted
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Tuple
 
 from app.vk.client import VKClient
+from app.vk.execute import BatchCall, execute_calls, raise_first_error
 
 
-def post_to_wall(client: VKClient, group_id: int, message: str, attachments: List[str]) -> dict:
+def wall_post_params(group_id: int, message: str, attachments: List[str]) -> dict:
     params = {
         "owner_id": -int(group_id),
         "from_group": 1,
@@ -13,4 +14,18 @@ def post_to_wall(client: VKClient, group_id: int, message: str, attachments: Lis
     }
     if attachments:
         params["attachments"] = ",".join(attachments)
-    return client.api("wall.post", params)
+    return params
+
+
+def post_to_wall(client: VKClient, group_id: int, message: str, attachments: List[str]) -> dict:
+    return client.api("wall.post", wall_post_params(group_id, message, attachments))
+
+
+def post_many_to_wall(
+    client: VKClient, group_id: int, posts: List[Tuple[str, List[str]]]
+) -> List[dict]:
+    calls = [
+        BatchCall("wall.post", wall_post_params(group_id, message, attachments))
+        for message, attachments in posts
+    ]
+    return raise_first_error(execute_calls(client, calls))
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List
+from urllib.parse import parse_qs
+
+import httpx
+
+from app.utils.http import TELEGRAM, VK_API, VK_UPLOAD, set_http_client
+
+
+_CHUNK = 64 * 1024
+
+
+@dataclass
+class FakeNetwork:
+    latency_ms: float = 0.0
+    bandwidth_mbps: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+    _random: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self._random = random.Random(self.seed)
+
+    def round_trip(self, request: httpx.Request) -> None:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            failed = self.error_rate and self._random.random() < self.error_rate
+        if failed:
+            raise httpx.ConnectError("injected fake network error", request=request)
+
+    def transfer(self, size: int) -> None:
+        if self.bandwidth_mbps:
+            time.sleep(size / (self.bandwidth_mbps * 125_000))
+
+
+class FakeTransport(httpx.BaseTransport):
+    # httpx.MockTransport reads the whole request body first, which would distort peak RSS
+    # for large uploads; this hands the unread stream to the handler instead.
+    def __init__(self, handler: Callable[[httpx.Request], httpx.Response]) -> None:
+        self.handler = handler
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.handler(request)
+
+
+def _ok(result: Any) -> httpx.Response:
+    return httpx.Response(200, json={"ok": True, "result": result})
+
+
+class FakeTelegram:
+    def __init__(self, network: FakeNetwork, token: str) -> None:
+        self.network = network
+        self.token = token
+        self.files: Dict[str, int] = {}
+        self.sent_messages: List[Dict[str, Any]] = []
+        self._updates: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self.bytes_served = 0
+
+    def add_file(self, file_id: str, size: int) -> None:
+        self.files[file_id] = size
+
+    def push_updates(self, updates: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._updates.extend(updates)
+
+    def pending_updates(self) -> int:
+        with self._lock:
+            return len(self._updates)
+
+    def _stream_file(self, size: int) -> Iterator[bytes]:
+        remaining = size
+        while remaining > 0:
+            chunk = min(_CHUNK, remaining)
+            self.network.transfer(chunk)
+            remaining -= chunk
+            with self._lock:
+                self.bytes_served += chunk
+            yield b"\0" * chunk
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.network.round_trip(request)
+        path = request.url.path
+        if path.startswith(f"/file/bot{self.token}/"):
+            file_id = path.rsplit("/", 1)[-1].removesuffix(".bin")
+            size = self.files.get(file_id)
+            if size is None:
+                return httpx.Response(404)
+            return httpx.Response(200, content=self._stream_file(size))
+
+        method = path.rsplit("/", 1)[-1]
+        params = {key: values[-1] for key, values in parse_qs(request.read().decode()).items()}
+        if method == "getUpdates":
+            offset = int(params.get("offset", 0))
+            with self._lock:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+                batch = self._updates[:100]
+            return _ok(batch)
+        if method == "getFile":
+            file_id = params["file_id"]
+            if file_id not in self.files:
+                return httpx.Response(200, json={"ok": False, "description": "file not found"})
+            return _ok(
+                {"file_id": file_id, "file_size": self.files[file_id], "file_path": f"files/{file_id}.bin"}
+            )
+        if method == "sendMessage":
+            self.sent_messages.append(params)
+            return _ok({"message_id": len(self.sent_messages)})
+        if method == "getChat":
+            return _ok({"id": params.get("chat_id"), "type": "channel"})
+        return httpx.Response(200, json={"ok": False, "description": f"unknown method {method}"})
+
+
+class FakeVK:
+    def __init__(self, network: FakeNetwork, group_id: int) -> None:
+        self.network = network
+        self.owner_id = -abs(group_id)
+        self.wall_posts: List[Dict[str, Any]] = []
+        self.calls: Dict[str, int] = {}
+        self.bytes_received = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _count(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def _method(self, method: str, params: Dict[str, Any]) -> Any:
+        self._count(method)
+        item_id = next(self._ids)
+        if method == "photos.getWallUploadServer":
+            return {"upload_url": "https://upload.fake.vk/photo"}
+        if method == "docs.getWallUploadServer":
+            return {"upload_url": "https://upload.fake.vk/doc"}
+        if method == "photos.saveWallPhoto":
+            return [{"owner_id": self.owner_id, "id": item_id}]
+        if method == "docs.save":
+            return {"type": "doc", "doc": {"owner_id": self.owner_id, "id": item_id}}
+        if method == "video.save":
+            return {
+                "upload_url": "https://upload.fake.vk/video",
+                "owner_id": self.owner_id,
+                "video_id": item_id,
+            }
+        if method == "wall.post":
+            attachments = str(params.get("attachments") or "")
+            with self._lock:
+                self.wall_posts.append(
+                    {
+                        "post_id": item_id,
+                        "message": params.get("message") or "",
+                        "attachments": [a for a in attachments.split(",") if a],
+                        "at": time.time(),
+                    }
+                )
+            return {"post_id": item_id}
+        raise ValueError(f"unsupported method {method}")
+
+    def _execute(self, code: str) -> List[Any]:
+        # Parses the `return [API.method({...}),...];` code built by app.vk.execute.
+        decoder = json.JSONDecoder()
+        results = []
+        pos = code.find("API.")
+        while pos != -1:
+            paren = code.index("(", pos)
+            method = code[pos + 4 : paren]
+            params, end = decoder.raw_decode(code, paren + 1)
+            results.append(self._method(method, params))
+            pos = code.find("API.", end)
+        return results
+
+    def _upload(self, request: httpx.Request) -> httpx.Response:
+        size = 0
+        for chunk in request.stream:
+            size += len(chunk)
+            self.network.transfer(len(chunk))
+        with self._lock:
+            self.bytes_received += size
+        kind = request.url.path.strip("/")
+        self._count(f"upload.{kind}")
+        if kind == "photo":
+            return httpx.Response(200, json={"server": 1, "photo": "[{}]", "hash": "fake"})
+        if kind == "doc":
+            return httpx.Response(200, json={"file": "fake"})
+        return httpx.Response(200, json={"size": size})
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.network.round_trip(request)
+        if request.url.host == "upload.fake.vk":
+            return self._upload(request)
+        method = request.url.path.rsplit("/", 1)[-1]
+        params = {key: values[-1] for key, values in parse_qs(request.read().decode()).items()}
+        if method == "execute":
+            self._count(method)
+            return httpx.Response(200, json={"response": self._execute(params["code"])})
+        return httpx.Response(200, json={"response": self._method(method, params)})
+
+
+def install_fakes(telegram: FakeTelegram, vk: FakeVK) -> None:
+    set_http_client(TELEGRAM, httpx.Client(transport=FakeTransport(telegram.handle)))
+    set_http_client(VK_API, httpx.Client(transport=FakeTransport(vk.handle)))
+    set_http_client(VK_UPLOAD, httpx.Client(transport=FakeTransport(vk.handle)))
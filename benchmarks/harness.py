@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import resource
+import subprocess
+from typing import Any, Dict, List
+
+BENCH_GROUP_ID = 1000
+BENCH_CHANNEL_ID = -1001000000001
+BENCH_TOKEN = "bench-token"
+
+_RESET_TABLES = (
+    "staged_media",
+    "vk_posts",
+    "tg_media_items",
+    "tg_posts",
+    "album_state",
+    "jobs",
+    "jobs_archive",
+    "job_status_counters",
+    "vk_media_cache",
+    "settings",
+    "tg_state",
+)
+
+
+def configure_env(overrides: Dict[str, str] | None = None) -> None:
+    # Must run before anything under app/ is imported: settings are read once per process.
+    database_url = os.getenv("BENCH_DATABASE_URL")
+    redis_url = os.getenv("BENCH_REDIS_URL")
+    if not database_url or not redis_url:
+        raise SystemExit(
+            "Set BENCH_DATABASE_URL and BENCH_REDIS_URL to a disposable database and Redis db; "
+            "the benchmark truncates them."
+        )
+    os.environ.update(
+        {
+            "DATABASE_URL": database_url,
+            "REDIS_URL": redis_url,
+            "TG_BOT_TOKEN": BENCH_TOKEN,
+            "VK_ACCESS_TOKEN": BENCH_TOKEN,
+            "VK_GROUP_ID": str(BENCH_GROUP_ID),
+            "VK_USER_ACCESS_TOKEN": "",
+            "ADMIN_IDS": "",
+            "SOURCE_CHANNEL_IDS": str(BENCH_CHANNEL_ID),
+            "MODE": "auto",
+            "POLLER_METRICS_PORT": "0",
+            "WORKER_METRICS_PORT": "0",
+        }
+    )
+    os.environ.setdefault("VK_RATE_LIMIT_PER_SEC", "100000")
+    os.environ.setdefault("VK_USER_RATE_LIMIT_PER_SEC", "100000")
+    os.environ.setdefault("ALBUM_FINALIZE_DELAY_SEC", "1")
+    os.environ.setdefault("TEMP_DIR", "/tmp/tg_vk_bot_bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.update(overrides or {})
+
+
+def reset_state() -> None:
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import text
+
+    from app.config import get_settings
+    from app.crud import ensure_defaults
+    from app.db import session_scope
+    from app.tasks.celery_app import celery_app
+    from app.utils.redis_client import get_redis
+
+    command.upgrade(Config("alembic.ini"), "head")
+    with session_scope() as session:
+        session.execute(text(f"TRUNCATE {', '.join(_RESET_TABLES)} RESTART IDENTITY CASCADE"))
+        ensure_defaults(session)
+    get_redis(get_settings().REDIS_URL).flushdb()
+
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = False
+
+
+def set_autopost(enabled: bool) -> None:
+    from app.config import get_settings
+    from app.crud import set_setting
+    from app.db import session_scope
+    from app.runtime_settings import publish_settings_changed
+
+    with session_scope() as session:
+        set_setting(session, "autoposting_enabled", "true" if enabled else "false")
+    publish_settings_changed(get_settings())
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values: List[float]) -> Dict[str, float | None]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 4)}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def channel_update(
+    update_id: int,
+    message_id: int,
+    date: int,
+    text: str | None = None,
+    photo: Dict[str, Any] | None = None,
+    video: Dict[str, Any] | None = None,
+    media_group_id: str | None = None,
+) -> Dict[str, Any]:
+    message: Dict[str, Any] = {
+        "message_id": message_id,
+        "date": date,
+        "chat": {"id": BENCH_CHANNEL_ID, "type": "channel", "username": "bench_channel"},
+    }
+    if text:
+        message["caption" if photo or video else "text"] = text
+    if photo:
+        message["photo"] = [photo]
+    if video:
+        message["video"] = video
+    if media_group_id:
+        message["media_group_id"] = media_group_id
+    return {"update_id": update_id, "channel_post": message}
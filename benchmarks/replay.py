@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+import json
+import time
+from typing import Any, Dict, Iterator, List
+
+from benchmarks.harness import configure_env, git_revision, peak_rss_mb, reset_state, set_autopost
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def export(args: argparse.Namespace) -> None:
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(args.database_url, future=True)
+    exported = skipped = 0
+    with engine.connect() as conn, open(args.output, "w", encoding="utf-8") as f:
+        rows = conn.execution_options(stream_results=True).execute(
+            text(
+                "SELECT payload_json, created_at FROM tg_posts "
+                "WHERE created_at >= :since AND created_at < :until ORDER BY created_at, id"
+            ),
+            {"since": _parse_time(args.since), "until": _parse_time(args.until)},
+        )
+        for payload, created_at in rows:
+            # Payloads slimmed by retention no longer carry the post body.
+            if "date" not in (payload.get("channel_post") or {}):
+                skipped += 1
+                continue
+            f.write(json.dumps({"ingested_at": created_at.timestamp(), "update": payload}) + "\n")
+            exported += 1
+    print(json.dumps({"exported": exported, "skipped_slimmed": skipped, "output": args.output}))
+
+
+def _load(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _media(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items = []
+    if message.get("photo"):
+        items.append(max(message["photo"], key=lambda p: p.get("file_size") or 0))
+    for key in ("video", "document"):
+        if message.get(key):
+            items.append(message[key])
+    return items
+
+
+def _register_files(telegram, records: List[Dict[str, Any]], default_size: int) -> None:
+    for record in records:
+        for item in _media(record["update"]["channel_post"]):
+            telegram.add_file(item["file_id"], int(item.get("file_size") or default_size))
+
+
+def _wait_until(due: float, scheduler) -> None:
+    while True:
+        scheduler.run_once()
+        remaining = due - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, scheduler.tick_seconds))
+
+
+def _album_report(session) -> Dict[str, int]:
+    from sqlalchemy import func, select
+
+    from app.models import TgPost, VkPost
+
+    rows = session.execute(
+        select(TgPost.media_group_id, func.count(func.distinct(VkPost.vk_post_id)))
+        .outerjoin(VkPost, VkPost.tg_post_id == TgPost.id)
+        .where(TgPost.media_group_id.is_not(None))
+        .group_by(TgPost.media_group_id)
+    ).all()
+    counts = [count for _, count in rows]
+    return {
+        "albums": len(counts),
+        "albums_posted_once": sum(1 for count in counts if count == 1),
+        "albums_not_posted": sum(1 for count in counts if count == 0),
+        "albums_posted_more_than_once": sum(1 for count in counts if count > 1),
+    }
+
+
+def play(args: argparse.Namespace) -> None:
+    records = list(_load(args.input))
+    if not records:
+        raise SystemExit("Nothing to replay")
+    channel_ids = sorted({int(r["update"]["channel_post"]["chat"]["id"]) for r in records})
+    configure_env({"SOURCE_CHANNEL_IDS": ",".join(str(cid) for cid in channel_ids)})
+    reset_state()
+
+    from sqlalchemy import func, select
+
+    from app.config import get_settings
+    from app.db import session_scope
+    from app.models import VkPost
+    from app.runtime_settings import get_runtime
+    from app.tasks.album_schedule import ALBUM_DEADLINES_KEY
+    from app.tg.album_aggregator import AlbumFinalizeScheduler
+    from app.tg.polling import handle_channel_post
+    from app.utils.redis_client import get_redis
+    from benchmarks.run import _install
+
+    settings = get_settings()
+    telegram, vk = _install(args)
+    _register_files(telegram, records, args.default_file_kb * 1024)
+    set_autopost(True)
+    # Driven from this thread so an album popped by the scheduler is fully posted before we report.
+    scheduler = AlbumFinalizeScheduler(settings.ALBUM_SCHEDULER_TICK_SEC)
+
+    speed = None if args.speed == "max" else float(args.speed.rstrip("x"))
+    first = records[0]["ingested_at"]
+    max_lag = 0.0
+    started = time.monotonic()
+    for update_id, record in enumerate(records, start=1):
+        if speed:
+            due = started + (record["ingested_at"] - first) / speed
+            _wait_until(due, scheduler)
+            max_lag = max(max_lag, time.monotonic() - due)
+        update = dict(record["update"], update_id=update_id)
+        handle_channel_post(update, settings, get_runtime(settings))
+        scheduler.run_once()
+    played = time.monotonic() - started
+
+    redis_client = get_redis(settings.REDIS_URL)
+    deadline = time.monotonic() + args.timeout
+    while redis_client.zcard(ALBUM_DEADLINES_KEY) and time.monotonic() < deadline:
+        _wait_until(time.monotonic() + settings.ALBUM_SCHEDULER_TICK_SEC, scheduler)
+    elapsed = time.monotonic() - started
+
+    with session_scope() as session:
+        albums = _album_report(session)
+        recorded = session.execute(select(func.count(func.distinct(VkPost.vk_post_id)))).scalar_one()
+
+    report = {
+        "revision": git_revision(),
+        "input": args.input,
+        "speed": args.speed,
+        "updates": len(records),
+        "source_span_sec": round(records[-1]["ingested_at"] - first, 3),
+        "playback_sec": round(played, 3),
+        "total_sec": round(elapsed, 3),
+        "updates_per_sec": round(len(records) / played, 2) if played else None,
+        "max_playback_lag_sec": round(max_lag, 3),
+        "vk_wall_posts": len(vk.wall_posts),
+        "vk_posts_recorded": recorded,
+        "posts_per_sec": round(len(vk.wall_posts) / elapsed, 2),
+        "album_coalescing_ok": albums["albums_posted_once"] == albums["albums"]
+        and len(vk.wall_posts) == recorded,
+        **albums,
+        "vk_calls": vk.calls,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export stored updates and replay them against fake VK")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="dump tg_posts.payload_json for a time window to JSONL")
+    export_parser.add_argument("--database-url", required=True, help="source database (read only)")
+    export_parser.add_argument("--since", required=True, help="ISO timestamp, UTC if no offset")
+    export_parser.add_argument("--until", required=True, help="ISO timestamp, UTC if no offset")
+    export_parser.add_argument("--output", required=True)
+    export_parser.set_defaults(func=export)
+
+    play_parser = sub.add_parser("play", help="replay a JSONL export through handle_channel_post")
+    play_parser.add_argument("--input", required=True)
+    play_parser.add_argument("--speed", default="1x", help="1x, 10x, ... or max")
+    play_parser.add_argument("--default-file-kb", type=int, default=300, help="size for files without file_size")
+    play_parser.add_argument("--latency-ms", type=float, default=20.0)
+    play_parser.add_argument("--bandwidth-mbps", type=float, default=0.0)
+    play_parser.add_argument("--error-rate", type=float, default=0.0)
+    play_parser.add_argument("--seed", type=int, default=0)
+    play_parser.add_argument("--timeout", type=float, default=300.0)
+    play_parser.add_argument("--output")
+    play_parser.set_defaults(func=play)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.harness import (
+    BENCH_TOKEN,
+    channel_update,
+    configure_env,
+    git_revision,
+    peak_rss_mb,
+    percentiles,
+    reset_state,
+    set_autopost,
+)
+
+SCENARIOS = ("ingest", "single", "album", "video")
+
+
+def _install(args: argparse.Namespace):
+    from benchmarks.fakes import FakeNetwork, FakeTelegram, FakeVK, install_fakes
+    from benchmarks.harness import BENCH_GROUP_ID
+
+    network = FakeNetwork(
+        latency_ms=args.latency_ms,
+        bandwidth_mbps=args.bandwidth_mbps,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    telegram = FakeTelegram(network, BENCH_TOKEN)
+    vk = FakeVK(network, BENCH_GROUP_ID)
+    install_fakes(telegram, vk)
+    return telegram, vk
+
+
+def drain_updates(telegram) -> int:
+    from app.config import get_settings
+    from app.runtime_settings import get_runtime
+    from app.tg.client import TelegramClient
+    from app.tg.polling import process_updates
+
+    settings = get_settings()
+    client = TelegramClient(settings.TG_BOT_TOKEN)
+    offset = 1
+    processed = 0
+    while True:
+        updates = client.get_updates(offset=offset, timeout=0)
+        if not updates:
+            return processed
+        process_updates(updates, settings, get_runtime(settings), client)
+        offset = max(int(update["update_id"]) for update in updates) + 1
+        processed += len(updates)
+
+
+def _photo(telegram, file_id: str, size: int) -> Dict[str, Any]:
+    telegram.add_file(file_id, size)
+    return {"file_id": file_id, "file_unique_id": f"u-{file_id}", "file_size": size, "width": 1280, "height": 960}
+
+
+def scenario_ingest(args: argparse.Namespace) -> Dict[str, Any]:
+    telegram, _ = _install(args)
+    set_autopost(False)
+    now = int(time.time())
+    telegram.push_updates(
+        [channel_update(i, i, now, text=f"post {i}") for i in range(1, args.count + 1)]
+    )
+    started = time.perf_counter()
+    processed = drain_updates(telegram)
+    elapsed = time.perf_counter() - started
+    return {"updates": processed, "seconds": round(elapsed, 3), "updates_per_sec": round(processed / elapsed, 2)}
+
+
+def scenario_single(args: argparse.Namespace) -> Dict[str, Any]:
+    telegram, vk = _install(args)
+    set_autopost(True)
+    now = int(time.time())
+    size = args.photo_kb * 1024
+    telegram.push_updates(
+        [
+            channel_update(i, i, now, text=f"post {i}", photo=_photo(telegram, f"p{i}", size))
+            for i in range(1, args.count + 1)
+        ]
+    )
+    started = time.perf_counter()
+    drain_updates(telegram)
+    elapsed = time.perf_counter() - started
+    posts = len(vk.wall_posts)
+    return {
+        "posts": posts,
+        "failed": args.count - posts,
+        "seconds": round(elapsed, 3),
+        "posts_per_sec": round(posts / elapsed, 2),
+        "vk_calls": vk.calls,
+    }
+
+
+def scenario_album(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.config import get_settings
+    from app.tg.album_aggregator import AlbumFinalizeScheduler
+
+    telegram, vk = _install(args)
+    set_autopost(True)
+    now = int(time.time())
+    size = args.photo_kb * 1024
+    updates: List[Dict[str, Any]] = []
+    update_id = 0
+    for album in range(1, args.count + 1):
+        for index in range(args.album_size):
+            update_id += 1
+            updates.append(
+                channel_update(
+                    update_id,
+                    update_id,
+                    now,
+                    text=f"album {album}" if index == 0 else None,
+                    photo=_photo(telegram, f"a{album}-{index}", size),
+                    media_group_id=f"bench-{album}",
+                )
+            )
+    telegram.push_updates(updates)
+
+    started = time.perf_counter()
+    drain_updates(telegram)
+    ingested_at = time.time()
+    scheduler = AlbumFinalizeScheduler(get_settings().ALBUM_SCHEDULER_TICK_SEC)
+    deadline = time.time() + args.timeout
+    while len(vk.wall_posts) < args.count and time.time() < deadline:
+        if not scheduler.run_once():
+            time.sleep(get_settings().ALBUM_SCHEDULER_TICK_SEC)
+    elapsed = time.perf_counter() - started
+
+    posts_by_album: Dict[str, int] = {}
+    for post in vk.wall_posts:
+        posts_by_album[post["message"]] = posts_by_album.get(post["message"], 0) + 1
+    return {
+        "albums": args.count,
+        "album_size": args.album_size,
+        "posts": len(vk.wall_posts),
+        "duplicate_posts": sum(count - 1 for count in posts_by_album.values() if count > 1),
+        "seconds": round(elapsed, 3),
+        "posts_per_sec": round(len(vk.wall_posts) / elapsed, 2),
+        "finalize_delay_sec": get_settings().ALBUM_FINALIZE_DELAY_SEC,
+        "finalize_latency_sec": percentiles([post["at"] - ingested_at for post in vk.wall_posts]),
+        "vk_calls": vk.calls,
+    }
+
+
+def scenario_video(args: argparse.Namespace) -> Dict[str, Any]:
+    telegram, vk = _install(args)
+    set_autopost(True)
+    size = args.video_mb * 1024 * 1024
+    telegram.add_file("v1", size)
+    video = {"file_id": "v1", "file_unique_id": "u-v1", "file_size": size, "file_name": "bench.mp4"}
+    telegram.push_updates([channel_update(1, 1, int(time.time()), text="video", video=video)])
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    drain_updates(telegram)
+    elapsed = time.perf_counter() - started
+    return {
+        "video_mb": args.video_mb,
+        "posts": len(vk.wall_posts),
+        "seconds": round(elapsed, 3),
+        "mb_per_sec": round(args.video_mb / elapsed, 2),
+        "bytes_uploaded": vk.bytes_received,
+        "peak_rss_mb_before": round(rss_before, 1),
+    }
+
+
+_RUNNERS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+    "ingest": scenario_ingest,
+    "single": scenario_single,
+    "album": scenario_album,
+    "video": scenario_video,
+}
+
+
+def run_scenario(args: argparse.Namespace) -> Dict[str, Any]:
+    overrides = {}
+    if args.scenario == "video":
+        overrides["MAX_FILE_SIZE_MB"] = str(args.video_mb + 1)
+    configure_env(overrides)
+    reset_state()
+
+    from app.config import get_settings
+
+    settings = get_settings()
+    result = _RUNNERS[args.scenario](args)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    result["settings"] = {
+        "MEDIA_RELAY_MODE": settings.MEDIA_RELAY_MODE,
+        "UPLOAD_CONCURRENCY": settings.UPLOAD_CONCURRENCY,
+    }
+    return result
+
+
+def _child_args(args: argparse.Namespace, scenario: str) -> List[str]:
+    argv = [sys.executable, "-m", "benchmarks.run", "--scenario", scenario]
+    for name in ("count", "album_size", "photo_kb", "video_mb", "latency_ms", "bandwidth_mbps", "error_rate", "seed", "timeout"):
+        argv.extend([f"--{name.replace('_', '-')}", str(getattr(args, name))])
+    return argv
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline throughput benchmarks against fake Telegram/VK")
+    parser.add_argument("--scenario", choices=SCENARIOS, help="run one scenario in this process")
+    parser.add_argument("--count", type=int, default=100, help="posts, updates or albums per scenario")
+    parser.add_argument("--album-size", type=int, default=10)
+    parser.add_argument("--photo-kb", type=int, default=300)
+    parser.add_argument("--video-mb", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="0 means unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args)))
+        return
+
+    # Each scenario gets its own process so peak RSS is not inherited from the previous one.
+    results: Dict[str, Any] = {}
+    for scenario in SCENARIOS:
+        proc = subprocess.run(_child_args(args, scenario), capture_output=True, text=True)
+        if proc.returncode != 0:
+            results[scenario] = {"error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+            continue
+        results[scenario] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": int(time.time()),
+        "network": {
+            "latency_ms": args.latency_ms,
+            "bandwidth_mbps": args.bandwidth_mbps,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
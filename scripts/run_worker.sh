@@ -1,4 +1,18 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
-celery -A app.tasks.celery_app worker -l INFO
+# Per-process metric files from a previous run must not be merged into the new one.
+if [ -n "${PROMETHEUS_MULTIPROC_DIR:-}" ]; then
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+  mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+args=(-A app.tasks.celery_app worker -l INFO -n "${WORKER_NAME:-worker}@%h")
+# Without WORKER_QUEUES a single worker consumes both the light and the heavy queue.
+args+=(-Q "${WORKER_QUEUES:-tg_vk_bot,tg_vk_bot_heavy}")
+if [ -n "${WORKER_CONCURRENCY:-}" ]; then
+  args+=(-c "$WORKER_CONCURRENCY")
+fi
+args+=(--prefetch-multiplier "${WORKER_PREFETCH_MULTIPLIER:-1}")
+
+exec celery "${args[@]}"
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from unittest import mock
+
+from app.tg import async_polling
+
+
+def test_offset_waits_for_admin_commands_of_earlier_batches() -> None:
+    events = []
+    admin_started = threading.Event()
+    release_admin = threading.Event()
+
+    def persist(updates, settings, runtime, commit):
+        events.append(("persist", updates[0]["update_id"], commit))
+
+    def handle(update, settings, tg_client):
+        admin_started.set()
+        release_admin.wait(5)
+        events.append(("admin", update["update_id"]))
+
+    async def scenario() -> None:
+        batches: asyncio.Queue = asyncio.Queue()
+        await batches.put([{"update_id": 1, "message": {"text": "/status"}}])
+        await batches.put([{"update_id": 2, "channel_post": {"message_id": 1}}])
+        settings = mock.Mock(POLLER_ADMIN_CONCURRENCY=2)
+        progress = async_polling._Progress(0)
+        loop_task = asyncio.create_task(
+            async_polling._process_loop(batches, settings, mock.Mock(), progress)
+        )
+        await batches.join()
+        await asyncio.to_thread(admin_started.wait, 5)
+        assert not any(event[0] == "offset" for event in events)
+        release_admin.set()
+        for _ in range(100):
+            if ("offset", 2) in events:
+                break
+            await asyncio.sleep(0.01)
+        loop_task.cancel()
+        assert progress.done == 2
+
+    with mock.patch.object(async_polling, "persist_updates", persist), mock.patch.object(
+        async_polling, "handle_other_update", handle
+    ), mock.patch.object(
+        async_polling, "commit_offset", lambda offset: events.append(("offset", offset))
+    ), mock.patch.object(async_polling, "get_runtime", lambda settings: {}):
+        asyncio.run(scenario())
+
+    assert events == [
+        ("persist", 1, False),
+        ("persist", 2, False),
+        ("admin", 1),
+        ("offset", 1),
+        ("offset", 2),
+    ]
+
+
+def test_fetch_never_confirms_unfinished_batches() -> None:
+    offsets = []
+
+    async def scenario() -> None:
+        progress = async_polling._Progress(0)
+        batches: asyncio.Queue = asyncio.Queue()
+        responses = [
+            [{"update_id": 1}],
+            # Batch 1 is still queued, so Telegram returns it again along with the new update.
+            [{"update_id": 1}, {"update_id": 2}],
+            [{"update_id": 1}, {"update_id": 2}],
+            [{"update_id": 2}],
+        ]
+
+        async def get_updates(offset, timeout):
+            offsets.append(offset)
+            if not responses:
+                await asyncio.sleep(3600)
+            return responses.pop(0)
+
+        client = mock.Mock(get_updates=get_updates)
+        fetch = asyncio.create_task(async_polling._fetch_loop(client, batches, progress))
+        assert await asyncio.wait_for(batches.get(), 1) == [{"update_id": 1}]
+        assert await asyncio.wait_for(batches.get(), 1) == [{"update_id": 2}]
+        for _ in range(100):
+            if len(offsets) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        # Only duplicates came back, so the loop waits for progress instead of spinning.
+        assert offsets == [1, 1, 1]
+        progress.mark_done(1)
+        for _ in range(100):
+            if len(offsets) == 4:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        assert offsets == [1, 1, 1, 2]
+        progress.mark_done(2)
+        for _ in range(100):
+            if len(offsets) == 5:
+                break
+            await asyncio.sleep(0.01)
+        fetch.cancel()
+        assert batches.empty()
+
+    asyncio.run(scenario())
+    assert offsets == [1, 1, 1, 2, 3]
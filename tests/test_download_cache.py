@@ -0,0 +1,68 @@
+import os
+
+from app.utils.download_cache import DownloadCache
+
+
+def _writer(size: int, calls: list):
+    def download(dest_path: str) -> int:
+        calls.append(dest_path)
+        with open(dest_path, "wb") as f:
+            f.write(b"x" * size)
+        return size
+
+    return download
+
+
+def _age(path: str, seconds: int) -> None:
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def test_miss_then_hit(tmp_path) -> None:
+    cache = DownloadCache(str(tmp_path), 1000)
+    calls: list = []
+
+    first = cache.acquire("uniq-1", _writer(100, calls))
+    first.release()
+    second = cache.acquire("uniq-1", _writer(100, calls))
+
+    assert (first.hit, second.hit) == (False, True)
+    assert second.path == first.path and second.size == 100
+    assert len(calls) == 1
+    second.release()
+    assert os.path.exists(second.path)
+    assert cache.usage() == (100, 1)
+
+
+def test_eviction_skips_entries_in_use(tmp_path) -> None:
+    cache = DownloadCache(str(tmp_path), 250)
+    calls: list = []
+    held = cache.acquire("oldest", _writer(100, calls))
+    _age(held.path, 300)
+    idle = cache.acquire("older", _writer(100, calls))
+    idle.release()
+    _age(idle.path, 200)
+
+    newest = cache.acquire("newest", _writer(100, calls))
+
+    # "oldest" is the LRU entry but still held, so the idle one is evicted instead.
+    assert os.path.exists(held.path)
+    assert not os.path.exists(idle.path)
+    assert cache.usage() == (200, 2)
+    held.release()
+    newest.release()
+
+
+def test_over_budget_and_unkeyed_files_bypass_the_cache(tmp_path) -> None:
+    cache = DownloadCache(str(tmp_path), 50)
+    calls: list = []
+
+    big = cache.acquire("big", _writer(100, calls))
+    unkeyed = DownloadCache(str(tmp_path), 1000).acquire(None, _writer(10, calls))
+
+    assert big.owned and unkeyed.owned
+    assert not big.hit and not unkeyed.hit
+    big.release()
+    unkeyed.release()
+    assert not os.path.exists(big.path) and not os.path.exists(unkeyed.path)
+    assert cache.usage() == (0, 0)
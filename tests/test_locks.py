@@ -0,0 +1,56 @@
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+import pytest
+
+from app.tasks import repost
+from app.utils import locks
+
+
+@pytest.fixture
+def redis_client():
+    client = fakeredis.FakeRedis()
+    with mock.patch.object(locks, "get_redis", lambda url: client):
+        yield client
+
+
+def test_watchdog_keeps_lock_past_ttl_and_release_wakes_waiter(redis_client) -> None:
+    holder = locks.RedisLock("redis://", "album:1", ttl=1)
+    waiter = locks.RedisLock("redis://", "album:1", ttl=1)
+    assert holder.acquire()
+    assert not waiter.acquire()
+    time.sleep(1.5)
+    assert redis_client.get("lock:album:1") == holder.token.encode()
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(ok=waiter.acquire(timeout=5)))
+    thread.start()
+    time.sleep(0.2)
+    holder.release()
+    thread.join()
+
+    assert result == {"ok": True}
+    assert redis_client.get("lock:album:1") == waiter.token.encode()
+    holder.release()
+    assert redis_client.get("lock:album:1") == waiter.token.encode()
+    waiter.release()
+    assert redis_client.get("lock:album:1") is None
+
+
+def test_watchdog_stops_at_max_hold(redis_client) -> None:
+    lock = locks.RedisLock("redis://", "album:2", ttl=1, max_hold=2)
+    assert lock.acquire()
+    time.sleep(2.5)
+    assert redis_client.get("lock:album:2") is None
+    lock.release()
+
+
+def test_finalize_album_releases_lock_when_setup_fails(redis_client) -> None:
+    with mock.patch.object(
+        repost, "_load_runtime", side_effect=RuntimeError("db down")
+    ), mock.patch.object(repost, "notify_admins"):
+        with pytest.raises(RuntimeError):
+            repost.finalize_album.run("mg-1")
+    assert redis_client.get("lock:album:mg-1") is None
@@ -0,0 +1,20 @@
+import contextlib
+from unittest import mock
+
+from app.tasks import maintenance
+
+
+def test_gc_keeps_attachments_that_are_cached_or_on_the_wall() -> None:
+    rows = [(42, "photo-42_1"), (42, "photo-42_2"), (42, "doc-42_3"), (42, None)]
+    with mock.patch.object(
+        maintenance, "session_scope", lambda: contextlib.nullcontext(mock.Mock())
+    ), mock.patch.object(maintenance, "pop_expired_staged_media", return_value=rows), mock.patch.object(
+        maintenance, "get_cached_attachment_set", return_value={"photo-42_1"}
+    ), mock.patch.object(
+        maintenance, "get_posted_attachment_set", return_value={"photo-42_2"}
+    ), mock.patch.object(maintenance, "VKClient"), mock.patch.object(
+        maintenance, "get_user_access_token", return_value=None
+    ), mock.patch.object(maintenance, "delete_uploaded_attachments", return_value=1) as delete:
+        maintenance.gc_staged_media.run(batch_size=10)
+
+    assert delete.call_args.args[1] == ["doc-42_3"]
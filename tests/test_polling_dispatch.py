@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+from app.tg import polling
+from app.tg.updates import ParsedTGPost
+
+RUNTIME = {"mode": "auto", "source_channel_ids": [], "autoposting_enabled": True}
+
+
+def _parsed(message_id: int, media_group_id: str | None) -> ParsedTGPost:
+    return ParsedTGPost(
+        channel_id=-100,
+        message_id=message_id,
+        date=datetime.now(tz=timezone.utc),
+        text=None,
+        media_group_id=media_group_id,
+        payload_json={},
+        media_items=[{"type": "photo", "size": 1000}],
+    )
+
+
+def test_album_items_are_prefetched_once_per_media_group() -> None:
+    created = [(1, _parsed(1, "g")), (2, _parsed(2, "g")), (3, _parsed(3, None))]
+    settings = mock.Mock(MEDIA_PREFETCH_ENABLED=True, ALBUM_FINALIZE_DELAY_SEC=3)
+    with mock.patch.object(polling, "enqueue_album_prefetch") as album_prefetch, mock.patch.object(
+        polling, "enqueue_prefetch"
+    ) as prefetch, mock.patch.object(polling, "enqueue_repost") as repost, mock.patch.object(
+        polling, "schedule_album_finalizes"
+    ) as schedule:
+        polling.dispatch_ingested(created, settings, RUNTIME)
+
+    album_prefetch.assert_called_once_with("g", [("photo", 1000), ("photo", 1000)], ttl_sec=None)
+    prefetch.assert_not_called()
+    repost.assert_called_once()
+    schedule.assert_called_once_with(["g", "g"], 3)
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from app.tg import polling
+
+RUNTIME = {"mode": "auto", "source_channel_ids": [], "autoposting_enabled": True}
+
+
+def _updates():
+    return [
+        {"update_id": 10, "channel_post": {"message_id": 1}},
+        {"update_id": 11, "message": {"text": "/status"}},
+    ]
+
+
+def test_offset_is_committed_after_admin_updates() -> None:
+    calls = []
+    with mock.patch.object(
+        polling, "ingest_channel_posts", side_effect=lambda *a, **k: calls.append(("ingest", k)) or []
+    ), mock.patch.object(
+        polling, "handle_other_update", side_effect=lambda *a: calls.append(("admin", a[0]["update_id"]))
+    ), mock.patch.object(
+        polling, "commit_offset", side_effect=lambda offset: calls.append(("offset", offset))
+    ), mock.patch.object(polling, "dispatch_ingested"):
+        polling.process_updates(_updates(), mock.Mock(), RUNTIME, mock.Mock())
+
+    assert calls == [("ingest", {"last_update_id": None}), ("admin", 11), ("offset", 11)]
+
+
+def test_channel_only_batch_commits_offset_with_ingest() -> None:
+    ingest = mock.Mock(return_value=[])
+    with mock.patch.object(polling, "ingest_channel_posts", ingest), mock.patch.object(
+        polling, "commit_offset"
+    ) as commit, mock.patch.object(polling, "dispatch_ingested"):
+        polling.process_updates(_updates()[:1], mock.Mock(), RUNTIME, mock.Mock())
+
+    assert ingest.call_args.kwargs == {"last_update_id": 10}
+    commit.assert_not_called()
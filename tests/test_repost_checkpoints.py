@@ -0,0 +1,263 @@
+import contextlib
+import dataclasses
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from app.tasks import repost
+from app.vk.types import VKAPIError
+from app.vk.uploads import PendingPhoto
+
+GROUP_ID = 42
+
+
+class StagedStore:
+    def __init__(self) -> None:
+        self.rows = {}
+        self.recorded = []
+        self.post = None
+        self.posted = 0
+        self.post_error = None
+
+    def checkpoint(self, session, item_id, vk_group_id, attachment, note, expires_at) -> None:
+        self.rows[(item_id, vk_group_id)] = (attachment, note)
+
+    def get_ready(self, session, item_ids, vk_group_id):
+        return {
+            item_id: self.rows[(item_id, vk_group_id)]
+            for item_id in item_ids
+            if (item_id, vk_group_id) in self.rows
+        }
+
+    def wall_post(self, *args) -> list:
+        if self.post_error:
+            raise self.post_error
+        self.posted += 1
+        return [{"post_id": 9}]
+
+    def delete(self, session, item_ids, vk_group_id) -> None:
+        assert self.posted or self.post_error, "checkpoints must outlive the task until wall.post"
+        for item_id in item_ids:
+            self.rows.pop((item_id, vk_group_id), None)
+
+    def record(self, session, **kwargs) -> None:
+        self.recorded.append(kwargs)
+
+
+def _item(index: int, media_type: str = "document") -> SimpleNamespace:
+    return SimpleNamespace(
+        id=100 + index,
+        type=media_type,
+        file_id=f"f{index}",
+        file_unique_id=None,
+        mime_type=None,
+        file_name=f"doc{index}.pdf",
+        size=10,
+        order_index=index,
+        tg_post_id=1,
+    )
+
+
+@pytest.fixture
+def store():
+    store = StagedStore()
+    post = SimpleNamespace(
+        id=1,
+        media_group_id=None,
+        payload_json={},
+        channel_id=-100,
+        message_id=5,
+        text="hello",
+        date=None,
+        created_at=None,
+    )
+    store.post = post
+    serial = dataclasses.replace(repost.settings, UPLOAD_CONCURRENCY=1)
+    patches = [
+        mock.patch.object(repost, "settings", serial),
+        mock.patch.object(repost, "session_scope", lambda: contextlib.nullcontext(mock.Mock())),
+        mock.patch.object(repost, "_load_runtime", return_value={"vk_group_id": GROUP_ID, "limit_strategy": "truncate"}),
+        mock.patch.object(repost, "create_job", return_value=SimpleNamespace(id=7)),
+        mock.patch.object(repost, "update_job"),
+        mock.patch.object(repost, "get_tg_post_by_id", return_value=post),
+        mock.patch.object(repost, "get_posted_tg_post_ids", return_value=set()),
+        mock.patch.object(repost, "list_media_items_for_post", return_value=[_item(i) for i in range(4)]),
+        mock.patch.object(repost, "get_ready_staged_media", store.get_ready),
+        mock.patch.object(repost, "get_pending_staged_media", return_value=[]),
+        mock.patch.object(repost, "checkpoint_staged_media", store.checkpoint),
+        mock.patch.object(repost, "delete_staged_media", store.delete),
+        mock.patch.object(repost, "record_vk_post", store.record),
+        mock.patch.object(repost, "get_cached_attachments", return_value={}),
+        mock.patch.object(repost, "store_attachments"),
+        mock.patch.object(repost, "get_user_access_token", return_value=None),
+        mock.patch.object(repost, "notify_admins"),
+        mock.patch.object(repost, "TelegramClient"),
+        mock.patch.object(repost, "VKClient"),
+        mock.patch.object(repost, "_post_with_limit_strategy", side_effect=store.wall_post),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        yield store
+
+
+def test_retry_resumes_from_failed_item_and_clears_checkpoints(store) -> None:
+    uploads = []
+    fail_on = {2}
+
+    def upload(item, *args):
+        uploads.append(item["file_id"])
+        if item["file_id"] == "f2" and fail_on:
+            fail_on.clear()
+            raise RuntimeError("upload broke")
+        return f"doc-1_{item['id']}", None
+
+    with mock.patch.object(repost, "_upload_media_item", side_effect=upload):
+        with pytest.raises(RuntimeError):
+            repost.repost_tg_post.run(1)
+        assert uploads == ["f0", "f1", "f2"]
+        assert set(store.rows) == {(100, GROUP_ID), (101, GROUP_ID)}
+        assert not store.recorded
+
+        uploads.clear()
+        repost.repost_tg_post.run(1)
+
+    assert uploads == ["f2", "f3"]
+    assert store.recorded[0]["attachments_count"] == 4
+    assert store.rows == {}
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_photos_uploaded_before_a_failure_are_saved_and_checkpointed(store, concurrency) -> None:
+    uploads = []
+    saves = []
+    fail_on = {2}
+
+    def upload(item, *args):
+        uploads.append(item["file_id"])
+        if item["file_id"] == "f2" and fail_on:
+            fail_on.clear()
+            raise RuntimeError("upload broke")
+        return PendingPhoto(GROUP_ID, {"id": item["id"]}), None
+
+    def save(client, pending, user_token):
+        saves.append([photo.uploaded["id"] for photo in pending])
+        return [f"photo-1_{photo.uploaded['id']}" for photo in pending]
+
+    settings = dataclasses.replace(repost.settings, UPLOAD_CONCURRENCY=concurrency)
+    with mock.patch.object(repost, "settings", settings), mock.patch.object(
+        repost, "list_media_items_for_post", return_value=[_item(i, "photo") for i in range(4)]
+    ), mock.patch.object(repost, "get_photo_upload_server", return_value="https://upload"), mock.patch.object(
+        repost, "save_wall_photos", save
+    ), mock.patch.object(repost, "_upload_media_item", side_effect=upload):
+        with pytest.raises(RuntimeError):
+            repost.repost_tg_post.run(1)
+        staged = {item_id for item_id, _ in store.rows}
+        assert {100, 101} <= staged
+        assert 102 not in staged
+        assert saves == [sorted(staged)]
+
+        uploads.clear()
+        repost.repost_tg_post.run(1)
+
+    assert sorted(uploads) == [f"f{item_id - 100}" for item_id in range(100, 104) if item_id not in staged]
+    assert store.recorded[0]["attachments_count"] == 4
+
+
+@pytest.mark.parametrize("wait_sec", [60, 0])
+def test_finalize_waits_for_items_a_prefetch_is_uploading(store, wait_sec) -> None:
+    uploads = []
+    items = [_item(0), _item(1)]
+    pending = {101}
+    polls = []
+
+    def get_pending(session, item_ids, vk_group_id):
+        polls.append(sorted(pending))
+        if len(polls) == 2:
+            # The prefetch of item 101 finishes while finalize waits.
+            pending.clear()
+            store.rows[(101, vk_group_id)] = ("doc-1_prefetched", None)
+        return sorted(pending & set(item_ids))
+
+    def upload(item, *args):
+        uploads.append(item["id"])
+        return f"doc-1_{item['id']}", None
+
+    settings = dataclasses.replace(repost.settings, STAGED_MEDIA_WAIT_SEC=wait_sec, UPLOAD_CONCURRENCY=1)
+    album_post = SimpleNamespace(**{**vars(store.post), "media_group_id": "g"})
+    # No album_state row, so finalize does not re-check the quiet window.
+    session = mock.Mock(get=mock.Mock(return_value=None))
+    with mock.patch.object(repost, "settings", settings), mock.patch.object(
+        repost, "session_scope", lambda: contextlib.nullcontext(session)
+    ), mock.patch.object(repost, "RedisLock"), mock.patch.object(
+        repost, "get_album_posts", return_value=[album_post]
+    ), mock.patch.object(repost, "list_media_items_for_posts", return_value=items), mock.patch.object(
+        repost, "mark_album_finalized"
+    ), mock.patch.object(repost, "get_pending_staged_media", get_pending), mock.patch.object(
+        repost, "_STAGED_POLL_SEC", 0
+    ), mock.patch.object(repost, "_upload_media_item", side_effect=upload):
+        repost.finalize_album.run("g")
+
+    if wait_sec:
+        assert uploads == [100]
+        assert len(polls) == 2
+    else:
+        # The wait budget is spent, so finalize uploads the claimed item itself.
+        assert uploads == [100, 101]
+        assert len(polls) == 1
+    assert store.recorded[0]["attachments_count"] == 2
+
+
+def test_album_prefetch_shares_one_upload_server_and_save(store) -> None:
+    photos = [_item(i, "photo") for i in range(3)]
+    servers = mock.Mock(return_value="https://upload")
+    save = mock.Mock(side_effect=lambda client, pending, token: [f"photo-1_{p.uploaded['id']}" for p in pending])
+
+    def upload(item, *args):
+        assert args[6] == "https://upload"
+        return PendingPhoto(GROUP_ID, {"id": item["id"]}), None
+
+    with mock.patch.object(repost, "get_album_posts", return_value=[store.post]), mock.patch.object(
+        repost, "list_media_items_for_posts", return_value=photos
+    ), mock.patch.object(
+        repost, "claim_staged_media", side_effect=lambda session, ids, *args: ids
+    ), mock.patch.object(repost, "get_photo_upload_server", servers), mock.patch.object(
+        repost, "save_wall_photos", save
+    ), mock.patch.object(repost, "_upload_media_item", side_effect=upload):
+        repost.prefetch_album.run("g")
+
+    servers.assert_called_once()
+    save.assert_called_once()
+    assert set(store.rows) == {(100, GROUP_ID), (101, GROUP_ID), (102, GROUP_ID)}
+
+
+def test_checkpoints_are_released_once_wall_post_succeeds(store) -> None:
+    with mock.patch.object(
+        repost, "_upload_media_item", side_effect=lambda item, *args: (f"doc-1_{item['id']}", None)
+    ), mock.patch.object(repost, "record_vk_post", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            repost.repost_tg_post.run(1)
+
+    # The attachments are on the wall, so gc_staged_media must never see them.
+    assert store.posted == 1
+    assert store.rows == {}
+
+
+@pytest.mark.parametrize(
+    ("limit_strategy", "kept"),
+    [("truncate", True), ("split_posts", False)],
+)
+def test_failed_wall_post_keeps_checkpoints_unless_partly_posted(store, limit_strategy, kept) -> None:
+    items = [_item(i) for i in range(12)]
+    store.post_error = VKAPIError(code=100, message="wall.post failed")
+    runtime = {"vk_group_id": GROUP_ID, "limit_strategy": limit_strategy}
+    with mock.patch.object(repost, "list_media_items_for_post", return_value=items), mock.patch.object(
+        repost, "_load_runtime", return_value=runtime
+    ), mock.patch.object(
+        repost, "_upload_media_item", side_effect=lambda item, *args: (f"doc-1_{item['id']}", None)
+    ):
+        with pytest.raises(VKAPIError):
+            repost.repost_tg_post.run(1)
+
+    assert bool(store.rows) is kept
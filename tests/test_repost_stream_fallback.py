@@ -0,0 +1,49 @@
+import dataclasses
+from unittest import mock
+
+from app.tasks import repost
+from app.utils.download_cache import DownloadCache
+from app.utils.relay import RelayError
+from app.utils.timing import StageTimer
+from app.vk import uploads
+
+
+def test_video_stream_fallback_reuses_video_save(tmp_path) -> None:
+    tg_client = mock.Mock()
+    tg_client.get_file.return_value = {"file_path": "videos/a.mp4", "file_size": 1024}
+    tg_client.relay_file.return_value = mock.MagicMock()
+
+    def download(file_path, dest_path):
+        with open(dest_path, "wb") as f:
+            f.write(b"x" * 1024)
+        return 1024
+
+    tg_client.download_file.side_effect = download
+    posted = []
+
+    def post_file(upload_url, field, source, timeout):
+        posted.append((upload_url, isinstance(source, str)))
+        if not isinstance(source, str):
+            raise RelayError("telegram stream broke")
+
+    vk_client = mock.Mock()
+    save = {"upload_url": "https://upload/1", "owner_id": -5, "video_id": 7}
+    stream_settings = dataclasses.replace(repost.settings, MEDIA_RELAY_MODE="stream")
+    with mock.patch.object(repost, "settings", stream_settings), mock.patch.object(
+        uploads, "_call_with_fallback", return_value=save
+    ) as call, mock.patch.object(uploads, "_post_file", post_file), mock.patch.object(
+        repost, "get_download_cache", return_value=DownloadCache(str(tmp_path), 0)
+    ):
+        result = repost._upload_media_item(
+            {"type": "video", "file_id": "f1", "file_name": "a.mp4"},
+            tg_client,
+            vk_client,
+            5,
+            None,
+            StageTimer(),
+            0,
+        )
+
+    assert result == ("video-5_7", None)
+    assert [c.args[1] for c in call.call_args_list] == ["video.save"]
+    assert posted == [("https://upload/1", False), ("https://upload/1", True)]
@@ -0,0 +1,16 @@
+from app.tasks.celery_app import HEAVY_QUEUE, LIGHT_QUEUE
+from app.tasks.routing import classify
+
+MB = 1024 * 1024
+
+
+def test_text_and_photo_posts_stay_light_whatever_their_size() -> None:
+    assert classify([]) == LIGHT_QUEUE
+    assert classify([("photo", 9 * MB)] * 10) == LIGHT_QUEUE
+    assert classify([("photo", None)]) == LIGHT_QUEUE
+
+
+def test_videos_and_large_documents_go_heavy() -> None:
+    assert classify([("photo", MB), ("video", 1)]) == HEAVY_QUEUE
+    assert classify([("document", 15 * MB), ("document", 15 * MB)]) == HEAVY_QUEUE
+    assert classify([("photo", 9 * MB), ("document", MB)]) == LIGHT_QUEUE
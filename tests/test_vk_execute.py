@@ -0,0 +1,20 @@
+from unittest import mock
+
+from app.vk.execute import BatchCall, execute_calls
+from app.vk.types import VKAPIError
+
+
+def test_truncated_execute_response_fails_only_missing_calls() -> None:
+    calls = [BatchCall("photos.delete", {"photo_id": i}) for i in range(3)]
+    client = mock.Mock()
+    client.api_raw.return_value = {
+        "response": [1, False],
+        "execute_errors": [{"error_code": 15, "error_msg": "Access denied", "method": "photos.delete"}],
+    }
+
+    results = execute_calls(client, calls)
+
+    assert len(results) == 3
+    assert results[0] == 1
+    assert isinstance(results[1], VKAPIError) and results[1].code == 15
+    assert isinstance(results[2], VKAPIError) and "missing from execute response" in str(results[2])
@@ -0,0 +1,80 @@
+import dataclasses
+import time
+from unittest import mock
+
+import fakeredis
+import pytest
+
+from app.config import get_settings
+from app.vk import client as vk_client_module
+from app.vk import rate_limit
+from app.vk.client import VKClient
+from app.vk.types import VKAPIError
+
+
+@pytest.fixture
+def redis_client():
+    client = fakeredis.FakeRedis()
+    with mock.patch.object(rate_limit, "get_redis", lambda url: client):
+        yield client
+
+
+def _limiter(**overrides) -> rate_limit.VKRateLimiter:
+    return rate_limit.VKRateLimiter(dataclasses.replace(get_settings(), **overrides))
+
+
+def test_bucket_throttles_after_capacity_and_refills(redis_client) -> None:
+    limiter = _limiter(VK_RATE_LIMIT_PER_SEC=20.0, VK_RATE_LIMIT_METHODS={})
+    waits = []
+    real_sleep = time.sleep
+
+    def sleep(delay):
+        # Really wait, so the bucket refills against Redis TIME.
+        waits.append(delay)
+        real_sleep(delay)
+
+    with mock.patch.object(rate_limit.time, "sleep", side_effect=sleep):
+        for _ in range(20):
+            assert limiter.acquire("token", "wall.post") == 0.0
+        waited = limiter.acquire("token", "wall.post")
+
+    assert 0 < waited <= 0.1
+    assert waits and all(0 < wait <= 0.1 for wait in waits)
+
+
+def test_family_limit_applies_on_top_of_token_limit(redis_client) -> None:
+    limiter = _limiter(VK_RATE_LIMIT_PER_SEC=100.0, VK_RATE_LIMIT_METHODS={"wall": 1.0})
+    with mock.patch.object(rate_limit.time, "sleep") as sleep:
+        sleep.side_effect = lambda d: redis_client.delete(*redis_client.keys("vk_rate:*:wall"))
+        assert limiter.acquire("token", "wall.post") == 0.0
+        assert limiter.acquire("token", "photos.save") == 0.0
+        assert limiter.acquire("token", "wall.post") > 0.5
+    assert sleep.call_count == 1
+
+
+def _response(payload):
+    response = mock.Mock()
+    response.json.return_value = payload
+    return response
+
+
+@pytest.mark.parametrize("code, delay", [(6, 1.0), (9, 5.0)])
+def test_rate_limit_errors_are_retried_with_backoff(code, delay) -> None:
+    http_client = mock.Mock()
+    http_client.post.side_effect = [
+        _response({"error": {"error_code": code, "error_msg": "Too many requests"}}),
+        _response({"response": {"ok": 1}}),
+    ]
+    client = VKClient("token", http_client=http_client, rate_limiter=mock.Mock())
+    with mock.patch.object(vk_client_module.time, "sleep") as sleep:
+        assert client.api("wall.post", {}) == {"ok": 1}
+    sleep.assert_called_once_with(delay)
+
+
+def test_rate_limit_retries_are_bounded() -> None:
+    http_client = mock.Mock()
+    http_client.post.return_value = _response({"error": {"error_code": 6, "error_msg": "Too many"}})
+    client = VKClient("token", http_client=http_client, rate_limiter=mock.Mock())
+    with mock.patch.object(vk_client_module.time, "sleep") as sleep, pytest.raises(VKAPIError):
+        client.api("wall.post", {})
+    assert sleep.call_count == client.rate_limit_retries